@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfiguracja z .env
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.97))  ### min. podobieństwo cosinusowe pytań
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 512))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 0))                 ### 0 = bez wygasania
+## co ile sekund silnik sprawdza w Qdrant na jaką kolekcję wskazuje alias (wersja korpusu)
+CORPUS_VERSION_CHECK_INTERVAL = float(os.getenv("CORPUS_VERSION_CHECK_INTERVAL", 30))
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def question_numbers(question):
+    """Liczby z pytania (lata, dni, numery artykułów) - posortowane, z powtórzeniami."""
+    return tuple(sorted(n.replace(",", ".") for n in NUMBER_PATTERN.findall(question or "")))
+
+
+class SemanticAnswerCache:
+    """
+    Cache gotowych odpowiedzi dla pytań BEZ historii:
+    - trafienie gdy wektor pytania jest bliski (cosinus >= threshold) wcześniej zadanemu pytaniu
+      i oba pytania zawierają te same liczby ("po 5 latach" i "po 15 latach" mają prawie ten sam wektor)
+    - każdy wpis jest przypisany do wersji korpusu (kolekcji za aliasem labor_code_pl),
+      więc po podmianie aliasu stare odpowiedzi nigdy nie są zwracane
+    - pin(): wersję ustala rejestr silników (engine_registry.py) - zapytania wygaszanego silnika
+      (stara wersja) nie czyszczą wtedy cache nowego, tylko go omijają
+    """
+
+    def __init__(self, threshold=0.97, max_size=512, ttl=None):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.corpus_version = None
+        self.pinned = False  ### True = wersję zmienia tylko pin(), inne wersje nie mają dostępu do cache
+        self._entries = OrderedDict()  ### id -> {"vector", "numbers", "answer", "sources", "created_at"}
+        self._matrix = None            ### znormalizowane wektory (n, d) do szybkiego iloczynu skalarnego
+        self._ids = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _ensure_version(self, corpus_version):
+        """Czy wpisy w cache dotyczą corpus_version (bez przypiętej wersji przechodzi na nową i czyści cache)."""
+        if corpus_version == self.corpus_version:
+            return True
+        if self.pinned:
+            return False
+        ## nowa wersja korpusu = wszystkie dotychczasowe odpowiedzi są nieaktualne
+        self._clear(corpus_version)
+        return True
+
+    def _clear(self, corpus_version):
+        if self._entries:
+            self._stats["invalidations"] += 1
+        self._entries.clear()
+        self._matrix = None
+        self._ids = []
+        self.corpus_version = corpus_version
+
+    def _rebuild_matrix(self):
+        self._ids = list(self._entries.keys())
+        self._matrix = np.stack([e["vector"] for e in self._entries.values()]) if self._ids else None
+
+    def lookup(self, vector, corpus_version, question):
+        """Zwraca {"answer", "sources"} dla najbliższego pytania z tymi samymi liczbami lub None."""
+        query = self._normalize(vector)
+        numbers = question_numbers(question)
+        with self._lock:
+            if not self._ensure_version(corpus_version):
+                self._stats["misses"] += 1
+                return None
+            if self._matrix is None and self._entries:
+                self._rebuild_matrix()
+            if self._matrix is None:
+                self._stats["misses"] += 1
+                return None
+
+            scores = self._matrix @ query
+            for best in np.argsort(-scores):
+                if scores[best] < self.threshold:
+                    break
+                entry_id = self._ids[best]
+                entry = self._entries[entry_id]
+                if entry["numbers"] != numbers or (self.ttl and time.time() - entry["created_at"] > self.ttl):
+                    continue
+                self._entries.move_to_end(entry_id)
+                self._stats["hits"] += 1
+                return {"answer": entry["answer"], "sources": list(entry["sources"])}
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, vector, corpus_version, question, answer, sources):
+        with self._lock:
+            if not self._ensure_version(corpus_version):
+                return
+            self._entries[self._next_id] = {
+                "vector": self._normalize(vector),
+                "numbers": question_numbers(question),
+                "answer": answer,
+                "sources": list(sources),
+                "created_at": time.time()
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None  ### przebudowa przy następnym lookup
+
+    def invalidate(self, corpus_version=None):
+        """Czyści cache (np. ręcznie - po podmianie silnika wersję zmienia pin())."""
+        with self._lock:
+            self._clear(corpus_version)
+
+    def pin(self, corpus_version):
+        """Przypina cache do wersji korpusu aktualnego silnika (czyści go, jeśli wersja się zmieniła)."""
+        with self._lock:
+            if corpus_version != self.corpus_version:
+                self._clear(corpus_version)
+            self.pinned = True
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+## współdzielona instancja dla całego procesu
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    max_size=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL or None
+)
@@ -0,0 +1,111 @@
+import re
+import threading
+
+SUPERSCRIPT_DIGITS = str.maketrans("0123456789", "⁰¹²³⁴⁵⁶⁷⁸⁹")
+PLAIN_DIGITS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹", "0123456789")
+PLAIN_ARTICLE_PATTERN = re.compile(r"Art\. (\d+)([a-z]*)")
+
+
+def article_id(number, superscript="", letters=""):
+    """Jeden zapis art_id dla parsera PDF i pytań: "Art. 22¹a" (indeks górny jako ¹²³, jak w tekście ustawy)."""
+    return f"Art. {number}{superscript.translate(SUPERSCRIPT_DIGITS)}{letters.lower()}"
+
+
+def article_id_candidates(art_id):
+    """
+    Artykuły, o które może chodzić w odwołaniu zapisanym bez indeksu górnego:
+    "Art. 31" to art. 31 albo art. 3¹ ("Art. 221" - także 22¹ i 2²¹).
+    """
+    match = PLAIN_ARTICLE_PATTERN.fullmatch(art_id)
+    if not match:
+        return [art_id]
+    digits, letters = match.groups()
+    return [art_id] + [
+        article_id(digits[:i], digits[i:], letters) for i in range(len(digits) - 1, 0, -1) if digits[i] != "0"
+    ]
+
+
+class ArticleIndex:
+    """
+    Indeks w pamięci: art_id -> punkty z kolekcji (payload z treścią artykułu).
+    - budowany przy starcie silnika przez scroll całej kolekcji (bez wektorów)
+    - przypisany do wersji korpusu, więc po podmianie aliasu jest przebudowywany
+    - pozwala odpowiedzieć na "co mówi art. 29?" bez embeddingu, wyszukiwania i rerankingu
+    """
+
+    def __init__(self, page_size=256):
+        self.page_size = page_size
+        self.version = None
+        self._articles = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _group(records):
+        articles = {}
+        for record in records:
+            art_id = record.payload.get('metadata', {}).get('art_id')
+            if art_id:
+                articles.setdefault(art_id, []).append(record)
+        return articles
+
+    def _swap(self, records, version):
+        ## podmiana całego słownika naraz - równoległe zapytania widzą starą albo nową wersję, nigdy pół na pół
+        articles = self._group(records)
+        with self._lock:
+            self._articles = articles
+            self.version = version
+        print(f"--- INDEKS ARTYKUŁÓW ZBUDOWANY: {len(articles)} artykułów (wersja: {version}) ---")
+
+    def build(self, client, collection_name, version):
+        records, offset = [], None
+        while True:
+            page, offset = client.scroll(
+                collection_name=collection_name,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            records.extend(page)
+            if offset is None:
+                break
+        self._swap(records, version)
+
+    async def abuild(self, client, collection_name, version):
+        records, offset = [], None
+        while True:
+            page, offset = await client.scroll(
+                collection_name=collection_name,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            records.extend(page)
+            if offset is None:
+                break
+        self._swap(records, version)
+
+    def lookup(self, refs, acts=None):
+        """
+        Zwraca (punkty artykułów wskazanych jednoznacznie w kolejności z pytania, lista nieznalezionych art_id,
+        punkty z odwołań niejednoznacznych). Odwołanie jest niejednoznaczne, gdy pasuje do kilku artykułów:
+        "Art. 31" to art. 31 albo 3¹, a ten sam numer bywa w kilku aktach korpusu (acts ogranicza wynik do wybranych).
+        """
+        found, missing, ambiguous = [], [], []
+        articles = self._articles
+        for art_id in refs:
+            records = [r for candidate in article_id_candidates(art_id) for r in articles.get(candidate, [])]
+            if acts:
+                records = [r for r in records if r.payload.get('metadata', {}).get('source') in acts]
+            matched = {(r.payload.get('metadata', {}).get('source'), r.payload.get('metadata', {}).get('art_id')) for r in records}
+            if not records:
+                missing.append(art_id)
+            elif len(matched) == 1:
+                found.extend(records)
+            else:
+                ambiguous.extend(records)
+        return found, missing, ambiguous
+
+    def __len__(self):
+        return len(self._articles)
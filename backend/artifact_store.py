@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+from utils import get_http_session
+from pdf_parser import file_hash
+
+load_dotenv()
+
+# Konfiguracja z .env
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", "artifact_store")  ### pobrane akty (po hashu treści) + indeks URL-i
+ARTIFACT_CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", 1 << 16))     ### paczka zapisu przy pobieraniu strumieniowym
+ARTIFACT_TIMEOUT = float(os.getenv("ARTIFACT_TIMEOUT", 30))
+ELI_CACHE_TTL = float(os.getenv("ELI_CACHE_TTL", 3600))  ### ile sekund odpowiedź API ELI jest świeża bez pytania serwera
+ELI_NOT_FOUND_TTL = float(os.getenv("ELI_NOT_FOUND_TTL", 60))  ### 404 (np. rocznik jeszcze nie istnieje) - krótko, bo bywa przejściowe
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+PDF_MAGIC = b"%PDF-"
+
+
+class ArtifactError(Exception):
+    """Pobrany plik nie przeszedł walidacji (nie PDF, niepełny, zły hash)."""
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def validators(entry):
+    ## nagłówki zapytania warunkowego - serwer odpowie 304 (kilkaset bajtów), jeśli zasób się nie zmienił
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class ArtifactStore:
+    """
+    Lokalny magazyn pobranych plików i odpowiedzi API:
+    - objects/<sha256>.pdf - treść adresowana hashem (ta sama wersja aktu zapisana raz)
+    - index.json - URL -> hash, ETag, Last-Modified (zapytania warunkowe)
+    - partial/ - przerwane pobierania, wznawiane nagłówkiem Range
+    - json/ - odpowiedzi API ELI z czasem pobrania (TTL, potem rewalidacja warunkowa)
+    """
+
+    def __init__(self, root=ARTIFACT_STORE_DIR, session=None):
+        self.root = root
+        self.session = session
+        self._lock = threading.Lock()  ### index.json - pobieranie kilku aktów naraz (corpus_registry)
+        for name in ("objects", "partial", "json"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _session(self):
+        return self.session or get_http_session()
+
+    def _index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path()):
+            return {}
+        with open(self._index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _update_index(self, url, entry):
+        with self._lock:
+            index = self._load_index()
+            index[url] = entry
+            write_json(self._index_path(), index)
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", f"{digest}.pdf")
+
+    def _download_to_partial(self, url, entry):
+        """Pobieranie strumieniowe do partial/ (wznawiane od ostatniego bajtu). Zwraca (odpowiedź, ścieżka) albo 304."""
+        part_path = os.path.join(self.root, "partial", f"{url_key(url)}.part")
+        headers = {**HEADERS, **(validators(entry) if os.path.exists(self.object_path(entry.get("sha256", ""))) else {})}
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        resume_validator = entry.get("partial_etag") or entry.get("partial_last_modified")
+        if offset and not resume_validator:
+            ### bez ETag/Last-Modified nie wiadomo, czy część pochodzi z tej samej wersji pliku - pobieranie od zera
+            os.remove(part_path)
+            offset = 0
+        if offset:
+            ## If-Range: serwer doda resztę tylko jeśli plik się nie zmienił, w innym wypadku wyśle całość (200)
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = resume_validator
+
+        response = self._session().get(url, headers=headers, stream=True, timeout=ARTIFACT_TIMEOUT)
+        with response:
+            if response.status_code == 304:
+                return response, None
+            if response.status_code == 416 and offset:
+                ### część większa niż plik na serwerze (nowa wersja) - pobieranie od zera
+                os.remove(part_path)
+                return self._download_to_partial(url, entry)
+            if response.status_code not in (200, 206):
+                raise ArtifactError(f"Błąd pobierania {url}: {response.status_code}")
+
+            content_type = response.headers.get("Content-Type", "").lower()
+            if "html" in content_type:
+                ### strona błędu zamiast pliku - nie nadpisuje poprzedniej wersji
+                raise ArtifactError(f"Otrzymano {content_type} zamiast application/pdf")
+
+            mode = "ab" if response.status_code == 206 else "wb"
+            ## zapamiętuje walidator częściowego pliku, zanim zacznie pisać - przerwanie da się wznowić
+            self._update_index(url, {
+                **entry,
+                "partial_etag": response.headers.get("ETag"),
+                "partial_last_modified": response.headers.get("Last-Modified")
+            })
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=ARTIFACT_CHUNK_SIZE):
+                    f.write(chunk)
+
+            expected = response.headers.get("Content-Length")
+            if expected is not None:
+                expected = int(expected) + (offset if response.status_code == 206 else 0)
+                if os.path.getsize(part_path) != expected:
+                    raise ArtifactError(f"Niepełny plik: {os.path.getsize(part_path)} z {expected} bajtów (zostanie wznowiony)")
+            return response, part_path
+
+    def download(self, url, file_path=None, expected_sha256=None):
+        """
+        Pobiera plik (lub potwierdza, że się nie zmienił) i zwraca:
+        {"path", "sha256", "size", "changed", "status": "downloaded" | "not_modified"}.
+        file_path: kopia pod stałą nazwą (np. plik aktu z rejestru korpusu) - zapisywana tylko przy zmianie.
+        """
+        entry = self._load_index().get(url, {})
+        response, part_path = self._download_to_partial(url, entry)
+
+        if part_path is None:
+            digest = entry["sha256"]
+            status = "not_modified"
+        else:
+            digest = file_hash(part_path)
+            with open(part_path, "rb") as f:
+                if not f.read(len(PDF_MAGIC)) == PDF_MAGIC:
+                    os.remove(part_path)
+                    raise ArtifactError("Pobrany plik nie jest PDF-em")
+            if expected_sha256 and digest != expected_sha256:
+                os.remove(part_path)
+                raise ArtifactError(f"Niezgodny hash pliku: {digest} zamiast {expected_sha256}")
+            os.replace(part_path, self.object_path(digest))
+            status = "downloaded"
+
+        changed = digest != entry.get("sha256")
+        self._update_index(url, {
+            "sha256": digest,
+            "size": os.path.getsize(self.object_path(digest)),
+            "etag": response.headers.get("ETag") or entry.get("etag"),
+            "last_modified": response.headers.get("Last-Modified") or entry.get("last_modified"),
+            "fetched_at": time.time()
+        })
+
+        if file_path and (changed or not os.path.exists(file_path) or file_hash(file_path) != digest):
+            ### zapis przez plik tymczasowy - czytający stary plik nie zobaczy połowy nowego
+            shutil.copyfile(self.object_path(digest), f"{file_path}.tmp")
+            os.replace(f"{file_path}.tmp", file_path)
+
+        return {
+            "path": self.object_path(digest),
+            "sha256": digest,
+            "size": os.path.getsize(self.object_path(digest)),
+            "changed": changed,
+            "status": status
+        }
+
+    def fetch_json(self, url, ttl=ELI_CACHE_TTL, headers=None, timeout=ARTIFACT_TIMEOUT):
+        """
+        Odpowiedź JSON z cache na dysku: w TTL bez zapytania, po TTL - zapytanie warunkowe (304 = odnowienie TTL).
+        Zwraca (status HTTP, dane); przy błędzie sieci lub serwera (429, 5xx) zwraca ostatnią poprawną odpowiedź, jeśli jest.
+        Zapisywane są tylko odpowiedzi 200 i 404 (z krótszym TTL) - błąd nigdy nie zastępuje zapytania na cały TTL.
+        """
+        path = os.path.join(self.root, "json", f"{url_key(url)}.json")
+        cached = read_json(path)
+        if cached and time.time() - cached["fetched_at"] < (ttl if cached["status"] == 200 else min(ttl, ELI_NOT_FOUND_TTL)):
+            return cached["status"], cached["data"]
+
+        try:
+            response = self._session().get(
+                url, headers={**HEADERS, **(headers or {}), **validators(cached or {})}, timeout=timeout
+            )
+        except Exception:
+            if cached:
+                print(f"Błąd sieci dla {url} - użyto zapisanej odpowiedzi")
+                return cached["status"], cached["data"]
+            raise
+
+        if response.status_code == 304 and cached:
+            cached["fetched_at"] = time.time()
+            write_json(path, cached)
+            return cached["status"], cached["data"]
+
+        if response.status_code not in (200, 404):
+            ### 429, 5xx i inne błędy nie trafiają do cache
+            if cached and cached["status"] == 200:
+                print(f"Błąd {response.status_code} dla {url} - użyto zapisanej odpowiedzi")
+                return cached["status"], cached["data"]
+            return response.status_code, None
+
+        data = response.json() if response.status_code == 200 else None
+        write_json(path, {
+            "url": url,
+            "status": response.status_code,
+            "data": data,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time()
+        })
+        return response.status_code, data
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    ### plik tymczasowy + os.replace - przerwany zapis nie zostawia uszkodzonego JSON-a
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+## współdzielona instancja (katalog tworzony przy pierwszym użyciu modułu)
+_store = None
+
+
+def get_artifact_store():
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
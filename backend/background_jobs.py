@@ -0,0 +1,241 @@
+import os
+import uuid
+import fcntl
+import asyncio
+import threading
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+from labor_code_ingestion_pipeline import save_metadata
+from ingest_to_cloud import run_ingestion
+from corpus_registry import select_documents, fetch_document_updates
+from embedding_scheduler import INGEST_CHECKPOINT_PATH
+
+load_dotenv()
+
+# Konfiguracja z .env
+JOBS_HISTORY_LIMIT = int(os.getenv("JOBS_HISTORY_LIMIT", 20))  ### ile zakończonych zadań pamięta /api/v1/admin/jobs/{id}
+## blokada wspólna dla wszystkich procesów serwera na maszynie (obok checkpointu, o który konkurowałyby zadania)
+INGEST_LOCK_PATH = os.getenv("INGEST_LOCK_PATH", f"{INGEST_CHECKPOINT_PATH}.lock")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+## kolejka postępu w procesie roboczym (ustawiana przez init_worker)
+_progress_queue = None
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# CZĘŚĆ WYKONYWANA W PROCESIE ROBOCZYM
+
+def init_worker(progress_queue):
+    ## kolejka multiprocessing może trafić do procesu tylko przy jego tworzeniu (initargs), nie przez submit
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def report(job_id, stage=None, **counters):
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, stage, counters))
+
+
+def run_update_job(job_id, document_keys):
+    """
+    Aktualizacja bazy wiedzy w osobnym procesie (dotychczasowa treść endpointu update-knowledge):
+    ISAP -> pobranie PDF -> run_ingestion -> zapis metadanych. Zwraca wynik dla statusu zadania.
+    """
+    report(job_id, stage="checking_updates")
+    documents = select_documents(document_keys)
+    ## sprawdzenie czy jest nowa wersja i pobranie PDF - każdy akt równolegle
+    updated = fetch_document_updates(documents)
+    if not updated:
+        return {"status": "skipped", "message": "Posiadasz już najnowszą wersję lub błąd ISAP"}
+
+    report(job_id, stage="ingesting")
+    run_ingestion(documents=updated, progress=lambda **counters: report(job_id, **counters))
+
+    # zapisuje metadane dopiero gdy proces (pobranie + Qdrant) się uda
+    report(job_id, stage="saving_metadata")
+    for doc in updated:
+        save_metadata(doc["eli"], doc["status_date"], key=doc["key"])
+
+    versions = ", ".join(f"{doc['source']} ({doc['eli']})" for doc in updated)
+    return {
+        "status": "success",
+        "message": f"Zaktualizowano bazę wiedzy do wersji: {versions}",
+        "details": "Pobrano PDF i zaktualizowano kolekcję w Qdrant Cloud.",
+        "updated_at": max(doc["status_date"] for doc in updated),
+        "documents": [{"key": doc["key"], "eli": doc["eli"], "status_date": doc["status_date"]} for doc in updated]
+    }
+
+
+# CZĘŚĆ WYKONYWANA W PROCESIE SERWERA
+
+class JobAlreadyRunning(Exception):
+    def __init__(self, job):
+        super().__init__(f"Aktualizacja bazy wiedzy już trwa (zadanie {job['id']})")
+        self.job = job
+
+
+class IngestionLock:
+    """
+    Blokada pliku (flock) - jedna aktualizacja naraz także przy kilku workerach uvicorn.
+    System zwalnia ją sam, gdy proces, który ją trzyma, zginie. W pliku zapisane jest ID zadania.
+    """
+
+    def __init__(self, path=INGEST_LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    def acquire(self, job_id):
+        """True, gdy blokada została przejęta; w innym wypadku ID zadania, które ją trzyma (lub pusty napis)."""
+        f = open(self.path, "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.seek(0)
+            holder = f.read().strip()
+            f.close()
+            return holder
+        f.seek(0)
+        f.truncate()
+        f.write(job_id)
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class IngestionJobRunner:
+    """
+    Lokalna kolejka zadań aktualizacji bazy wiedzy (bez zewnętrznego brokera):
+    - zadanie działa w osobnym procesie (ProcessPoolExecutor) - parsowanie PDF i embeddingi
+      nie konkurują z obsługą zapytań o GIL ani o pętlę zdarzeń
+    - postęp (etap, artykuły, paczki) wraca kolejką multiprocessing, czytaną w wątku serwera
+    - jednocześnie może działać tylko jedno zadanie - na całej maszynie (IngestionLock), nie tylko w tym procesie;
+      stan zadania zna jednak tylko worker, który je przyjął
+    - on_success: korutyna wołana w procesie serwera po udanej aktualizacji (np. odświeżenie silnika RAG);
+      jej błąd (np. RuntimeError z EngineRegistry.reload) kończy zadanie statusem "degraded" z opisem w error
+    """
+
+    def __init__(self, on_success=None):
+        self.on_success = on_success
+        self._jobs = OrderedDict()  ### job_id -> stan zadania (słownik zwracany przez endpoint)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._progress_queue = None
+        self._progress_thread = None
+        self._tasks = set()  ### referencje do zadań asyncio (pętla trzyma tylko słabe)
+        self._ingestion_lock = IngestionLock()
+
+    def _ensure_pool(self):
+        ## proces roboczy startuje przy pierwszym zadaniu - serwer bez aktualizacji nie płaci za niego
+        ### spawn zamiast fork: fork procesu z wątkami i pętlą zdarzeń może skopiować zablokowane locki
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._progress_queue = context.Queue()
+            self._pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=context,
+                initializer=init_worker, initargs=(self._progress_queue,)
+            )
+            self._progress_thread = threading.Thread(target=self._consume_progress, daemon=True)
+            self._progress_thread.start()
+        return self._pool
+
+    def _consume_progress(self):
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            job_id, stage, counters = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if stage and job["status"] in ACTIVE_STATUSES:  ### spóźniony komunikat nie nadpisuje końcowego stanu
+                    job["stage"] = stage
+                for name, value in counters.items():
+                    job["progress"][name] = job["progress"].get(name, 0) + value
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(len(self._jobs) - JOBS_HISTORY_LIMIT, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return {**job, "progress": dict(job["progress"])} if job else None
+
+    def submit(self, document_keys=None):
+        """Kolejkuje aktualizację i od razu zwraca stan zadania; JobAlreadyRunning gdy inna jeszcze trwa."""
+        with self._lock:
+            running = next((job for job in self._jobs.values() if job["status"] in ACTIVE_STATUSES), None)
+            if running:
+                raise JobAlreadyRunning(dict(running))
+            job_id = uuid.uuid4().hex
+            ## zadanie w innym workerze serwera - wspólny alias i checkpoint, więc też 409
+            acquired = self._ingestion_lock.acquire(job_id)
+            if acquired is not True:
+                raise JobAlreadyRunning({"id": acquired or None})
+            job = {
+                "id": job_id,
+                "status": "queued",
+                "stage": None,
+                "documents": document_keys,
+                "progress": {},
+                "result": None,
+                "error": None,
+                "created_at": now(),
+                "started_at": None,
+                "finished_at": None
+            }
+            self._jobs[job["id"]] = job
+            self._trim_history()
+        task = asyncio.create_task(self._run(job["id"], document_keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return self.get(job["id"])
+
+    async def _run(self, job_id, document_keys):
+        self._update(job_id, status="running", started_at=now())
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._ensure_pool(), run_update_job, job_id, document_keys)
+            status = "succeeded" if result["status"] == "success" else "skipped"
+            error = None
+            if result["status"] == "success" and self.on_success:
+                self._update(job_id, stage="reloading_engine")
+                try:
+                    await self.on_success()
+                except Exception as e:
+                    ## korpus w Qdrant jest już nowy, ale ten worker odpowiada ze starego silnika (watch spróbuje ponownie)
+                    print(f"Aktualizacja zapisana, ale odświeżenie silnika RAG nie powiodło się: {e}")
+                    status, error = "degraded", str(e)
+            self._update(job_id, status=status, stage=None, result=result, error=error, finished_at=now())
+        except Exception as e:
+            print(f"BŁĄD PODCZAS AKTUALIZACJI: {str(e)}")
+            self._update(job_id, status="failed", error=str(e), finished_at=now())
+        finally:
+            self._ingestion_lock.release()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def shutdown(self):
+        if self._pool is not None:
+            ### przerwane zadanie nie podmienia aliasu - kolejne uruchomienie wznowi z checkpointu embeddingów
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._progress_queue.put(None)
+            self._pool = None
@@ -0,0 +1,169 @@
+import os
+import re
+import sys
+import json
+import time
+import statistics
+from dotenv import load_dotenv
+from qdrant_client.http import models
+
+import ingest_to_cloud as ingest
+from model_providers import get_embedding_provider, DENSE_VECTOR_NAME
+from rag_engine import parse_vector_schema, build_search_params
+from article_index import PLAIN_DIGITS
+
+load_dotenv()
+
+# Konfiguracja z .env
+BENCHMARK_QUESTIONS_PATH = os.getenv(
+    "BENCHMARK_QUESTIONS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "research", "test_questions.json")
+)
+BENCHMARK_REPEATS = int(os.getenv("BENCHMARK_REPEATS", 3))  ### ile razy mierzy każde zapytanie (latencja)
+BENCHMARK_TOP_K = [5, 10, 20]
+
+
+def normalize_art(art_name):
+    ## jak w research/evaluate_retrieval.ipynb - "Art. 25(1)", "Art. 25¹" i "Art. 251" to ten sam klucz
+    return re.sub(r'[^a-z0-9]', '', str(art_name).translate(PLAIN_DIGITS).lower())
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def wait_until_indexed(collection_name, timeout=600):
+    ## HNSW i kwantyzacja budują się w tle - pomiar przed końcem optymalizacji byłby zaniżony/zawyżony
+    start = time.time()
+    while ingest.client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        if time.time() - start > timeout:
+            raise Exception(f"Kolekcja {collection_name} nie została zoptymalizowana w ciągu {timeout}s")
+        time.sleep(1)
+
+
+def copy_current_collection(collection_name, optimized):
+    """Kopia kolekcji za aliasem (wektory + payload) z ustawieniami produkcyjnymi lub domyślnymi Qdrant."""
+    dense_name, has_sparse = parse_vector_schema(ingest.client.get_collection(ingest.ALIAS_NAME))
+    if dense_name is None:
+        raise ValueError("Kolekcja za aliasem ma nienazwany wektor - najpierw pełna migracja (ingest_to_cloud.py)")
+    ingest.create_collection(collection_name, with_sparse=has_sparse, optimized=optimized)
+    points = (
+        models.PointStruct(id=record.id, vector=record.vector, payload=record.payload)
+        for record in ingest.scroll_current(None, with_payload=True, with_vectors=True)
+    )
+    total = ingest.upload_points(collection_name, points)
+    ingest.wait_for_points(collection_name, total)
+    wait_until_indexed(collection_name)
+    return total
+
+
+def search_points(collection_name, vector, limit, search_params):
+    response = ingest.client.query_points(
+        collection_name=collection_name,
+        query=vector,
+        using=DENSE_VECTOR_NAME,
+        search_params=search_params,
+        limit=limit,
+        with_payload=["metadata"]
+    )
+    return response.points
+
+
+def run_variant(collection_name, search_params, questions, vectors, exact_ids, limit):
+    """Latencja (p50/p95) oraz recall@k: względem wyszukiwania dokładnego i względem oczekiwanego artykułu."""
+    latencies = []
+    ann_recall = {k: 0.0 for k in BENCHMARK_TOP_K}
+    hits = {k: 0 for k in BENCHMARK_TOP_K}
+    mrr_sum = 0
+
+    for item, vector, exact in zip(questions, vectors, exact_ids):
+        for _ in range(max(BENCHMARK_REPEATS, 1)):
+            start = time.perf_counter()
+            points = search_points(collection_name, vector, limit, search_params)
+            latencies.append(time.perf_counter() - start)
+
+        ids = [str(p.id) for p in points]
+        sources = [normalize_art(p.payload["metadata"].get("art_id")) for p in points]
+        expected = normalize_art(item["expected_art"])
+        for k in BENCHMARK_TOP_K:
+            ## jaka część dokładnego top-k została znaleziona przez HNSW / kwantyzację
+            ann_recall[k] += len(set(ids[:k]) & set(exact[:k])) / max(len(exact[:k]), 1)
+            if expected in sources[:k]:
+                hits[k] += 1
+        if expected in sources:
+            mrr_sum += 1 / (sources.index(expected) + 1)
+
+    total = len(questions)
+    result = {
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "MRR": round(mrr_sum / total, 3)
+    }
+    for k in BENCHMARK_TOP_K:
+        result[f"R@{k}"] = round(hits[k] / total, 3)
+        result[f"ANN_recall@{k}"] = round(ann_recall[k] / total, 3)
+    return result
+
+
+def run_benchmark(questions_path=BENCHMARK_QUESTIONS_PATH):
+    """
+    Porównanie ustawień kolekcji na pytaniach testowych (tylko wektor dense - bez BM25 i rerankingu):
+    - baseline: domyślne ustawienia Qdrant, bez kwantyzacji
+    - int8 + rescore / int8 bez rescore: ustawienia z ingest_to_cloud.py (HNSW, kwantyzacja, on_disk)
+    Obie kolekcje są kopiami kolekcji za aliasem i są usuwane po pomiarze - produkcja nie jest zmieniana.
+    """
+    with open(questions_path, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    suffix = int(time.time())
+    baseline_name, optimized_name = f"bench_baseline_{suffix}", f"bench_optimized_{suffix}"
+    limit = max(BENCHMARK_TOP_K)
+
+    try:
+        print("Kopiowanie kolekcji produkcyjnej do kolekcji testowych...")
+        points = copy_current_collection(baseline_name, optimized=False)
+        copy_current_collection(optimized_name, optimized=True)
+
+        embedder = get_embedding_provider()
+        vectors = [embedder.embed_query(item["question"]) for item in questions]
+        ## punkt odniesienia dla ANN recall - pełne przeszukanie oryginalnych wektorów
+        exact_params = models.SearchParams(exact=True)
+        exact_ids = [[str(p.id) for p in search_points(baseline_name, v, limit, exact_params)] for v in vectors]
+
+        variants = {
+            "baseline": (baseline_name, build_search_params(quantization=False)),
+            "int8_rescore": (optimized_name, build_search_params(rescore=True)),
+            "int8_no_rescore": (optimized_name, build_search_params(rescore=False))
+        }
+        results = {
+            "points": points,
+            "questions": len(questions),
+            "settings": {
+                "quantization": ingest.QDRANT_QUANTIZATION,
+                "hnsw_m": ingest.QDRANT_HNSW_M,
+                "hnsw_ef_construct": ingest.QDRANT_HNSW_EF_CONSTRUCT,
+                "vectors_on_disk": ingest.QDRANT_VECTORS_ON_DISK
+            },
+            "variants": {}
+        }
+        for name, (collection_name, search_params) in variants.items():
+            results["variants"][name] = run_variant(collection_name, search_params, questions, vectors, exact_ids, limit)
+            print(f"{name}: {results['variants'][name]}")
+        return results
+    finally:
+        for collection_name in (baseline_name, optimized_name):
+            if ingest.client.collection_exists(collection_name):
+                ingest.client.delete_collection(collection_name=collection_name)
+
+
+if __name__ == "__main__":
+    ## python collection_benchmark.py [pytania.json] [wynik.json]
+    results = run_benchmark(*sys.argv[1:2])
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+## testy bez sieci i bez .env: moduły czytają konfigurację przy imporcie, więc wartości muszą być ustawione wcześniej
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("QDRANT_URL", "http://localhost:1")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("HYBRID_SEARCH", "false")
+os.environ.setdefault("ENGINE_WATCH_INTERVAL", "0")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(__file__))
@@ -0,0 +1,73 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from labor_code_ingestion_pipeline import get_latest_unified_text, download_specific_unified_text
+
+load_dotenv()
+
+# Konfiguracja z .env
+CORPUS_REGISTRY_PATH = os.getenv("CORPUS_REGISTRY_PATH", "corpus_registry.json")
+CORPUS_UPDATE_WORKERS = int(os.getenv("CORPUS_UPDATE_WORKERS", 3))  ### ile aktów sprawdza/pobiera się równolegle
+
+## domyślny korpus (gdy brak pliku rejestru) - tylko Kodeks pracy, jak dotychczas
+DEFAULT_SOURCE = "Kodeks Pracy"
+DEFAULT_REGISTRY = [
+    {
+        "key": "kodeks_pracy",
+        "source": DEFAULT_SOURCE,
+        "title": "Kodeks pracy",
+        "file_path": "last_unified_labor_code.pdf"
+    }
+]
+
+
+def load_registry(path=CORPUS_REGISTRY_PATH):
+    """
+    Rejestr aktów prawnych w korpusie - lista słowników:
+    - key: stały identyfikator (klucz w pdf_metadata.json)
+    - source: nazwa aktu zapisywana w payloadzie (metadata.source) - po niej filtruje wyszukiwanie
+    - title: fragment tytułu obwieszczenia o tekście jednolitym w API ELI (np. "Kodeks pracy")
+    - file_path: lokalny plik PDF (domyślnie <key>.pdf)
+    """
+    if not os.path.exists(path):
+        return [dict(doc) for doc in DEFAULT_REGISTRY]
+
+    with open(path, "r", encoding="utf-8") as f:
+        documents = json.load(f)
+    for doc in documents:
+        doc.setdefault("title", doc["source"])
+        doc.setdefault("file_path", f"{doc['key']}.pdf")
+    return documents
+
+
+def select_documents(keys=None, registry=None):
+    """Dokumenty z rejestru o podanych kluczach (None = wszystkie)."""
+    registry = registry if registry is not None else load_registry()
+    if not keys:
+        return registry
+    unknown = set(keys) - {doc["key"] for doc in registry}
+    if unknown:
+        raise ValueError(f"Nieznane dokumenty w rejestrze korpusu: {', '.join(sorted(unknown))}")
+    return [doc for doc in registry if doc["key"] in keys]
+
+
+def fetch_document_update(doc):
+    """
+    Sprawdza w API ELI czy jest nowy tekst jednolity aktu i pobiera PDF.
+    Zwraca dokument uzupełniony o eli i status_date albo None (brak zmian lub błąd pobierania).
+    """
+    url, eli, change_date = get_latest_unified_text(doc["title"], key=doc["key"])
+    if not url:
+        return None
+    if not download_specific_unified_text(target_eli=eli, pdf_url=url, file_path=doc["file_path"]):
+        return None
+    return {**doc, "eli": eli, "status_date": change_date}
+
+
+def fetch_document_updates(documents):
+    """Sprawdzanie i pobieranie aktów równolegle - każdy akt to osobne zadanie (osobny plik, osobne metadane)."""
+    with ThreadPoolExecutor(max_workers=max(CORPUS_UPDATE_WORKERS, 1)) as pool:
+        results = list(pool.map(fetch_document_update, documents))
+    return [doc for doc in results if doc]
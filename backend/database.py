@@ -1,11 +1,21 @@
 import os
+from uuid import uuid4
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Konfiguracja puli połączeń z .env (silnik async dla FastAPI)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))               ### stałe połączenia w puli (na jeden worker)
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))        ### dodatkowe połączenia przy szczycie ruchu
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))      ### ile czekać na wolne połączenie (s)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))      ### wymiana połączeń starszych niż N s (zrywane przez proxy/chmurę)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"  ### sprawdza połączenie przed użyciem
+
 # 1. Sprawdzenie czy w systemie (lub w .env) jest gotowy DATABASE_URL
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -23,15 +33,53 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-## usunięcie problematycznego pgbouncer=true jeśli pojawi się w adresie
-if DATABASE_URL and "pgbouncer=true" in DATABASE_URL:
-    DATABASE_URL = DATABASE_URL.replace("?pgbouncer=true", "").replace("&pgbouncer=true", "")
+## pgbouncer=true w adresie (np. Supabase pooler) = tryb zgodny z PgBouncer (transaction pooling)
+### sam parametr nie jest rozumiany przez sterowniki - usuwany z adresu, zostaje tylko flaga
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true" or "pgbouncer=true" in DATABASE_URL
+if "pgbouncer" in make_url(DATABASE_URL).query:
+    DATABASE_URL = make_url(DATABASE_URL).difference_update_query(["pgbouncer"]).render_as_string(hide_password=False)
+
+
+def build_async_url(url):
+    """Ten sam adres z asynchronicznym sterownikiem (asyncpg dla Postgresa, aiosqlite dla SQLite)."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+        ### asyncpg nie zna parametru libpq sslmode - ten sam tryb przyjmuje jako ssl
+        if "sslmode" in url.query:
+            url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+def build_async_engine_options(url, pgbouncer=DB_PGBOUNCER):
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if not url.startswith("sqlite"):
+        ### SQLite (testy lokalne) nie ma puli połączeń sieciowych
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    if pgbouncer and url.startswith("postgresql+asyncpg"):
+        ## PgBouncer w trybie transakcji przełącza połączenia serwera między transakcjami -
+        ## przygotowane zapytania (prepared statements) asyncpg trafiałyby na inne połączenie
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+        }
+    return options
+
 
 # tworzenie silnika bazy danych
-engine = create_engine(DATABASE_URL)
+## synchroniczny - dla skryptów uruchamianych poza FastAPI
+engine = create_engine(DATABASE_URL, pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE)
+## asynchroniczny - dla endpointów FastAPI (zapytania do bazy nie blokują pętli zdarzeń)
+ASYNC_DATABASE_URL = build_async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **build_async_engine_options(ASYNC_DATABASE_URL))
 
 # fabryka sesji - stąd są połączenia do konkretnych zapisów
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+### expire_on_commit=False - obiekty po commit są dalej czytelne (w async nie ma leniwego doczytywania)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # klasa bazowa po której będą dziedziczyć modele (tabele)
 Base = declarative_base()
@@ -42,4 +90,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
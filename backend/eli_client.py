@@ -0,0 +1,111 @@
+import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from artifact_store import get_artifact_store
+
+load_dotenv()
+
+# Konfiguracja z .env ### adresy API można podmienić na lokalny serwer testowy
+ELI_API_URL = os.getenv("ELI_API_URL", "https://api.sejm.gov.pl/eli")
+ISAP_DOWNLOAD_URL = os.getenv("ISAP_DOWNLOAD_URL", "https://isap.sejm.gov.pl/isap.nsf/download.xsp")
+ELI_TIMEOUT = float(os.getenv("ELI_TIMEOUT", 15))       ### limit czasu każdego zapytania do API ELI
+ELI_WORKERS = int(os.getenv("ELI_WORKERS", 5))          ### ile roczników pobiera się naraz
+ELI_YEARS_TO_CHECK = int(os.getenv("ELI_YEARS_TO_CHECK", 5))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json"
+}
+
+
+def is_unified_text_notice(act, title):
+    ## Obwieszczenie o tekście jednolitym danego aktu (np. Kodeksu pracy)
+    act_title = act.get("title", "")
+    return title in act_title and "jednolitego tekstu" in act_title.lower()
+
+
+def unified_file_name(details):
+    # szuka pliku typu "U" (Ujednolicony)
+    return next((text.get("fileName") for text in details.get("texts", []) if text.get("type") == "U"), None)
+
+
+class EliClient:
+    """
+    Klient API ELI Sejmu (https://api.sejm.gov.pl/eli_pl.html):
+    - wspólna sesja HTTP (keep-alive) i limit czasu na każdym zapytaniu
+    - odpowiedzi z cache artifact_store (TTL + zapytania warunkowe)
+    - roczniki pobierane równolegle - sprawdzenie aktualizacji trwa ok. jeden czas odpowiedzi zamiast pięciu
+    """
+
+    def __init__(self, base_url=ELI_API_URL, store=None, timeout=ELI_TIMEOUT, workers=ELI_WORKERS):
+        self.base_url = base_url.rstrip("/")
+        self.store = store or get_artifact_store()
+        self.timeout = timeout
+        self.workers = workers
+
+    def get(self, path):
+        """(status HTTP, JSON albo None) dla ścieżki API, np. "acts/DU/2025"."""
+        return self.store.fetch_json(f"{self.base_url}/{path}", headers=HEADERS, timeout=self.timeout)
+
+    def yearbook(self, year, publisher="DU"):
+        """Lista aktów z rocznika (pusta, gdy rocznik jeszcze nie istnieje lub API zwróciło błąd)."""
+        status, data = self.get(f"acts/{publisher}/{year}")
+        if status != 200:
+            print(f"Rocznik {year} niedostępny lub błąd: {status}")
+            return []
+        # API zwraca słownik z kluczem 'items'
+        return data.get("items", [])
+
+    def act_details(self, eli):
+        status, data = self.get(f"acts/{eli}")
+        return data if status == 200 else None
+
+    def yearbooks(self, years, publisher="DU"):
+        """Generator (rok, lista aktów) w kolejności years - roczniki pobierane równolegle, w tle."""
+        pool = ThreadPoolExecutor(max_workers=max(min(self.workers, len(years)), 1))
+        try:
+            futures = [(year, pool.submit(self.yearbook, year, publisher)) for year in years]
+            for year, future in futures:
+                try:
+                    yield year, future.result()
+                except Exception as e:
+                    print(f"Błąd dla rocznika {year}: {e}")
+        finally:
+            ### przerwanie iteracji (znaleziony akt) anuluje jeszcze niewysłane zapytania
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def find_latest_unified_text(self, title, years_to_check=ELI_YEARS_TO_CHECK):
+        """
+        Najnowszy tekst jednolity aktu o danym tytule z ostatnich lat:
+        {"url", "eli", "change_date", "details"} albo None.
+        Starsze roczniki są sprawdzane tylko, jeśli w nowszych nie ma obwieszczenia.
+        """
+        ## dynamiczne generowanie listy ostatnich lat (od najnowszego)
+        current_year = datetime.now().year
+        years = [current_year - i for i in range(years_to_check)]
+        print(f"Sprawdzanie roczników: {years}")
+
+        for year, items in self.yearbooks(years):
+            ## od najnowszych aktów wewnątrz rocznika (najwyższa pozycja) - bez sortowania całej listy
+            candidates = sorted((act for act in items if is_unified_text_notice(act, title)),
+                                key=lambda act: act.get("pos", 0), reverse=True)
+            for act in candidates:
+                print(f"Znaleziono w roczniku {year}: {act.get('title')}")
+                # Pobiera szczegóły żeby wyciągnąć dokładną nazwę pliku
+                details = self.act_details(act.get("ELI"))
+                if not details:
+                    continue
+                address = details.get("address")
+                file_name = unified_file_name(details)
+                if not address or not file_name:
+                    print(f"Pomijanie {act.get('ELI')}: brak adresu lub pliku tekstu ujednoliconego.")
+                    continue
+                return {
+                    "url": f"{ISAP_DOWNLOAD_URL}/{address}/U/{file_name}",
+                    "eli": act.get("ELI"),
+                    "change_date": details.get("changeDate"),
+                    "details": details
+                }
+        return None
@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+try:
+    import redis  ### opcjonalne - tylko dla współdzielonego backendu "redis"
+except ImportError:
+    redis = None
+
+load_dotenv()
+
+# Konfiguracja z .env
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 1024))       ### max wpisów w pamięci (LRU)
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", 0))          ### 0 = bez wygasania
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "memory")  ### memory | sqlite | redis
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_REDIS_URL = os.getenv("EMBEDDING_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+def normalize_query(text):
+    """Normalizuje pytanie: NFC, małe litery, pojedyncze spacje, bez końcowej interpunkcji."""
+    text = unicodedata.normalize("NFC", text).lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip("?!. ")
+
+
+class SQLiteBackend:
+    """Współdzielony backend w lokalnym pliku SQLite (kilka workerów uvicorna na jednej maszynie)."""
+
+    def __init__(self, path, max_size, ttl=None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        ### WAL pozwala czytać równolegle z kilku procesów podczas zapisu
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl and time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            ## ogranicza rozmiar pliku - usuwa najstarsze wpisy ponad limit
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+class RedisBackend:
+    """Współdzielony backend Redis (lub dowolny serwer zgodny z protokołem Redis)."""
+
+    def __init__(self, url, ttl=None, prefix="emb:"):
+        if redis is None:
+            raise ImportError("Backend 'redis' wymaga pakietu redis (pip install redis)")
+        self.client = redis.Redis.from_url(url, socket_timeout=1)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        ## TTL i wywłaszczanie po stronie Redisa (maxmemory-policy)
+        if self.ttl:
+            self.client.set(self.prefix + key, json.dumps(value), ex=int(self.ttl))
+        else:
+            self.client.set(self.prefix + key, json.dumps(value))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+class EmbeddingCache:
+    """
+    Cache wektorów zapytań:
+    - klucz: nazwa modelu + znormalizowany tekst pytania
+    - lokalny LRU w pamięci z opcjonalnym TTL
+    - opcjonalny współdzielony backend (SQLite / Redis) jako drugi poziom
+    - aget / aset dla silnika asynchronicznego: backend (blokujące I/O) w wątku, nie w pętli zdarzeń
+    """
+
+    def __init__(self, max_size=1024, ttl=None, backend=None):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.backend = backend
+        self._entries = OrderedDict()  ### klucz -> (wektor, czas zapisu)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "shared_hits": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(text, model):
+        normalized = normalize_query(text)
+        return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, text, model):
+        key = self.make_key(text, model)
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        return self._get_shared(key)
+
+    async def aget(self, text, model):
+        key = self.make_key(text, model)
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        if self.backend is None:
+            return self._get_shared(key)  ### bez backendu - tylko licznik chybień, bez wątku
+        return await asyncio.to_thread(self._get_shared, key)
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if self.ttl and time.time() - created_at > self.ttl:
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+        return None
+
+    def _get_shared(self, key):
+        ## drugi poziom - współdzielony backend (inne workery mogły już policzyć ten wektor)
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                print(f"Błąd współdzielonego cache embeddingów (odczyt): {e}")
+                value = None
+            if value is not None:
+                self._store_local(key, value)
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._stats["shared_hits"] += 1
+                return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, text, model, value):
+        key = self.make_key(text, model)
+        self._store_local(key, value)
+        self._set_shared(key, value)
+
+    async def aset(self, text, model, value):
+        key = self.make_key(text, model)
+        self._store_local(key, value)
+        if self.backend is not None:
+            await asyncio.to_thread(self._set_shared, key, value)
+
+    def _set_shared(self, key, value):
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value)
+            except Exception as e:
+                print(f"Błąd współdzielonego cache embeddingów (zapis): {e}")
+
+    def _store_local(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """Liczniki dla warstwy metryk (hits / misses / shared_hits / evictions / size)."""
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+def create_embedding_cache():
+    """Buduje cache na podstawie konfiguracji z .env."""
+    ttl = EMBEDDING_CACHE_TTL or None
+    backend = None
+    if EMBEDDING_CACHE_BACKEND == "sqlite":
+        backend = SQLiteBackend(EMBEDDING_CACHE_PATH, max_size=EMBEDDING_CACHE_SIZE * 10, ttl=ttl)
+    elif EMBEDDING_CACHE_BACKEND == "redis":
+        backend = RedisBackend(EMBEDDING_CACHE_REDIS_URL, ttl=ttl)
+    return EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE, ttl=ttl, backend=backend)
+
+
+## współdzielona instancja dla całego procesu
+embedding_cache = create_embedding_cache()
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+
+from metrics import record_retry
+
+load_dotenv()
+
+# Konfiguracja z .env
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", 20))   ### bezpieczna wielkość paczki dla HF API
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", 4))          ### ile paczek liczy się równolegle
+INGEST_EMBED_RATE = float(os.getenv("INGEST_EMBED_RATE", 1.0))            ### średnio paczek na sekundę (token bucket)
+INGEST_EMBED_BURST = int(os.getenv("INGEST_EMBED_BURST", 2))              ### ile paczek może wystartować naraz po przerwie
+INGEST_EMBED_RETRIES = int(os.getenv("INGEST_EMBED_RETRIES", 4))          ### ponowienia jednej paczki przed porażką
+INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", "ingest_checkpoint.jsonl")
+
+
+class TokenBucket:
+    """Limiter zapytań: `rate` żetonów na sekundę, maksymalnie `capacity` odłożonych na zapas."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        ## blokuje wątek aż pojawi się wolny żeton (rate <= 0 = bez limitu)
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class EmbeddingCheckpoint:
+    """
+    Plik JSONL z gotowymi paczkami: jedna linia = {"key": hash paczki, "vectors": [...]}.
+    - klucz to hash modelu i treści artykułów, więc po zmianie tekstu paczka liczy się od nowa
+    - dopisywanie linia po linii - przerwany zapis psuje najwyżej ostatnią linię
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  ### niedokończona linia z przerwanego uruchomienia
+                    self._done[entry["key"]] = entry["vectors"]
+
+    @staticmethod
+    def make_key(model_name, texts):
+        return hashlib.sha256("\x00".join([model_name, *texts]).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self._done.get(key)
+
+    def save(self, key, vectors):
+        with self._lock:
+            self._done[key] = vectors
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "vectors": vectors}) + "\n")
+
+    def clear(self):
+        with self._lock:
+            self._done = {}
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def __len__(self):
+        return len(self._done)
+
+
+def run_with_retry(work_fn, batch, bucket, retries=INGEST_EMBED_RETRIES):
+    ## każda paczka ma własne ponowienia z wykładniczym backoffem - błąd jednej nie przerywa pozostałych
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            return work_fn(batch)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait_time = min(2 ** attempt, 30) + random.uniform(0, 1)
+            print(f"[Paczka - próba {attempt + 1}/{retries + 1} nieudana]: {e}. Ponowienie za {wait_time:.1f}s")
+            record_retry("ingest_batch")
+            time.sleep(wait_time)
+
+
+def checked_embed(embed_fn):
+    """Opakowuje embed_fn sprawdzeniem, czy model zwrócił wektor dla każdego tekstu paczki."""
+    def embed(batch):
+        vectors = embed_fn(batch)
+        if len(vectors) != len(batch):
+            raise Exception(f"Oczekiwano {len(batch)} wektorów, otrzymano {len(vectors)}")
+        return vectors
+    return embed
+
+
+def run_batches(batches, work_fn, workers=INGEST_EMBED_WORKERS, rate=INGEST_EMBED_RATE,
+                burst=INGEST_EMBED_BURST, retries=INGEST_EMBED_RETRIES, max_pending=None, bucket=None):
+    """
+    Generator: wykonuje work_fn na kolejnych paczkach w `workers` wątkach i zwraca (indeks, paczka, wynik)
+    w kolejności ukończenia.
+    - paczki pobierane z iteratora leniwie - w pamięci jest najwyżej max_pending paczek naraz
+    - tempo ograniczone przez TokenBucket (można przekazać wspólny dla kilku równoległych potoków),
+      każda paczka ma własne ponowienia
+    Jeśli któraś paczka nie przejdzie mimo ponowień - wyjątek dopiero po zakończeniu pozostałych.
+    """
+    bucket = bucket or TokenBucket(rate, burst)
+    max_pending = max_pending or max(workers, 1) * 2
+    errors = []
+    batches = iter(enumerate(batches))
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {}
+
+        def submit_next():
+            for index, batch in batches:
+                futures[pool.submit(run_with_retry, work_fn, batch, bucket, retries)] = (index, batch)
+                return True
+            return False
+
+        while len(futures) < max_pending and submit_next():
+            pass
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, batch = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append((index, e))
+                else:
+                    yield index, batch, result
+                submit_next()
+
+    if errors:
+        index, error = errors[0]
+        raise Exception(f"Nie udało się przetworzyć {len(errors)} paczek (np. paczka {index + 1}): {error}")
+
+
+def embed_with_checkpoint(texts, embed_fn, model_name, checkpoint=None):
+    """
+    Embeddingi jednej paczki dokumentów z checkpointem:
+    paczka policzona w poprzednim (przerwanym) uruchomieniu jest brana z pliku zamiast z modelu.
+    """
+    key = EmbeddingCheckpoint.make_key(model_name, texts)
+    cached = checkpoint.get(key) if checkpoint is not None else None
+    if cached is not None:
+        return cached
+    vectors = checked_embed(embed_fn)(texts)
+    if checkpoint is not None:
+        checkpoint.save(key, vectors)
+    return vectors
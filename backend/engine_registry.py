@@ -0,0 +1,161 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+from rag_engine import AsyncLaborLawRAG, resolve_corpus_version
+from answer_cache import answer_cache, CORPUS_VERSION_CHECK_INTERVAL
+from metrics import inc
+
+load_dotenv()
+
+# Konfiguracja z .env
+ENGINE_WATCH_INTERVAL = float(os.getenv("ENGINE_WATCH_INTERVAL", CORPUS_VERSION_CHECK_INTERVAL))  ### co ile sekund sprawdza alias w Qdrant (0 = wyłączone)
+ENGINE_DRAIN_TIMEOUT = float(os.getenv("ENGINE_DRAIN_TIMEOUT", 120))  ### ile czeka na zakończenie zapytań starego silnika (strumienie SSE)
+## po ilu sekundach od wygaszenia silnika usuwana jest jego kolekcja - inne workery muszą zdążyć wykryć
+## nowy alias i wygasić swoje silniki (domyślnie watch + drain); ujemna wartość = stare kolekcje zostają
+ENGINE_COLLECTION_GRACE = float(os.getenv("ENGINE_COLLECTION_GRACE", ENGINE_WATCH_INTERVAL + ENGINE_DRAIN_TIMEOUT))
+## pytania testowe dla nowego silnika przed podmianą (wektor + Qdrant + reranking, bez LLM-a); pusty = tylko warmup()
+ENGINE_WARMUP_QUERIES = [q.strip() for q in os.getenv(
+    "ENGINE_WARMUP_QUERIES", "Ile dni urlopu wypoczynkowego przysługuje pracownikowi?"
+).split("|") if q.strip()]
+
+
+class EngineRegistry:
+    """
+    Aktualny silnik RAG procesu z bezprzerwową podmianą po zmianie korpusu:
+    - acquire(): zapytanie trzyma ten sam silnik od początku do końca (także strumień SSE)
+    - każdy silnik czyta konkretną kolekcję (labor_code_<ts>), nie alias - podmiana aliasu nie zmienia danych
+      silnikowi w trakcie zapytania, a stara kolekcja jest usuwana dopiero po wygaszeniu silników, które jej używały
+    - reload(): nowy silnik z tymi samymi klientami i modelami, rozgrzany (indeks artykułów, zapytania testowe)
+      zanim zostanie podmieniony; stary obsługuje zapytania w toku i jest zamykany po ich zakończeniu
+    - watch: każdy worker sprawdza alias w Qdrant i sam przechodzi na nową wersję korpusu
+    """
+
+    def __init__(self, factory=AsyncLaborLawRAG):
+        self.factory = factory
+        self.engine = factory()
+        self.alias = self.engine.collection_name  ### alias z aktualną wersją korpusu (labor_code_pl)
+        self.version = None  ### wersja korpusu (kolekcja za aliasem), na której rozgrzano aktualny silnik
+        self._root = self.engine  ### właściciel współdzielonych klientów - zamykany dopiero przy close()
+        self._in_flight = {}  ### silnik -> liczba zapytań w toku
+        self._reload_lock = asyncio.Lock()
+        self._watch_task = None
+        self._tasks = set()  ### referencje do zadań wygaszania (pętla trzyma tylko słabe)
+
+    async def start(self):
+        """Wiąże pierwszy silnik z kolekcją za aliasem, rozgrzewa go i uruchamia obserwację aliasu."""
+        try:
+            self.version = await self.resolve_alias()
+        except Exception as e:
+            ### bez Qdranta silnik zostaje na aliasie - watch przełączy go na konkretną kolekcję
+            print(f"Nie udało się odczytać wersji korpusu: {e}")
+        if self.version is not None and self.version != self.alias:
+            self.engine = self.factory(collection_name=self.version, shared=self._root)
+        await self.engine.warmup()
+        if self.version is not None:
+            answer_cache.pin(self.version)
+        if ENGINE_WATCH_INTERVAL > 0 and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    @asynccontextmanager
+    async def acquire(self):
+        engine = self.engine
+        self._in_flight[engine] = self._in_flight.get(engine, 0) + 1
+        try:
+            yield engine
+        finally:
+            self._in_flight[engine] -= 1
+            if not self._in_flight[engine]:
+                del self._in_flight[engine]
+
+    async def resolve_alias(self):
+        """Kolekcja, na którą wskazuje teraz alias (albo sam alias, gdy to zwykła kolekcja)."""
+        aliases = (await self._root.client.get_aliases()).aliases
+        return resolve_corpus_version(aliases, self.alias)
+
+    async def _prepare(self, engine):
+        ## indeks artykułów + modele, potem pełna ścieżka wyszukiwania - pierwsze pytanie po podmianie nie płaci za start
+        await engine.warmup()
+        for query in ENGINE_WARMUP_QUERIES:
+            await engine.get_context(query)
+        return await engine.get_corpus_version()
+
+    async def reload(self, expected_version=None):
+        """
+        Buduje i rozgrzewa silnik dla kolekcji za aliasem, podmienia go i wygasza stary.
+        Zwraca True jeśli doszło do podmiany, False gdy ta wersja jest już załadowana; błąd przygotowania
+        nowego silnika jest rzucany dalej (RuntimeError) - zostaje stary silnik.
+        expected_version: wersja z aliasu (watch) - oszczędza ponowne odczytanie aliasu.
+        """
+        async with self._reload_lock:
+            version = expected_version or await self.resolve_alias()
+            if version == self.version:
+                return False
+            start = time.perf_counter()
+            new_engine = self.factory(collection_name=version, shared=self._root)
+            try:
+                version = await self._prepare(new_engine)
+            except Exception as e:
+                ### rozgrzewanie się nie udało - zostaje stary silnik, watch spróbuje ponownie
+                print(f"Nie udało się przygotować nowego silnika RAG: {e}")
+                inc("rag_engine_reloads_total", result="failed")
+                await new_engine.close()
+                raise RuntimeError(f"Nie udało się przygotować silnika RAG dla wersji korpusu {version}: {e}") from e
+
+            old_engine, self.engine, self.version = self.engine, new_engine, version
+            ## cache odpowiedzi należy do nowego silnika - wygaszany silnik go nie wyczyści
+            answer_cache.pin(version)
+            inc("rag_engine_reloads_total", result="success")
+            print(f"Silnik RAG podmieniony na wersję korpusu {version} ({time.perf_counter() - start:.1f}s)")
+        task = asyncio.create_task(self._retire(old_engine))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _retire(self, engine):
+        deadline = time.time() + ENGINE_DRAIN_TIMEOUT
+        while self._in_flight.get(engine) and time.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self._in_flight.get(engine):
+            print(f"Stary silnik RAG wciąż ma {self._in_flight[engine]} zapytań po {ENGINE_DRAIN_TIMEOUT}s - zamykany mimo to")
+        if engine is not self._root:
+            await engine.close()
+        await self._drop_collection(engine.collection_name)
+
+    async def _drop_collection(self, collection):
+        ## kolekcja wygaszonego silnika - usuwana po czasie na wygaszenie silników innych workerów
+        if ENGINE_COLLECTION_GRACE < 0 or collection in (self.alias, self.version):
+            return
+        await asyncio.sleep(ENGINE_COLLECTION_GRACE)
+        try:
+            if collection in (self.version, await self.resolve_alias()):
+                return
+            await self._root.client.delete_collection(collection_name=collection)
+            print(f"Usunięto kolekcję poprzedniej wersji korpusu: {collection}")
+        except Exception as e:
+            ### inny worker mógł ją już usunąć
+            print(f"Nie udało się usunąć kolekcji {collection}: {e}")
+
+    async def _watch(self):
+        ## zmiana aliasu przez aktualizację w innym procesie/workerze - podmiana bez restartu
+        while True:
+            await asyncio.sleep(ENGINE_WATCH_INTERVAL)
+            try:
+                version = await self.resolve_alias()
+                if version != self.version:
+                    print(f"Wykryto nową wersję korpusu: {self.version} -> {version}")
+                    await self.reload(expected_version=version)
+            except Exception as e:
+                print(f"Błąd sprawdzania wersji korpusu: {e}")
+
+    async def close(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self.engine is not self._root:
+            await self.engine.close()
+        await self._root.close()
@@ -0,0 +1,134 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfiguracja z .env
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", 4))          ### ile ostatnich tur (pytanie + odpowiedź) idzie dosłownie
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2500))       ### limit tokenów na historię (podsumowanie + tury)
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", 400))    ### max długość podsumowania (max_tokens dla LLM)
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", 2))        ### ile starszych tur zbiera się przed wywołaniem streszczenia
+HISTORY_CHARS_PER_TOKEN = float(os.getenv("HISTORY_CHARS_PER_TOKEN", 3))  ### przybliżenie - polski tekst ma krótsze tokeny niż angielski
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", 1024))
+## ile ostatnich nie-streszczonych tur czyta /ask z bazy - starsze i tak nie zmieściłyby się w budżecie tokenów
+HISTORY_MAX_LOAD_TURNS = int(os.getenv("HISTORY_MAX_LOAD_TURNS", 20))
+
+
+def estimate_tokens(text):
+    """Przybliżona liczba tokenów (bez tokenizera modelu - wystarcza do pilnowania budżetu)."""
+    if not text:
+        return 0
+    return int(len(text) / HISTORY_CHARS_PER_TOKEN) + 1
+
+
+def turns_tokens(turns):
+    return sum(estimate_tokens(q) + estimate_tokens(a) for q, a in turns)
+
+
+def clip_turn(turn, max_tokens):
+    """Przycina odpowiedź (a w ostateczności pytanie) tak, żeby tura zmieściła się w limicie."""
+    question, answer = turn
+    max_chars = int(max(max_tokens, 0) * HISTORY_CHARS_PER_TOKEN)
+    question = question[:max_chars]
+    answer_chars = max_chars - len(question)
+    if len(answer) > answer_chars:
+        answer = answer[:max(answer_chars, 0)].rstrip() + " [...]"
+    return question, answer
+
+
+def plan_history(chat_history, summary=None, recent_turns=HISTORY_RECENT_TURNS,
+                 token_budget=HISTORY_TOKEN_BUDGET, batch=HISTORY_SUMMARY_BATCH):
+    """
+    Dzieli tury, które jeszcze nie są w podsumowaniu, na:
+    - to_fold: najstarsze tury do dołączenia do podsumowania (zawsze początek listy)
+    - verbatim: tury przekazywane do LLM-a dosłownie
+    Starsze tury są streszczane paczkami (batch), chyba że przekroczony jest budżet tokenów.
+    """
+    chat_history = list(chat_history or [])
+    split = max(len(chat_history) - recent_turns, 0)
+    older, verbatim = chat_history[:split], chat_history[split:]
+
+    if len(older) < batch and estimate_tokens(summary) + turns_tokens(chat_history) <= token_budget:
+        ## za mało starszych tur na osobne wywołanie LLM-a, a wszystko mieści się w budżecie
+        return [], chat_history
+
+    to_fold = older
+    ## po streszczeniu podsumowanie może urosnąć do HISTORY_SUMMARY_TOKENS - liczy najgorszy przypadek
+    summary_tokens = max(estimate_tokens(summary), HISTORY_SUMMARY_TOKENS if to_fold else 0)
+    while len(verbatim) > 1 and summary_tokens + turns_tokens(verbatim) > token_budget:
+        to_fold.append(verbatim.pop(0))
+        summary_tokens = max(summary_tokens, HISTORY_SUMMARY_TOKENS)
+
+    ## pojedyncza bardzo długa tura - przycięta zamiast wysłana w całości
+    if verbatim and summary_tokens + turns_tokens(verbatim) > token_budget:
+        verbatim = [clip_turn(verbatim[0], token_budget - summary_tokens)]
+
+    return to_fold, verbatim
+
+
+def build_summary_prompt(summary, turns):
+    # Prosi AI o dopisanie nowych tur do dotychczasowego podsumowania (zamiast streszczania całej rozmowy od nowa)
+    turns_text = "\n".join([f"User: {q}\nAI: {a}" for q, a in turns])
+
+    return f"""Zaktualizuj zwięzłe podsumowanie rozmowy użytkownika z asystentem prawa pracy o nowe wymiany zdań.
+        Zachowaj fakty podane przez użytkownika (np. rodzaj umowy, staż pracy, daty), omawiane tematy oraz numery artykułów.
+        Pomiń uprzejmości i powtórzenia. Pisz po polsku, maksymalnie kilka zdań.
+
+        DOTYCHCZASOWE PODSUMOWANIE:
+        {summary or "(brak)"}
+
+        NOWE WYMIANY:
+        {turns_text}
+
+        ZAKTUALIZOWANE PODSUMOWANIE:"""
+
+
+def prefix_hashes(chat_history):
+    """Hashe kolejnych prefiksów historii: hashes[i] identyfikuje tury chat_history[:i + 1]."""
+    hashes, digest = [], b""
+    for question, answer in chat_history:
+        digest = hashlib.sha256(digest + f"{question}\n\x00{answer}\n\x00".encode("utf-8")).digest()
+        hashes.append(digest.hex())
+    return hashes
+
+
+class SummaryStore:
+    """
+    Podsumowania dla bezstanowego endpointu legal-brain (C# przysyła całą historię w każdym zapytaniu):
+    - klucz: hash prefiksu historii, który został streszczony
+    - przy kolejnym pytaniu tej samej rozmowy najdłuższy znany prefiks jest odnajdywany,
+      więc streszczane są tylko nowe tury
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()  ### hash prefiksu -> podsumowanie
+        self._lock = threading.Lock()
+
+    def find(self, chat_history):
+        """Zwraca (podsumowanie lub None, liczba tur które obejmuje)."""
+        hashes = prefix_hashes(chat_history)
+        with self._lock:
+            for covered in range(len(hashes), 0, -1):
+                summary = self._entries.get(hashes[covered - 1])
+                if summary is not None:
+                    self._entries.move_to_end(hashes[covered - 1])
+                    return summary, covered
+        return None, 0
+
+    def store(self, chat_history, summary):
+        if not chat_history:
+            return
+        key = prefix_hashes(chat_history)[-1]
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+## współdzielona instancja dla całego procesu
+summary_store = SummaryStore(max_size=HISTORY_SUMMARY_CACHE_SIZE)
@@ -1,110 +1,402 @@
 import os
-import re
 import uuid
 import time
-import random
+import hashlib
+import threading
+from itertools import islice, chain
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from qdrant_client.http.models import PointStruct, CreateAliasOperation, DeleteAliasOperation, AliasOperations
-from langchain_community.document_loaders import PyPDFLoader
 
-from utils import get_embeddings
+from model_providers import get_embedding_provider, get_sparse_provider, DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+from embedding_scheduler import (
+    run_batches, embed_with_checkpoint, EmbeddingCheckpoint, TokenBucket,
+    INGEST_CHECKPOINT_PATH, INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_WORKERS, INGEST_EMBED_RATE, INGEST_EMBED_BURST
+)
+from rag_engine import parse_vector_schema, build_source_filter
+from corpus_registry import DEFAULT_REGISTRY, load_registry
+from labor_code_ingestion_pipeline import load_metadata
+from pdf_parser import parse_pdf
 
 # Ładowanie konfiguracji
 load_dotenv()
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 ALIAS_NAME = "labor_code_pl"
+## przyrostowa aktualizacja: wektory niezmienionych artykułów są kopiowane z aktualnej kolekcji zamiast liczone od nowa
+INCREMENTAL_INGESTION = os.getenv("INCREMENTAL_INGESTION", "true").lower() == "true"
+POINT_ID_NAMESPACE = uuid.UUID("3f5b1d2e-7c4a-5e8b-9a61-0d2c4f8e6b17") ### stała przestrzeń nazw dla uuid5
+## wysyłka do Qdrant paczkami - równolegle z liczeniem kolejnych embeddingów
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", 64))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", 2))
+INGEST_UPSERT_WAIT = os.getenv("INGEST_UPSERT_WAIT", "true").lower() == "true"  ### false = nie czeka na zapis każdej paczki
+INGEST_DOCUMENT_WORKERS = int(os.getenv("INGEST_DOCUMENT_WORKERS", 2))  ### ile aktów prawnych przetwarza się równolegle
+
+## Ustawienia kolekcji (pamięć <-> latencja) - przy rosnącym korpusie
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "int8").lower()                 ### int8 | none
+QDRANT_QUANTIZATION_QUANTILE = float(os.getenv("QDRANT_QUANTIZATION_QUANTILE", 0.99))  ### odcina skrajne wartości przy kalibracji
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"  ### oryginały float32 na dysku (tylko do rescoringu)
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", 16))                                    ### krawędzie na węzeł grafu
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", 100))            ### dokładność budowy grafu
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() == "true"
+QDRANT_PAYLOAD_ON_DISK = os.getenv("QDRANT_PAYLOAD_ON_DISK", "false").lower() == "true"  ### treść artykułów czytana z dysku
+
+## indeksy payloadu - filtrowanie po akcie / wersji / numerze artykułu bez przeglądania pozostałych punktów
+PAYLOAD_INDEXES = {
+    "metadata.art_id": models.PayloadSchemaType.KEYWORD,
+    "metadata.source": models.PayloadSchemaType.KEYWORD,
+    "metadata.eli": models.PayloadSchemaType.KEYWORD,
+    "metadata.status_date": models.PayloadSchemaType.KEYWORD
+}
 
 # Inicjalizacja Klienta (Chmura)
 client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
-def run_ingestion(status_date="2026-02-03"):
-    print(f"Rozpoczynam bezpieczną migrację danych do Qdrant Cloud: {QDRANT_URL}")
 
-    # Przygotowanie Kolekcji 
-    ## Tworzy unikalną nazwę dla nowej kolekcji (np. z timestampem)
-    temp_collection_name = f"labor_code_{int(time.time())}"
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-    ### Tworzenie TYMCZASOWEJ Kolekcji
-    client.create_collection(
-        collection_name=temp_collection_name,
-        vectors_config=models.VectorParams(
-            size=1024, # Dla intfloat/multilingual-e5-large
-            distance=models.Distance.COSINE
+
+def article_point_id(source, art_id, digest):
+    """Deterministyczne ID punktu: ten sam artykuł o tej samej treści ma to samo ID w każdej wersji kolekcji."""
+    ### nazwa aktu w ID - "Art. 1" występuje w każdej ustawie
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}\n{art_id}\n{digest}"))
+
+
+def current_schema_matches(with_sparse):
+    """Czy wektory z kolekcji za aliasem można przenieść do nowej kolekcji (ten sam schemat nazwanych wektorów)."""
+    if not client.collection_exists(ALIAS_NAME):
+        return False
+    dense_name, has_sparse = parse_vector_schema(client.get_collection(ALIAS_NAME))
+    return dense_name is not None and has_sparse == with_sparse
+
+
+def scroll_current(scroll_filter, with_payload, with_vectors, page_size=256):
+    ## strona po stronie - nigdy cała kolekcja w pamięci
+    offset = None
+    while True:
+        page, offset = client.scroll(
+            collection_name=ALIAS_NAME,
+            scroll_filter=scroll_filter,
+            limit=page_size,
+            offset=offset,
+            with_payload=with_payload,
+            with_vectors=with_vectors
+        )
+        yield from page
+        if offset is None:
+            break
+
+
+def load_reusable_ids(embedding_model, source):
+    """
+    ID punktów danego aktu z kolekcji za aliasem, których wektory można przenieść do nowej wersji.
+    Same ID (bez wektorów) - wektory są pobierane paczkami dopiero przy budowaniu punktów.
+    """
+    ids = set()
+    for record in scroll_current(build_source_filter([source]), with_payload=["embedding_model"], with_vectors=False):
+        ### wektory innego modelu (np. zmiana EMBEDDING_PROVIDER) nie nadają się do ponownego użycia
+        if (record.payload or {}).get("embedding_model") == embedding_model:
+            ids.add(str(record.id))
+    return ids
+
+
+def build_quantization_config(quantization=QDRANT_QUANTIZATION):
+    """Kwantyzacja skalarna int8: 4x mniej pamięci na wektory dense (oryginały zostają do rescoringu)."""
+    if quantization == "none":
+        return None
+    if quantization != "int8":
+        raise ValueError(f"Nieobsługiwany typ kwantyzacji: {quantization} (dostępne: int8, none)")
+    return models.ScalarQuantization(
+        scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8,
+            quantile=QDRANT_QUANTIZATION_QUANTILE,
+            always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM
         )
     )
 
-    # Wczytywanie i przetwarzanie PDF
-    file_path = "last_unified_labor_code.pdf" # Zakłada że plik jest w tym samym folderze
-    if not os.path.exists(file_path):
-        print(f"Błąd: Nie znaleziono pliku {file_path}")
-        client.delete_collection(collection_name=temp_collection_name)
-        return
 
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-    
-    full_text = ""
-    for page in pages:
-        content = page.page_content
-        content = re.sub(r"©Kancelaria Sejmu.*s\.\s\d+/\d+", "", content)
-        content = re.sub(r"2026-02-03", "", content)
-        full_text += content + "\n"
-
-    # Podział na artykuły
-    pattern = r"(?=Art\.\s+\d+[a-z]*\.)"
-    articles = [c.strip() for c in re.split(pattern, full_text) if c.strip()]
-    print(f"Przygotowano {len(articles)} artykułów do zakodowania.")
-
-    # Generowanie Embeddingów (Paczki z pełnym przechwytywaniem błędów)
-    print("Generowanie wektorów przez HF API (Dense)...")
-    dense_embeddings = []
-    batch_size = 20 ### bezpieczna wielkość paczki dla HF API
+def build_hnsw_config():
+    return models.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT, on_disk=QDRANT_HNSW_ON_DISK)
 
-    try:
-        for i in range(0, len(articles), batch_size):
-            batch = articles[i:i + batch_size]
-            print(f"Przetwarzanie paczki {i//batch_size + 1}/{(len(articles) + batch_size - 1)//batch_size}...")
 
-            ### Wywołanie funkcji z utils (is_query=False bo to dokumenty)
-            batch_embeddings = get_embeddings(batch, is_query=False)
-            dense_embeddings.extend(batch_embeddings)
+def create_collection(collection_name, with_sparse, optimized=True):
+    """
+    Tworzenie TYMCZASOWEJ Kolekcji (nazwane wektory: "dense" + "text-sparse").
+    optimized=False - domyślne ustawienia Qdrant (bez kwantyzacji i strojenia HNSW), punkt odniesienia w benchmarku.
+    """
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config={
+            DENSE_VECTOR_NAME: models.VectorParams(
+                size=1024, # Dla intfloat/multilingual-e5-large
+                distance=models.Distance.COSINE,
+                on_disk=QDRANT_VECTORS_ON_DISK if optimized else None
+            )
+        },
+        ### IDF liczy Qdrant po stronie serwera (wymagane dla Qdrant/bm25)
+        sparse_vectors_config={
+            SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+        } if with_sparse else None,
+        hnsw_config=build_hnsw_config() if optimized else None,
+        quantization_config=build_quantization_config() if optimized else None,
+        on_disk_payload=QDRANT_PAYLOAD_ON_DISK if optimized else None
+    )
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
 
-            ### mała przerwa aby nie spamować HF API zbyt szybko
-            time.sleep(random.uniform(0.8, 1.5))
 
-    except Exception as e:
-        print(f"❌ BŁĄD PODCZAS GENEROWANIA EMBEDDINGÓW: {e}")
-        print("Anulowanie aktualizacji! Stara baza produkcyjna pozostaje NIENARUSZONA.")
-        client.delete_collection(collection_name=temp_collection_name)
-        raise e  # Rzuca błąd dalej, aby FastAPI/n8n wiedziało o porażce
+# POTOK INGESTION: PDF (pdf_parser - równolegle, z cache po hashu pliku) -> artykuły -> paczki punktów -> upsert
+## w pamięci są tylko paczki "w locie", a nie wszystkie wektory naraz
+
+def iter_article_records(articles, source):
+    """(id punktu, art_id, treść, hash, struktura) - identyczne duplikaty łączą się w jeden punkt."""
+    seen = set()
+    for article in articles:
+        content, art_id = article["content"], article["art_id"]
+        digest = content_hash(content)
+        point_id = article_point_id(source, art_id, digest)
+        if point_id not in seen:
+            seen.add(point_id)
+            ### dział / rozdział / oddział - do metadanych punktu
+            structure = {key: article.get(key) for key in ("division", "chapter", "section")}
+            yield point_id, art_id, content, digest, structure
+
 
-    # Budowanie punktów i wysyłka do tymczasowej kolekcji
-    points = []
-    for i, content in enumerate(articles):
-        # Wyciąganie numeru artykułu do metadanych
-        match = re.search(r"Art\.\s+(\d+[a-z]*)", content)
-        art_id = f"Art. {match.group(1)}" if match else "Wstęp"
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert_batch(collection_name, points):
+    client.upsert(collection_name=collection_name, points=points, wait=INGEST_UPSERT_WAIT)
+    return len(points)
+
+
+def wait_for_points(collection_name, expected, timeout=120):
+    ## przy INGEST_UPSERT_WAIT=false zapisy mogą jeszcze trwać - alias podmieniany dopiero na kompletnej kolekcji
+    deadline = time.time() + timeout
+    while True:
+        count = client.count(collection_name=collection_name, exact=True).count
+        if count >= expected:
+            return
+        if time.time() > deadline:
+            raise Exception(f"Kolekcja {collection_name} ma {count} z {expected} punktów po {timeout}s")
+        time.sleep(1)
+
+
+def report_progress(progress, **counters):
+    ## progress: opcjonalna funkcja (np. z background_jobs.py) dostająca przyrosty liczników postępu
+    if progress:
+        progress(**counters)
+
+
+def upload_points(collection_name, points, progress=None):
+    """Wysyłka strumienia punktów paczkami, równolegle (run_batches). Zwraca liczbę wysłanych punktów."""
+    def upload(batch):
+        count = upsert_batch(collection_name, batch)
+        report_progress(progress, batches_uploaded=1, points_uploaded=count)
+        return count
+
+    uploaded = run_batches(
+        batched(points, INGEST_UPSERT_BATCH_SIZE),
+        upload,
+        workers=INGEST_UPSERT_WORKERS,
+        rate=0
+    )
+    return sum(count for _, _, count in uploaded)
 
-        points.append(
+
+def ingest_document(doc, collection_name, embedder, sparse_model, checkpoint, reusable_ids, bucket, progress=None):
+    """
+    Potok jednego aktu prawnego: PDF -> artykuły -> embeddingi (tylko nowe/zmienione) -> upsert.
+    Zwraca statystyki dokumentu.
+    """
+    source = doc["source"]
+    embedding_model = getattr(embedder, "cache_name", embedder.model_name)
+    stats = {"points": 0, "changed": 0, "unchanged": 0}
+    stats_lock = threading.Lock() ### build_points działa w kilku wątkach naraz
+    seen_ids = set()
+
+    def build_points(records):
+        ## niezmienione artykuły - wektory kopiowane z aktualnej kolekcji, nowe/zmienione - liczone od nowa
+        ## (tylko embeddingi nowych i zmienionych artykułów kosztują zapytania do modelu)
+        vectors = {}
+        reused = [point_id for point_id, *_ in records if point_id in reusable_ids]
+        if reused:
+            for record in client.retrieve(collection_name=ALIAS_NAME, ids=reused, with_vectors=True):
+                vectors[str(record.id)] = record.vector
+
+        changed = [record for record in records if record[0] not in vectors]
+        if changed:
+            texts = [content for _, _, content, *_ in changed]
+            dense = embed_with_checkpoint(
+                texts,
+                lambda batch: embedder.embed(batch, is_query=False), ### is_query=False bo to dokumenty
+                model_name=embedding_model,
+                checkpoint=checkpoint
+            )
+            ### wektory rzadkie liczone lokalnie (bez API)
+            sparse = sparse_model.embed(texts) if sparse_model else None
+            for i, (point_id, *_) in enumerate(changed):
+                vectors[point_id] = {DENSE_VECTOR_NAME: dense[i]}
+                if sparse:
+                    vectors[point_id][SPARSE_VECTOR_NAME] = sparse[i] ### słowa kluczowe i numery artykułów
+
+        with stats_lock:
+            stats["changed"] += len(changed)
+            stats["unchanged"] += len(records) - len(changed)
+        report_progress(progress, articles_embedded=len(changed), articles_reused=len(records) - len(changed))
+        return [
             PointStruct(
-                id=str(uuid.uuid4()),
-                vector=dense_embeddings[i], ### teraz to po prostu lista (wektor)
+                id=point_id,
+                vector=vectors[point_id],
                 payload={
                     "content": content,
+                    "content_hash": digest,
+                    "embedding_model": embedding_model,
                     "metadata": {
                         "art_id": art_id,
-                        "source": "Kodeks Pracy",
-                        "status_date": status_date
+                        "source": source,
+                        "eli": doc.get("eli"),
+                        "status_date": doc.get("status_date"),
+                        **structure
                     }
                 }
             )
-        )
+            for point_id, art_id, content, digest, structure in records
+        ]
+
+    def track_ids(records):
+        for record in records:
+            seen_ids.add(record[0])
+            yield record
+
+    # Generowanie Embeddingów i wysyłka do tymczasowej kolekcji - równolegle i paczkami
+    ## (ponowienia, limit tempa i checkpoint - embedding_scheduler.py)
+    records = track_ids(iter_article_records(parse_pdf(doc["file_path"])["articles"], source))
+    embedded = run_batches(
+        batched(records, INGEST_EMBED_BATCH_SIZE), build_points,
+        workers=INGEST_EMBED_WORKERS, bucket=bucket
+    )
+    stats["points"] = upload_points(collection_name, chain.from_iterable(points for _, _, points in embedded), progress)
+    stats["removed"] = len(reusable_ids - seen_ids)
+
+    print(f"[{source}] Wgrano {stats['points']} punktów: {stats['changed']} nowych/zmienionych, {stats['unchanged']} bez zmian, {stats['removed']} starych punktów do usunięcia.")
+    return stats
+
+
+def copy_other_documents(collection_name, updated_sources, progress=None):
+    """Akty spoza tej aktualizacji przechodzą do nowej wersji kolekcji bez zmian (punkty razem z wektorami)."""
+    records = scroll_current(build_source_filter(updated_sources, exclude=True), with_payload=True, with_vectors=True)
+    points = (PointStruct(id=record.id, vector=record.vector, payload=record.payload) for record in records)
+    copied = upload_points(collection_name, points, progress)
+    if copied:
+        print(f"Skopiowano {copied} punktów pozostałych aktów bez zmian.")
+    return copied
+
+
+def default_documents(status_date):
+    ## dotychczasowe wywołanie run_ingestion(status_date) - tylko Kodeks pracy
+    doc = dict(DEFAULT_REGISTRY[0])
+    doc["eli"] = load_metadata().get(doc["key"], {}).get("eli")
+    doc["status_date"] = status_date
+    return [doc]
+
+
+def complete_documents(documents):
+    """
+    Cały korpus z rejestru do przeliczenia: aktualizowane dokumenty + pozostałe akty (eli i data z pdf_metadata.json).
+    Używane, gdy wektorów innych aktów nie da się skopiować z aktualnej kolekcji.
+    """
+    updated = {doc["source"] for doc in documents}
+    meta = load_metadata()
+    others = [
+        {**doc, "eli": meta.get(doc["key"], {}).get("eli"), "status_date": meta.get(doc["key"], {}).get("changeDate")}
+        for doc in load_registry() if doc["source"] not in updated
+    ]
+    return documents + others
+
+
+def run_ingestion(status_date="2026-02-03", documents=None, progress=None):
+    """
+    Aktualizacja korpusu w Qdrant Cloud:
+    - documents: lista dokumentów z rejestru korpusu (corpus_registry) uzupełniona o eli i status_date
+    - każdy akt przetwarzany jest równolegle we własnym potoku, pozostałe akty są kopiowane bez zmian
+      (albo liczone od nowa, gdy schemat wektorów się zmienił - nigdy niepełny korpus)
+    - całość trafia do nowej kolekcji i jest publikowana jedną atomową podmianą aliasu
+    - progress: opcjonalna funkcja(**liczniki) - postęp dla zadania w tle (artykuły, paczki, punkty)
+    """
+    print(f"Rozpoczynam bezpieczną migrację danych do Qdrant Cloud: {QDRANT_URL}")
+    documents = documents if documents is not None else default_documents(status_date)
 
-    print(f"Wgrywanie {len(points)} punktów do kolekcji tymczasowej {temp_collection_name}...")
-    client.upsert(collection_name=temp_collection_name, points=points)
+    # Wczytywanie i przetwarzanie PDF
+    missing = [doc for doc in documents if not os.path.exists(doc["file_path"])]
+    for doc in missing:
+        print(f"Błąd: Nie znaleziono pliku {doc['file_path']}")
+    documents = [doc for doc in documents if doc not in missing]
+    if not documents:
+        return
+
+    # Przygotowanie Kolekcji 
+    ## Tworzy unikalną nazwę dla nowej kolekcji (np. z timestampem)
+    temp_collection_name = f"labor_code_{int(time.time())}"
+
+    ## BM25 (Sparse) do wyszukiwania hybrydowego - jeśli fastembed jest dostępny
+    sparse_model = get_sparse_provider()
+    create_collection(temp_collection_name, with_sparse=sparse_model is not None)
+
+    embedder = get_embedding_provider() ### HF API lub lokalny model - ten sam co przy zapytaniach
+    embedding_model = getattr(embedder, "cache_name", embedder.model_name)
+    ### gotowe paczki z poprzedniego, przerwanego uruchomienia nie są liczone ponownie
+    checkpoint = EmbeddingCheckpoint(INGEST_CHECKPOINT_PATH)
+    ### wspólny limit tempa dla wszystkich aktów (jedno API embeddingów)
+    bucket = TokenBucket(INGEST_EMBED_RATE, INGEST_EMBED_BURST)
+
+    try:
+        # Porównanie z aktualną wersją kolekcji (deterministyczne ID: akt + art_id + hash treści)
+        try:
+            schema_matches = current_schema_matches(with_sparse=sparse_model is not None)
+        except Exception as e:
+            print(f"Nie udało się odczytać aktualnej kolekcji: {e}")
+            schema_matches = False
+        if not schema_matches:
+            ## bez kopiowania - wszystkie akty z rejestru liczone od nowa, inaczej alias wskazałby niepełny korpus
+            documents = complete_documents(documents)
+            print(f"Brak aktualnej kolekcji lub inny schemat wektorów - pełne przeliczenie embeddingów {len(documents)} aktów z rejestru.")
+            missing = [doc["file_path"] for doc in documents if not os.path.exists(doc["file_path"])]
+            if missing:
+                raise RuntimeError(f"Brak plików PDF aktów z rejestru ({', '.join(missing)}) - publikacja niepełnego korpusu przerwana.")
+
+        reusable = {
+            doc["source"]: load_reusable_ids(embedding_model, doc["source"]) if schema_matches and INCREMENTAL_INGESTION else set()
+            for doc in documents
+        }
+
+        print(f"Generowanie wektorów i wgrywanie do kolekcji tymczasowej {temp_collection_name}...")
+        with ThreadPoolExecutor(max_workers=max(INGEST_DOCUMENT_WORKERS, 1) + 1) as pool:
+            jobs = [
+                pool.submit(ingest_document, doc, temp_collection_name, embedder, sparse_model,
+                            checkpoint, reusable[doc["source"]], bucket, progress)
+                for doc in documents
+            ]
+            if schema_matches:
+                jobs.append(pool.submit(copy_other_documents, temp_collection_name, [doc["source"] for doc in documents], progress))
+            results = [job.result() for job in jobs]
+
+        total = sum(result["points"] if isinstance(result, dict) else result for result in results)
+        wait_for_points(temp_collection_name, total)
+
+    except Exception as e:
+        print(f"❌ BŁĄD PODCZAS GENEROWANIA EMBEDDINGÓW LUB WGRYWANIA: {e}")
+        print("Anulowanie aktualizacji! Stara baza produkcyjna pozostaje NIENARUSZONA.")
+        print(f"Gotowe paczki zapisane w {INGEST_CHECKPOINT_PATH} - kolejne uruchomienie wznowi od brakujących.")
+        client.delete_collection(collection_name=temp_collection_name)
+        raise e  # Rzuca błąd dalej, aby FastAPI/n8n wiedziało o porażce
 
     # BEZPRZESTOJOWA ZMIANA ALIASU (Atomowa podmiana)
     print("Przeprowadzenie atomowej podmiany kolekcji w produkcji...")
@@ -112,9 +404,6 @@ def run_ingestion(status_date="2026-02-03"):
     # Sprawdza czy ALIAS_NAME już istnieje jako alias
     existing_aliases = client.get_aliases().aliases
     alias_exists = any(a.alias_name == ALIAS_NAME for a in existing_aliases)
-    old_collections_to_delete = [
-        a.collection_name for a in existing_aliases if a.alias_name == ALIAS_NAME
-    ]
 
     # Tylko dla PIERWSZEJ migracji: usuwa starą ZWYKŁĄ kolekcję (o ile nie jest jeszcze aliasem)
     if not alias_exists and client.collection_exists(ALIAS_NAME):
@@ -144,10 +433,11 @@ def run_ingestion(status_date="2026-02-03"):
         change_aliases_operations=alias_operations
     )
 
-    ## Sprzątanie starych kolekcji po udanej podmianie
-    for old_coll in old_collections_to_delete:
-        if old_coll != temp_collection_name:
-            client.delete_collection(collection_name=old_coll)
+    ## Poprzednia kolekcja zostaje - silniki RAG serwera czytają konkretną kolekcję, nie alias,
+    ## i usuwają ją same po wygaszeniu ostatniego silnika, który jej używał (engine_registry.py)
+
+    ## checkpoint potrzebny tylko do wznowienia przerwanej migracji
+    checkpoint.clear()
 
     print("✅ Sukces! Baza wiedzy (wektorowa) została zaktualizowana bez ani jednej milisekundy przerwy w działaniu bota.")
 
@@ -1,23 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query as QueryParam
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, or_, and_
 from pydantic import BaseModel
+from typing import Optional
 import os
+import json
+import time
 import requests
 
 ### plus importy skryptów do aktualizacji bazy wiedzy
-from labor_code_ingestion_pipeline import get_latest_labor_code_automated, download_specific_unified_text, save_metadata
-from ingest_to_cloud import run_ingestion
-
-from rag_engine import LaborLawRAG
-from database import engine, get_db
-from models import Base, Log, Session as ChatSession
+from corpus_registry import load_registry, select_documents
+from background_jobs import IngestionJobRunner, JobAlreadyRunning
+
+from engine_registry import EngineRegistry
+from utils import close_async_http_client, get_http_pool_stats
+from database import async_engine, get_async_db, AsyncSessionLocal
+from models import Base, Log, SessionSummary, Session as ChatSession
+from history_manager import summary_store, HISTORY_MAX_LOAD_TURNS
+from answer_cache import answer_cache
+from embedding_cache import embedding_cache
+from metrics import (
+    metrics, record_stages, record_request, stage_timer, log_request_timings, cache_stats_collector, METRICS_ENABLED
+)
 
 import uvicorn
 
 # DATABASE MIGRATION
-### sprawdza modele w models.py i jeśli nie ma takich tabel w bazie tworzy je
-Base.metadata.create_all(bind=engine)
+def migrate(connection):
+    ### sprawdza modele w models.py i jeśli nie ma takich tabel w bazie tworzy je
+    Base.metadata.create_all(bind=connection)
+    ### create_all nie dodaje indeksów do już istniejących tabel - nowe indeksy (np. session_id + created_at) osobno
+    for table in (Log.__table__, ChatSession.__table__):
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+# Konfiguracja z .env
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))          ### domyślny rozmiar strony /history i /sessions
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 200))
 
 
 # Inicjalizacja
@@ -28,8 +49,77 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Before"], ### kursor kolejnej strony /history i /sessions
 )
-rag_engine = LaborLawRAG()
+## silnik RAG z podmianą bez restartu (nowa wersja korpusu w Qdrant) - zapytania biorą go przez engines.acquire()
+engines = EngineRegistry()
+
+## aktualizacje bazy wiedzy w tle (osobny proces) - po sukcesie silnik RAG jest od razu podmieniany w tym procesie,
+## pozostałe workery wykryją zmianę aliasu same (engine_registry.py)
+update_jobs = IngestionJobRunner(on_success=engines.reload)
+
+
+def check_admin_key(request):
+    # Proste zabezpieczenie (API Key ze zmiennych środowiskowych)
+    ## w n8n trzeba dodać nagłówek X-Admin-Key
+    admin_key = request.headers.get("X-Admin-Key")
+    ### sprawdza klucz z .env lub używa placeholder'a do testów
+    if admin_key != os.environ.get("ADMIN_API_KEY", "super-tajne-haslo-testowe"):
+        raise HTTPException(status_code=403, detail="Brak uprawnień administratora")
+
+
+# METRYKI - statystyki cache i puli HTTP czytane dopiero przy odczycie /metrics
+def http_pool_samples():
+    return [
+        ("rag_hf_http_requests_total", "counter", {"client": client, "connection": kind}, stats[f"{kind}_connections"])
+        for client, stats in get_http_pool_stats().items()
+        for kind in ("new", "reused")
+    ]
+
+
+metrics.register_collector(cache_stats_collector("answer", answer_cache.stats))
+metrics.register_collector(cache_stats_collector("embedding", embedding_cache.stats))
+metrics.register_collector(http_pool_samples)
+
+
+@app.middleware("http")
+async def measure_requests(request: Request, call_next):
+    ## czas do wysłania nagłówków odpowiedzi - dla SSE pełny czas strumienia jest w rag_stage_duration_seconds
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        ### szablon ścieżki (/sessions/{session_id}) zamiast konkretnego ID - ograniczona liczba serii w Prometheus
+        route = request.scope.get("route")
+        record_request(request.method, getattr(route, "path", "unmatched"), status, time.perf_counter() - start)
+
+
+@app.on_event("startup")
+async def migrate_database():
+    ## migracja przez silnik async (run_sync) - aplikacja nie potrzebuje osobnego sterownika synchronicznego
+    async with async_engine.begin() as connection:
+        await connection.run_sync(migrate)
+
+
+@app.on_event("startup")
+async def warmup_models():
+    ## ładuje lokalne modele (EMBEDDING_PROVIDER/RERANKER_PROVIDER=local) zanim przyjdzie pierwsze pytanie
+    ### plus obserwacja aliasu w Qdrant (podmiana silnika po aktualizacji korpusu)
+    await engines.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    ## zamyka współdzielone połączenia HTTP (HF, Qdrant, Groq)
+    update_jobs.shutdown()
+    await engines.close()
+    await close_async_http_client()
+    await async_engine.dispose()
 
 
 class ChatMessage(BaseModel):
@@ -40,14 +130,168 @@ class ChatMessage(BaseModel):
 class Query(BaseModel):
     question: str
     history: list[ChatMessage] = [] ### lista wiadomości przesyłana z C#
-    ## session_id: str = None  ## to było pole na ID sesji ## NIEAKTUALNE bo logika i baza przechodzi do C#
+    session_id: Optional[str] = None  ## ID sesji - używane tylko przez /ask (frontend React); C# zarządza sesjami sam
+    acts: Optional[list[str]] = None  ## opcjonalnie: nazwy aktów z rejestru korpusu (pole "source"), do których ograniczyć wyszukiwanie
+
+
+class SessionQuery(Query):
+    session_id: str  ## /ask i /ask/stream zapisują logi sesji - brak ID to 422, a nie błąd zapisu do bazy (500)
+
+
+def sse_event(event):
+    ## format Server-Sent Events: nazwa zdarzenia + JSON w polu data
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+async def get_or_create_session(db, query):
+    # zarządzanie sesją - sprawdzenie czy sesja już istnieje w tabeli sessions
+    db_session = await db.get(ChatSession, query.session_id)
+
+    if not db_session:
+        # jeśli nie istnieje tworzy nową sesję ## domyślny tytuł to fragment pytania (pierwsze 30 znaków)
+        short_title = (query.question[:30] + '...') if len(query.question) > 30 else query.question
+        db_session = ChatSession(id=query.session_id, title=short_title)
+        db.add(db_session)
+        await db.commit()
+    return db_session
+
+
+async def save_summary(db, session_id, session_summary, summary, last_log_id):
+    if not session_summary:
+        session_summary = SessionSummary(session_id=session_id)
+        db.add(session_summary)
+    session_summary.summary = summary
+    session_summary.last_log_id = last_log_id
+    await db.commit()
+    return session_summary
+
+
+async def fold_history_gap(db, session_id, rag_engine, session_summary, summary, last_log_id, oldest_loaded):
+    """
+    Tury starsze niż wczytane HISTORY_MAX_LOAD_TURNS, a jeszcze nie w podsumowaniu (np. po kilku nieudanych
+    streszczeniach) - dopisywane do podsumowania paczkami, zamiast pominięte na zawsze.
+    Zwraca (session_summary, podsumowanie, czy cała luka jest już w podsumowaniu).
+    """
+    while True:
+        gap_logs = (await db.execute(
+            keyset_before(
+                select(Log.id, Log.question, Log.answer).where(Log.session_id == session_id, Log.id > last_log_id),
+                Log, oldest_loaded
+            ).order_by(Log.created_at, Log.id).limit(HISTORY_MAX_LOAD_TURNS)
+        )).all()
+        if not gap_logs:
+            return session_summary, summary, True
+        try:
+            summary = await rag_engine.summarize_history(summary, [(log.question, log.answer) for log in gap_logs])
+        except Exception as e:
+            ### luka zostaje w bazie - kolejne pytanie spróbuje ponownie
+            print(f"Błąd streszczania starszej historii sesji {session_id}: {e}")
+            return session_summary, summary, False
+        last_log_id = gap_logs[-1].id
+        session_summary = await save_summary(db, session_id, session_summary, summary, last_log_id)
+
+
+async def load_chat_history(db, session_id, rag_engine, timings=None):
+    """
+    Zwraca (podsumowanie starszej części rozmowy lub None, ostatnie tury dosłownie) w budżecie tokenów.
+    Podsumowanie jest zapisane w session_summaries, więc streszczane są tylko nowe tury.
+    """
+    timings = timings if timings is not None else {}
+    with stage_timer(timings, "db_history"):
+        session_summary = await db.get(SessionSummary, session_id)
+        summary = session_summary.summary if session_summary else None
+        last_log_id = session_summary.last_log_id if session_summary else 0
+
+        ### tylko ostatnie HISTORY_MAX_LOAD_TURNS logów (jeszcze nie w podsumowaniu) i tylko potrzebne kolumny -
+        ### indeks (session_id, created_at) czytany od końca, koszt nie rośnie z długością rozmowy
+        ### (jeden więcej - czy przed nimi jest luka do streszczenia)
+        history_logs = (await db.execute(
+            select(Log.id, Log.created_at, Log.question, Log.answer).where(
+                Log.session_id == session_id,
+                Log.id > last_log_id
+            ).order_by(Log.created_at.desc(), Log.id.desc()).limit(HISTORY_MAX_LOAD_TURNS + 1)
+        )).all()
+        gap_folded = len(history_logs) <= HISTORY_MAX_LOAD_TURNS
+        history_logs = history_logs[:HISTORY_MAX_LOAD_TURNS]
+        history_logs.reverse()  ## od najstarszych
+        ### formatowanie logów do postaci listy krotek: [(pytanie, odpowiedź), ...]
+        chat_history = [(log.question, log.answer) for log in history_logs]
+
+    if not gap_folded:
+        with stage_timer(timings, "history_gap"):
+            session_summary, summary, gap_folded = await fold_history_gap(
+                db, session_id, rag_engine, session_summary, summary, last_log_id, history_logs[0]
+            )
+
+    with stage_timer(timings, "history_compact"):
+        summary, folded, chat_history = await rag_engine.compact_history(chat_history, summary)
+    ## last_log_id nie może przeskoczyć nie-streszczonej luki - wtedy podsumowanie tylko dla tej odpowiedzi
+    if folded and gap_folded:
+        with stage_timer(timings, "db_summary"):
+            await save_summary(db, session_id, session_summary, summary, history_logs[folded - 1].id)
+    return summary, chat_history
+
+
+async def compact_stateless_history(rag_engine, chat_history):
+    ## legal-brain nie ma sesji w bazie - podsumowanie zapamiętane po hashu streszczonego początku rozmowy
+    summary, covered = summary_store.find(chat_history)
+    summary, folded, recent = await rag_engine.compact_history(chat_history[covered:], summary)
+    if folded:
+        summary_store.store(chat_history[:covered + folded], summary)
+    return summary, recent
+
+
+def pair_history(history):
+    ## konwertuje listę ChatMessage na listę krotek [(q, a), (q, a)...] którą rozumie funkcja rag_engine.ask
+    formatted_history = []
+    for i in range(0, len(history), 2):
+        if i + 1 < len(history):
+            ## paruje: Pytanie użytkownika i odpowiedź asystenta
+            formatted_history.append((history[i].content, history[i+1].content))
+    return formatted_history
+
+
+def page_limit(limit, before=None):
+    ## bez limit i before - cała lista jak dotychczas (frontend nie czyta X-Next-Before); None = bez LIMIT w SQL
+    if limit is None and before is None:
+        return None
+    return max(1, min(limit or HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE))
+
+
+def page_query_limit(limit):
+    ### o jeden więcej - czy jest kolejna strona
+    return limit + 1 if limit else None
+
+
+def keyset_before(query, model, cursor_row):
+    ## stronicowanie po (created_at, id): wszystko "starsze" od kursora - bez OFFSET, który czyta pominięte wiersze
+    if cursor_row is None:
+        return query
+    return query.where(or_(
+        model.created_at < cursor_row.created_at,
+        and_(model.created_at == cursor_row.created_at, model.id < cursor_row.id)
+    ))
 
 
 # ENDPOINT z przywracaniem wiadomości dla danego session_id
+## stronicowanie od najnowszych: ?limit=50, kolejna (starsza) strona: ?before=<wartość nagłówka X-Next-Before>
+## bez obu parametrów - cała historia sesji
 @app.get("/history/{session_id}")
-async def get_history(session_id: str, db: Session = Depends(get_db)):
-    # Pobiera wszystkie logi dla tej sesji, od najstarszych
-    logs = db.query(Log).filter(Log.session_id == session_id).order_by(Log.created_at.asc()).all()
+async def get_history(session_id: str, response: Response, limit: int = None, before: int = None, db: AsyncSession = Depends(get_async_db)):
+    limit = page_limit(limit, before)
+    cursor = (await db.execute(
+        select(Log.id, Log.created_at).where(Log.session_id == session_id, Log.id == before)
+    )).first() if before else None
+
+    # Pobiera ostatnie logi tej sesji
+    query = select(Log.id, Log.created_at, Log.question, Log.answer, Log.sources).where(Log.session_id == session_id)
+    logs = (await db.execute(
+        keyset_before(query, Log, cursor).order_by(Log.created_at.desc(), Log.id.desc()).limit(page_query_limit(limit))
+    )).all()
+    if limit and len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Before"] = str(logs[-1].id)
+    logs.reverse()  ## dymki od najstarszych
     
     # Przekształca je na format, który rozumie Frontend (dymki)
     history = []
@@ -62,113 +306,113 @@ async def get_history(session_id: str, db: Session = Depends(get_db)):
     return history
 
 
-# ENDPOINT do pobierania wszystkich sesji
+# ENDPOINT do pobierania sesji (od najnowszych, stronicowanie jak w /history: ?limit=, ?before=<id sesji>; bez nich - wszystkie)
 @app.get("/sessions")
-async def get_all_sessions(db: Session = Depends(get_db)):
-    # Pobiera wszystkie sesje posortowane od najnowszych
-    return db.query(ChatSession).order_by(ChatSession.created_at.desc()).all()
+async def get_all_sessions(response: Response, limit: int = None, before: str = None, db: AsyncSession = Depends(get_async_db)):
+    limit = page_limit(limit, before)
+    cursor = (await db.execute(
+        select(ChatSession.id, ChatSession.created_at).where(ChatSession.id == before)
+    )).first() if before else None
+
+    sessions = (await db.scalars(
+        keyset_before(select(ChatSession), ChatSession, cursor).order_by(
+            ChatSession.created_at.desc(), ChatSession.id.desc()
+        ).limit(page_query_limit(limit))
+    )).all()
+    if limit and len(sessions) > limit:
+        sessions = sessions[:limit]
+        response.headers["X-Next-Before"] = sessions[-1].id
+    return sessions
 
 
 # ENDPOINT do zmiany nazwy sesji
 @app.patch("/sessions/{session_id}")
-async def update_session_title(session_id: str, title: str, db: Session = Depends(get_db)):
-    db_session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+async def update_session_title(session_id: str, title: str, db: AsyncSession = Depends(get_async_db)):
+    db_session = await db.get(ChatSession, session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Sesja nie znaleziona")
     db_session.title = title
-    db_session.commit()
+    await db.commit()
     return db_session
 
 
 # ENDPOINT do usuwania sesji
 @app.delete("/sessions/{session_id}")
-async def delete_session(session_id: str, db: Session = Depends(get_db)):
-    db_session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+async def delete_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
+    db_session = await db.get(ChatSession, session_id)
     if not db_session:
         raise HTTPException(status_code=404, detail="Sesja nie znaleziona")
     
-    db.delete(db_session)
-    db.commit()
+    ## usuwanie zapytaniami DELETE - kaskada ORM ładowałaby najpierw wszystkie logi sesji (leniwe ładowanie nie działa w AsyncSession)
+    await db.execute(delete(Log).where(Log.session_id == session_id))
+    await db.execute(delete(SessionSummary).where(SessionSummary.session_id == session_id))
+    await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+    await db.commit()
     return {"message": "Sesja i powiązane logi zostały usunięte"}
 
 
+# ENDPOINT z listą aktów prawnych w korpusie (wartości "source" można przekazać w polu acts zapytania)
+@app.get("/api/v1/corpus")
+async def get_corpus():
+    return [{"key": doc["key"], "source": doc["source"]} for doc in load_registry()]
+
+
 # ENDPOINT DO AKTUALIZACJI BAZY WIEDZY ### ten endpoint będzie wywoływany przez n8n aby sprawdzić i pobrać nowe prawo
-@app.post("/api/v1/admin/update-knowledge")
-async def update_legal_knowledge(request: Request):
-    # 1. Proste zabezpieczenie (API Key ze zmiennych środowiskowych)
-    ## w n8n trzeba dodać nagłówek X-Admin-Key
-    admin_key = request.headers.get("X-Admin-Key")
-    ### sprawdza klucz z .env lub używa placeholder'a do testów
-    if admin_key != os.environ.get("ADMIN_API_KEY", "super-tajne-haslo-testowe"):
-        raise HTTPException(status_code=403, detail="Brak uprawnień administratora")
+## aktualizacja trwa minuty - endpoint tylko kolejkuje zadanie w tle i zwraca jego ID (202), postęp: /api/v1/admin/jobs/{job_id}
+### przy kilku workerach uvicorn druga aktualizacja dostaje 409 (blokada pliku INGEST_LOCK_PATH), ale stan zadania
+### zna tylko worker, który je przyjął - n8n powinien pytać o postęp ten sam proces (albo serwer z --workers 1).
+### Kilka maszyn: INGEST_LOCK_PATH nie chroni - aktualizacje uruchamiać tylko na jednej instancji
+@app.post("/api/v1/admin/update-knowledge", status_code=202)
+async def update_legal_knowledge(request: Request, document: list[str] = QueryParam(None)):
+    check_admin_key(request)
+
+    print("--- ROZPOCZĘTO SPRAWDZANIE AKTUALIZACJI PRAWA ---")
+    # Akty z rejestru korpusu (?document=klucz lub wszystkie) - błędny klucz zgłaszany od razu, nie w zadaniu
+    try:
+        select_documents(document)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     try:
-        print("--- ROZPOCZĘTO SPRAWDZANIE AKTUALIZACJI PRAWA ---")
-        
-        # 2. Uruchomienie Pipeline: Sprawdzenie czy jest nowa wersja
-        url, eli, c_date = get_latest_labor_code_automated()
-        
-        if not url:
-            return {"status": "skipped", "message": "Posiadasz już najnowszą wersję lub błąd ISAP"}
+        job = update_jobs.submit(document)
+    except JobAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job["id"]})
 
-        # 3. Pobranie pliku PDF
-        success_download = download_specific_unified_text(target_eli=eli, pdf_url=url)
-        
-        if success_download:
-            # 4. PRZETWARZANIE DO QDRANT
-            print("--- URUCHAMIANIE INGESTION DO QDRANT CLOUD ---")
-            run_ingestion(status_date=c_date) ### wywołuje skrypt ingest_to_cloud.py
-            #### przekazuje zmienną c_date, którą funkcja get_latest_labor_code_automated() wyciągnęła wcześniej z ISAP
-            
-            # zapisuje metadane dopiero gdy proces (pobranie + Qdrant) się uda
-            save_metadata(eli, c_date)
-            
-            # 5. Odświeżenie silnika RAG (żeby widział nowe dane bez restartu serwera)
-            global rag_engine
-            rag_engine = LaborLawRAG()
-            
-            return {
-                "status": "success",
-                "message": f"Zaktualizowano bazę wiedzy do wersji: {eli}",
-                "details": "Pobrano PDF i zaktualizowano kolekcję w Qdrant Cloud.",
-                "updated_at": c_date
-            }
-        
-        return {"status": "error", "message": "Błąd podczas pobierania PDF"}
+    return {
+        "status": "accepted",
+        "job_id": job["id"],
+        "status_url": f"/api/v1/admin/jobs/{job['id']}"
+    }
 
-    except Exception as e:
-        print(f"BŁĄD PODCZAS AKTUALIZACJI: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+# ENDPOINT ZE STANEM ZADANIA AKTUALIZACJI (status, etap, liczniki postępu, wynik lub błąd)
+@app.get("/api/v1/admin/jobs/{job_id}")
+async def get_update_job(job_id: str, request: Request):
+    check_admin_key(request)
+    job = update_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Zadanie nie znalezione")
+    return job
 
 
 # ENDPOINT Z LOGOWANIEM
 @app.post("/ask")
-async def ask_lawyer(query: Query, db: Session = Depends(get_db)):
+async def ask_lawyer(query: SessionQuery, db: AsyncSession = Depends(get_async_db)):
     try:
         print(f"--- NOWE ZAPYTANIE OD: {query.session_id} ---")
-        
-        # zarządzanie sesją - sprawdzenie czy sesja już istnieje w tabeli sessions
-        db_session = db.query(ChatSession).filter(ChatSession.id == query.session_id).first()
-
-        if not db_session:
-            # jeśli nie istnieje tworzy nową sesję ## domyślny tytuł to fragment pytania (pierwsze 30 znaków)
-            short_title = (query.question[:30] + '...') if len(query.question) > 30 else query.question
-            db_session = ChatSession(id=query.session_id, title=short_title)
-            db.add(db_session)
-            db.commit()
-
-        # 1. Pobiera historię rozmowy dla danej sesji z bazy danych
-        chat_history = []
-        ### szuka logów z tym samym session_id posortowanych od najstarszych
-        history_logs = db.query(Log).filter(
-            Log.session_id == query.session_id
-        ).order_by(Log.created_at.asc()).all()
-        ### formatowanie logów do postaci listy krotek: [(pytanie, odpowiedź), ...]
-        chat_history = [(log.question, log.answer) for log in history_logs]
+        db_timings = {} ### czasy operacji na bazie (etapy silnika RAG są w result["timings"])
+
+        with stage_timer(db_timings, "db_session"):
+            await get_or_create_session(db, query)
+
+        ## jeden silnik RAG na całe zapytanie (podmiana po aktualizacji korpusu nie przerywa go w połowie)
+        async with engines.acquire() as rag_engine:
+            # 1. Pobiera historię rozmowy dla danej sesji z bazy danych (podsumowanie + ostatnie tury)
+            summary, chat_history = await load_chat_history(db, query.session_id, rag_engine, db_timings)
 
-        # 2. Przekazuje historię do silnika RAG ### plus uzyskuje odpowiedź od AI
-        #### przekazywany jest też drugi argument: chat_history
-        result = rag_engine.ask(query.question, chat_history=chat_history) ### result to słownik: {"answer": "...", "sources": [...]}
+            # 2. Przekazuje historię do silnika RAG ### plus uzyskuje odpowiedź od AI
+            #### przekazywany jest też drugi argument: chat_history
+            result = await rag_engine.ask(query.question, chat_history=chat_history, summary=summary, acts=query.acts) ### result to słownik: {"answer": "...", "sources": [...]}
         
         # 3. Zapis nowego zapytania wraz z session_id w bazie ### utworzenie obiekt logu do zapisu w Postgres
         new_log = Log(
@@ -179,9 +423,12 @@ async def ask_lawyer(query: Query, db: Session = Depends(get_db)):
         )
         
         # 4. Zapis w bazie danych
-        db.add(new_log)
-        db.commit()
-        db.refresh(new_log) ## odświeżanie by np. dostać ID z bazy
+        with stage_timer(db_timings, "db_write"):
+            db.add(new_log)
+            await db.commit()
+            await db.refresh(new_log) ## odświeżanie by np. dostać ID z bazy
+        record_stages(db_timings)
+        log_request_timings("/ask", {**db_timings, **result.get("timings", {})}, session_id=query.session_id)
         
         # 5. Zwraca odpowiedź do frontendu
         return {
@@ -194,10 +441,59 @@ async def ask_lawyer(query: Query, db: Session = Depends(get_db)):
         }
         
     except Exception as e:
-        db.rollback() ### w razie błędu wycofuje zmiany w bazie
+        await db.rollback() ### w razie błędu wycofuje zmiany w bazie
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ENDPOINT Z LOGOWANIEM - wersja strumieniowa (SSE): najpierw źródła, potem kolejne fragmenty odpowiedzi
+@app.post("/ask/stream")
+async def ask_lawyer_stream(query: SessionQuery, db: AsyncSession = Depends(get_async_db)):
+    try:
+        print(f"--- NOWE ZAPYTANIE (STREAM) OD: {query.session_id} ---")
+        db_timings = {}
+        with stage_timer(db_timings, "db_session"):
+            await get_or_create_session(db, query)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        try:
+            ## jeden silnik RAG na cały strumień: streszczenie historii, wyszukiwanie i generowanie na tej samej
+            ## wersji korpusu, a stary silnik nie zostanie wygaszony w trakcie (historia - własna sesja DB, jak zapis logu)
+            async with engines.acquire() as rag_engine:
+                async with AsyncSessionLocal() as history_db:
+                    summary, chat_history = await load_chat_history(history_db, query.session_id, rag_engine, db_timings)
+                async for event in rag_engine.ask_stream(query.question, chat_history=chat_history, summary=summary, acts=query.acts):
+                    if event["type"] == "done":
+                        ## zapis logu dopiero po zakończeniu strumienia - własna sesja DB,
+                        ## bo sesja z Depends jest zamykana zanim ruszy StreamingResponse
+                        async with AsyncSessionLocal() as log_db:
+                            try:
+                                with stage_timer(db_timings, "db_write"):
+                                    new_log = Log(
+                                        session_id=query.session_id,
+                                        question=query.question,
+                                        answer=event["answer"],
+                                        sources=event["sources"]
+                                    )
+                                    log_db.add(new_log)
+                                    await log_db.commit()
+                                    await log_db.refresh(new_log)
+                                event = {**event, "id": new_log.id, "session_id": query.session_id, "timestamp": new_log.created_at}
+                            except Exception:
+                                await log_db.rollback()
+                                raise
+                        record_stages(db_timings)
+                        log_request_timings("/ask/stream", {**db_timings, **event.get("timings", {})}, session_id=query.session_id)
+                    yield sse_event(event)
+        except Exception as e:
+            print(f"BŁĄD STREAMINGU: {str(e)}")
+            yield sse_event({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 # PROXY DLA TELEGRAMA (omija blokady Hugging Face)
 @app.api_route("/tg-proxy/{path:path}", methods=["GET", "POST"])
 async def tg_proxy(path: str, request: Request):
@@ -236,15 +532,13 @@ async def ask_legal_brain(query: Query):
     try:
         ## wywołuje silnik RAG bez pobierania historii z bazy Pythona
         ## jeśli C# będzie chciał uwzględnić historię prześle ją w pytaniu
-        ## konwertuje listę ChatMessage na listę krotek [(q, a), (q, a)...] którą rozumie funkcja rag_engine.ask
-        formatted_history = []
-        for i in range(0, len(query.history), 2):
-            if i + 1 < len(query.history):
-                ## paruje: Pytanie użytkownika i odpowiedź asystenta
-                formatted_history.append((query.history[i].content, query.history[i+1].content))
-
-        ### teraz wywołuje RAG z prawdziwą historią i działającym rewrite_query
-        result = rag_engine.ask(query.question, chat_history=formatted_history)
+        formatted_history = pair_history(query.history)
+        async with engines.acquire() as rag_engine:
+            summary, formatted_history = await compact_stateless_history(rag_engine, formatted_history)
+
+            ### teraz wywołuje RAG z prawdziwą historią i działającym rewrite_query
+            result = await rag_engine.ask(query.question, chat_history=formatted_history, summary=summary, acts=query.acts)
+        log_request_timings("/api/v1/legal-brain/ask", result.get("timings"))
         
         return {
             "answer": result["answer"],
@@ -255,6 +549,34 @@ async def ask_legal_brain(query: Query):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ENDPOINT DLA BACKENDU C# - wersja strumieniowa (SSE), również bez logowania do bazy
+@app.post("/api/v1/legal-brain/ask/stream")
+async def ask_legal_brain_stream(query: Query):
+    formatted_history = pair_history(query.history)
+
+    async def event_stream():
+        try:
+            async with engines.acquire() as rag_engine:
+                summary, recent_history = await compact_stateless_history(rag_engine, formatted_history)
+                async for event in rag_engine.ask_stream(query.question, chat_history=recent_history, summary=summary, acts=query.acts):
+                    if event["type"] == "done":
+                        log_request_timings("/api/v1/legal-brain/ask/stream", event.get("timings"))
+                    yield sse_event(event)
+        except Exception as e:
+            print(f"BŁĄD LEGAL-BRAIN (STREAM): {str(e)}")
+            yield sse_event({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+# ENDPOINT z metrykami w formacie Prometheus (czasy etapów, ponowienia, fallbacki, cache)
+@app.get("/metrics")
+async def get_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metryki są wyłączone (METRICS_ENABLED=false)")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "database": "connected"}
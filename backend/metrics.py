@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfiguracja z .env
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+REQUEST_TIMING_LOG = os.getenv("REQUEST_TIMING_LOG", "false").lower() == "true"  ### jedna linia JSON z czasami etapów na zapytanie
+## granice kubełków histogramów (sekundy) - od wyszukiwania w Qdrant (ms) do odpowiedzi LLM-a (s)
+METRICS_LATENCY_BUCKETS = [float(b) for b in os.getenv(
+    "METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+).split(",")]
+
+## opisy metryk (# HELP w formacie Prometheus)
+METRIC_HELP = {
+    "rag_stage_duration_seconds": "Czas etapu obsługi pytania (rewrite, embed, search, rerank, llm, operacje DB...)",
+    "http_request_duration_seconds": "Czas obsługi zapytania HTTP (dla SSE - do wysłania nagłówków)",
+    "http_requests_total": "Liczba zapytań HTTP",
+    "rag_retries_total": "Ponowienia wywołań zewnętrznych usług",
+    "rag_fallbacks_total": "Użycia ścieżek awaryjnych (np. kolejność z Qdrant zamiast rerankingu)",
+    "rag_article_index_total": "Pytania o konkretne artykuły obsłużone przez indeks artykułów",
+    "rag_engine_reloads_total": "Podmiany silnika RAG po zmianie wersji korpusu (udane / nieudane rozgrzewanie)",
+    "rag_cache_events_total": "Zdarzenia cache (trafienia, chybienia, unieważnienia...)",
+    "rag_cache_size": "Liczba wpisów w cache",
+    "rag_hf_http_requests_total": "Zapytania do HF przez nowe / ponownie użyte połączenia keep-alive"
+}
+
+
+def escape_label_value(value):
+    ## format tekstowy Prometheus: backslash, cudzysłów i nowa linia muszą być escapowane
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    Liczniki i histogramy w pamięci procesu, eksportowane w formacie tekstowym Prometheus (/metrics).
+    - bez zewnętrznych zależności - aktualizacja to słownik pod jednym lockiem
+    - collectors: funkcje wołane dopiero przy odczycie /metrics (np. statystyki cache), bez kosztu na ścieżce zapytania
+    Każdy worker uvicorna ma własny rejestr - Prometheus sumuje je po etykiecie instancji.
+    """
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = sorted(buckets)
+        self._counters = {}    ### (nazwa, etykiety) -> wartość
+        self._histograms = {}  ### (nazwa, etykiety) -> [liczniki kubełków..., suma, liczba]
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def register_collector(self, collector):
+        """collector() -> lista (nazwa, typ, etykiety jako dict, wartość)."""
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        families = {}  ### nazwa -> (typ, linie)
+        for (name, labels), value in sorted(counters.items()):
+            families.setdefault(name, ("counter", []))[1].append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            lines = families.setdefault(name, ("histogram", []))[1]
+            ## kubełki w Prometheus są skumulowane (observe zwiększa wszystkie pasujące)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{name}_sum{format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"Błąd kolektora metryk: {e}")
+                continue
+            for name, metric_type, labels, value in samples:
+                families.setdefault(name, (metric_type, []))[1].append(
+                    f"{name}{format_labels(tuple(sorted(labels.items())))} {value}"
+                )
+
+        output = []
+        for name, (metric_type, lines) in families.items():
+            output.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+## współdzielona instancja dla całego procesu
+metrics = MetricsRegistry()
+
+
+# FUNKCJE DLA ŚCIEŻKI ZAPYTANIA - przy METRICS_ENABLED=false kończą się na jednym if
+
+def inc(name, value=1, **labels):
+    if METRICS_ENABLED:
+        metrics.inc(name, value, **labels)
+
+
+def record_retry(operation):
+    if METRICS_ENABLED:
+        metrics.inc("rag_retries_total", operation=operation)
+
+
+def record_fallback(reason):
+    if METRICS_ENABLED:
+        metrics.inc("rag_fallbacks_total", reason=reason)
+
+
+def record_stages(timings):
+    """Czasy etapów (słownik timings z silnika RAG lub main.py, w sekundach) -> histogram per etap."""
+    if METRICS_ENABLED and timings:
+        for stage, seconds in timings.items():
+            metrics.observe("rag_stage_duration_seconds", seconds, stage=stage)
+
+
+def record_request(method, route, status, seconds):
+    if METRICS_ENABLED:
+        metrics.observe("http_request_duration_seconds", seconds, method=method, route=route)
+        metrics.inc("http_requests_total", method=method, route=route, status=status)
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    ## dopisuje czas bloku do słownika timings (jak perf_counter w rag_engine) - także gdy blok rzuci wyjątek
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def log_request_timings(endpoint, timings, **fields):
+    """Opcjonalny log strukturalny: jedna linia JSON na zapytanie z czasami etapów w ms."""
+    if REQUEST_TIMING_LOG:
+        stages = {stage: round(seconds * 1000, 2) for stage, seconds in (timings or {}).items()}
+        print(json.dumps({"event": "request_timings", "endpoint": endpoint, **fields, "stages_ms": stages}, ensure_ascii=False))
+
+
+def cache_stats_collector(cache_name, stats_fn):
+    """Kolektor dla obiektów ze stats() (answer_cache, embedding_cache): liczniki zdarzeń + rozmiar."""
+    def collect():
+        stats = stats_fn()
+        samples = [
+            ("rag_cache_events_total", "counter", {"cache": cache_name, "event": event}, value)
+            for event, value in stats.items() if event != "size"
+        ]
+        if "size" in stats:
+            samples.append(("rag_cache_size", "gauge", {"cache": cache_name}, stats["size"]))
+        return samples
+    return collect
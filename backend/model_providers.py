@@ -0,0 +1,269 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+from utils import (
+    get_embeddings, async_get_embeddings, query_hf_api, async_query_hf_api,
+    EMBEDDING_MODEL, RERANK_URL
+)
+from embedding_cache import embedding_cache
+from metrics import record_fallback
+from qdrant_client.http import models
+
+try:
+    ### opcjonalne - lokalne modele ONNX na CPU (pip install fastembed)
+    from fastembed import TextEmbedding, SparseTextEmbedding
+    from fastembed.rerank.cross_encoder import TextCrossEncoder
+except ImportError:
+    TextEmbedding = None
+    SparseTextEmbedding = None
+    TextCrossEncoder = None
+
+load_dotenv()
+
+# Konfiguracja z .env
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "hf")  ### hf | local
+RERANKER_PROVIDER = os.getenv("RERANKER_PROVIDER", "hf")    ### hf | local
+LOCAL_RERANKER_MODEL = os.getenv("LOCAL_RERANKER_MODEL", "BAAI/bge-reranker-v2-m3")  ### w fastembed od 0.5 (requirements: 0.9.0)
+## wielojęzyczny cross-encoder obsługiwany przez każdą wersję fastembed z TextCrossEncoder
+LOCAL_RERANKER_FALLBACK_MODEL = os.getenv("LOCAL_RERANKER_FALLBACK_MODEL", "jinaai/jina-reranker-v2-base-multilingual")
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", 0)) or None  ### None = tyle ile rdzeni
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 32))
+LOCAL_RERANK_BATCH_SIZE = int(os.getenv("LOCAL_RERANK_BATCH_SIZE", 16))
+SPARSE_MODEL = os.getenv("SPARSE_MODEL", "Qdrant/bm25")  ### słowa kluczowe / numery artykułów
+
+## nazwy wektorów w kolekcji Qdrant (wspólne dla ingestion i silnika RAG)
+DENSE_VECTOR_NAME = "dense"
+SPARSE_VECTOR_NAME = "text-sparse"
+
+
+def extract_dense_vector(hf_resp):
+    """Wyciąga pojedynczy wektor z odpowiedzi HF feature-extraction."""
+    ### HF API dla feature-extraction zwraca zazwyczaj [[wektor]]
+    ### HF często zwraca listę list [[...]] -> wyciąganie pierwszego wektora
+    if isinstance(hf_resp, list) and isinstance(hf_resp[0], list):
+        return hf_resp[0]
+    elif isinstance(hf_resp, list):
+        return hf_resp
+    raise Exception(f"Nieoczekiwany format wektora z HF: {hf_resp}")
+
+
+def parse_hf_rerank_scores(rerank_resp):
+    """Zamienia odpowiedź cross-encodera z HF na listę liczb (w kolejności wysłanych par) lub None."""
+    ### DIAGNOSTYKA (wyłączona żeby nie zaśmiecać logów produkcyjnych)
+    ### print(f"🔍 [DEBUG RERANKER] Typ: {type(rerank_resp)} | Zawartość: {str(rerank_resp)[:500]}")
+
+    # Jeśli Hugging Face przysłał zagnieżdżoną listę [[ ... ]], wyciąga jej środek:
+    if rerank_resp and isinstance(rerank_resp, list) and len(rerank_resp) > 0 and isinstance(rerank_resp[0], list):
+        rerank_resp = rerank_resp[0]
+
+    if not rerank_resp or not isinstance(rerank_resp, list):
+        return None
+
+    try:
+        ### HF zwraca [{'label': 'LABEL_0', 'score': 0.99}, ...]
+        scores = []
+        for r in rerank_resp:
+            ## Bezpieczne wyciąganie score niezależnie czy HF zwrócił słownik, czy listę słowników
+            if isinstance(r, dict):
+                scores.append(r.get('score', 0))
+            elif isinstance(r, list) and len(r) > 0 and isinstance(r[0], dict):
+                scores.append(r[0].get('score', 0))
+            elif isinstance(r, (int, float)):
+                scores.append(r)
+            else:
+                scores.append(0)
+        return scores
+    except Exception as e:
+        print(f"Błąd parsowania odpowiedzi rerankera, używam kolejności z Qdrant. Szczegóły: {e}")
+        record_fallback("rerank_parse")
+        return None
+
+
+# EMBEDDINGI
+
+class HFEmbeddingProvider:
+    """Zdalny model E5 przez Hugging Face Inference API (domyślny)."""
+
+    model_name = EMBEDDING_MODEL
+    is_remote = True
+
+    def embed(self, texts, is_query=False):
+        return get_embeddings(list(texts), is_query=is_query)
+
+    async def aembed(self, texts, is_query=False):
+        return await async_get_embeddings(list(texts), is_query=is_query)
+
+    def embed_query(self, text):
+        ## utils.get_embeddings sam korzysta z embedding_cache
+        return extract_dense_vector(get_embeddings(text, is_query=True))
+
+    async def aembed_query(self, text):
+        return extract_dense_vector(await async_get_embeddings(text, is_query=True))
+
+    def warmup(self):
+        pass
+
+
+class LocalEmbeddingProvider:
+    """
+    Lokalny model E5 (ONNX przez fastembed) na CPU:
+    - brak zależności od zewnętrznego API na ścieżce zapytania
+    - inferencja paczkami (batch_size) i z kontrolą liczby wątków
+    """
+
+    is_remote = False
+
+    def __init__(self, model_name=EMBEDDING_MODEL, threads=LOCAL_MODEL_THREADS, batch_size=LOCAL_EMBEDDING_BATCH_SIZE):
+        if TextEmbedding is None:
+            raise ImportError("EMBEDDING_PROVIDER=local wymaga pakietu fastembed (pip install fastembed)")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = TextEmbedding(model_name=model_name, threads=threads)
+        ### osobny klucz w cache, żeby nie mieszać wektorów z HF i z lokalnego ONNX
+        self.cache_name = f"fastembed/{model_name}"
+
+    def embed(self, texts, is_query=False):
+        # Model E5 wymaga przedrostka (tak samo jak w utils.build_embedding_payload)
+        prefix = "query: " if is_query else "passage: "
+        formatted = [f"{prefix}{t}" for t in texts]
+        return [vec.tolist() for vec in self.model.embed(formatted, batch_size=self.batch_size)]
+
+    async def aembed(self, texts, is_query=False):
+        ## inferencja na CPU w wątku, żeby nie blokować pętli zdarzeń
+        return await asyncio.to_thread(self.embed, texts, is_query)
+
+    def embed_query(self, text):
+        cached = embedding_cache.get(text, self.cache_name)
+        if cached is not None:
+            return cached
+        vector = self.embed([text], is_query=True)[0]
+        embedding_cache.set(text, self.cache_name, vector)
+        return vector
+
+    async def aembed_query(self, text):
+        cached = await embedding_cache.aget(text, self.cache_name)
+        if cached is not None:
+            return cached
+        vector = (await self.aembed([text], is_query=True))[0]
+        await embedding_cache.aset(text, self.cache_name, vector)
+        return vector
+
+    def warmup(self):
+        ## pierwsze wywołanie ładuje sesję ONNX - robi to przy starcie, a nie przy pierwszym pytaniu
+        self.embed(["rozgrzewka"], is_query=True)
+
+
+# SPARSE (BM25) - zawsze lokalnie, bo to tylko tokenizacja i zliczanie (bez sieci neuronowej)
+
+class LocalSparseProvider:
+    """Wektory rzadkie BM25 (fastembed) dla wyszukiwania hybrydowego - jak w research/rebuild_qdrant_hybrid.ipynb."""
+
+    def __init__(self, model_name=SPARSE_MODEL):
+        if SparseTextEmbedding is None:
+            raise ImportError("Wyszukiwanie hybrydowe wymaga pakietu fastembed (pip install fastembed)")
+        self.model_name = model_name
+        self.model = SparseTextEmbedding(model_name=model_name)
+
+    @staticmethod
+    def _to_qdrant(embedding):
+        return models.SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+
+    def embed(self, texts):
+        return [self._to_qdrant(e) for e in self.model.embed(list(texts))]
+
+    def embed_query(self, text):
+        ### BM25 dla zapytań liczy się inaczej niż dla dokumentów (bez wag TF) - stąd query_embed
+        return self._to_qdrant(next(iter(self.model.query_embed(text))))
+
+    def warmup(self):
+        self.embed_query("rozgrzewka")
+
+
+# RERANKERY (Cross-Encoder) - zwracają listę wyników w kolejności dokumentów lub None
+
+class HFRerankerProvider:
+    """Zdalny bge-reranker-v2-m3 przez Hugging Face Inference API (domyślny)."""
+
+    is_remote = True
+
+    def __init__(self, url=RERANK_URL):
+        self.url = url
+
+    @staticmethod
+    def build_payload(query, documents):
+        #### format słownikowy dla Hugging Face Inference API (obsługa par tekstowych)
+        return {"inputs": [{"text": query, "text_pair": doc} for doc in documents]}
+
+    def score(self, query, documents):
+        return parse_hf_rerank_scores(query_hf_api(self.url, self.build_payload(query, documents)))
+
+    async def ascore(self, query, documents):
+        return parse_hf_rerank_scores(await async_query_hf_api(self.url, self.build_payload(query, documents)))
+
+    def warmup(self):
+        pass
+
+
+def supported_reranker_model(model_name, fallback=LOCAL_RERANKER_FALLBACK_MODEL):
+    """Model z listy fastembed; nieobsługiwany (np. starsza wersja pakietu) -> model zapasowy zamiast błędu przy pierwszym pytaniu."""
+    supported = {model["model"].lower() for model in TextCrossEncoder.list_supported_models()}
+    if model_name.lower() in supported:
+        return model_name
+    print(f"Reranker {model_name} nie jest obsługiwany przez zainstalowany fastembed - używam {fallback}")
+    record_fallback("local_reranker_model")
+    return fallback
+
+
+class LocalRerankerProvider:
+    """Lokalny cross-encoder (ONNX przez fastembed) na CPU."""
+
+    is_remote = False
+
+    def __init__(self, model_name=LOCAL_RERANKER_MODEL, threads=LOCAL_MODEL_THREADS, batch_size=LOCAL_RERANK_BATCH_SIZE):
+        if TextCrossEncoder is None:
+            raise ImportError("RERANKER_PROVIDER=local wymaga pakietu fastembed (pip install fastembed)")
+        self.model_name = supported_reranker_model(model_name)
+        self.batch_size = batch_size
+        self.model = TextCrossEncoder(model_name=self.model_name, threads=threads)
+
+    def score(self, query, documents):
+        return [float(s) for s in self.model.rerank(query, list(documents), batch_size=self.batch_size)]
+
+    async def ascore(self, query, documents):
+        return await asyncio.to_thread(self.score, query, documents)
+
+    def warmup(self):
+        self.score("rozgrzewka", ["rozgrzewka"])
+
+
+## jedna instancja na proces - lokalny model ładuje się raz, a nie przy każdym nowym LaborLawRAG
+_embedding_provider = None
+_reranker_provider = None
+_sparse_provider = None
+
+
+def get_embedding_provider():
+    global _embedding_provider
+    if _embedding_provider is None:
+        _embedding_provider = LocalEmbeddingProvider() if EMBEDDING_PROVIDER == "local" else HFEmbeddingProvider()
+    return _embedding_provider
+
+
+def get_reranker_provider():
+    global _reranker_provider
+    if _reranker_provider is None:
+        _reranker_provider = LocalRerankerProvider() if RERANKER_PROVIDER == "local" else HFRerankerProvider()
+    return _reranker_provider
+
+
+def get_sparse_provider():
+    """Zwraca provider BM25 lub None, jeśli fastembed nie jest zainstalowany (wtedy tylko Dense)."""
+    global _sparse_provider
+    if _sparse_provider is None and SparseTextEmbedding is not None:
+        try:
+            _sparse_provider = LocalSparseProvider()
+        except Exception as e:
+            ## np. brak dostępu do pobrania modelu - aplikacja działa dalej w trybie tylko Dense
+            print(f"Nie udało się załadować modelu {SPARSE_MODEL}, wyszukiwanie hybrydowe wyłączone: {e}")
+    return _sparse_provider
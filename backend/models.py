@@ -1,17 +1,25 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from database import Base
 
+
+def utc_now():
+    ## naiwny czas UTC - kolumny DateTime to TIMESTAMP WITHOUT TIME ZONE, a asyncpg odrzuca daty ze strefą
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(String, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now, index=True)  ### lista sesji od najnowszych (stronicowanie)
 
     # Relacja: jedna sesja ma wiele logów
     logs = relationship("Log", back_populates="session", cascade="all, delete-orphan")
+    # Relacja: podsumowanie starszej części rozmowy (history_manager) - usuwane razem z sesją
+    summary = relationship("SessionSummary", back_populates="session", uselist=False, cascade="all, delete-orphan")
 
 class Log(Base):
     __tablename__ = "logs"
@@ -21,10 +29,28 @@ class Log(Base):
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
     # dodanie daty i godziny zapytania
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
     sources = Column(JSON, nullable=True)
 
     # Relacja zwrotna
     session = relationship("Session", back_populates="logs")
 
-    ##### można tu w przyszłości dodać kolumny na meta-dane np. z którego modelu LLM pochodziła odpowiedź (jeśli to będzie ensemble) #####
\ No newline at end of file
+    ## historia sesji w kolejności czasu: filtr po session_id + sortowanie/stronicowanie bez skanu całej tabeli
+    __table_args__ = (
+        Index("ix_logs_session_id_created_at", "session_id", "created_at"),
+    )
+
+    ##### można tu w przyszłości dodać kolumny na meta-dane np. z którego modelu LLM pochodziła odpowiedź (jeśli to będzie ensemble) #####
+
+class SessionSummary(Base):
+    __tablename__ = "session_summaries"
+
+    ### osobna tabela zamiast nowych kolumn w sessions - create_all nie modyfikuje istniejących tabel
+    session_id = Column(String, ForeignKey("sessions.id"), primary_key=True)
+    summary = Column(Text, nullable=False)
+    # ID ostatniego logu dołączonego do podsumowania - historia jest doczytywana tylko od tego miejsca
+    last_log_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
+
+    # Relacja zwrotna
+    session = relationship("Session", back_populates="summary")
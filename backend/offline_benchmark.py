@@ -0,0 +1,341 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+## offline: cache odpowiedzi zafałszowałby pomiary (te same pytania na kilku poziomach współbieżności),
+## a klient Groq wymaga jakiegokolwiek klucza nawet gdy LLM jest podmieniony
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("GROQ_API_KEY", "offline")
+
+from dotenv import load_dotenv
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+from rag_engine import AsyncLaborLawRAG, RETRIEVAL_CANDIDATES, source_label
+from model_providers import (
+    LocalEmbeddingProvider, LocalRerankerProvider, get_sparse_provider,
+    DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+)
+from ingest_to_cloud import iter_article_records, batched
+from pdf_parser import parse_pdf
+from corpus_registry import DEFAULT_SOURCE
+from collection_benchmark import normalize_art, percentile, BENCHMARK_QUESTIONS_PATH, BENCHMARK_TOP_K
+
+load_dotenv()
+
+# Konfiguracja z .env
+BENCHMARK_PDF_PATH = os.getenv("BENCHMARK_PDF_PATH", "last_unified_labor_code.pdf")
+BENCHMARK_QDRANT_PATH = os.getenv("BENCHMARK_QDRANT_PATH", ":memory:")   ### katalog = indeks zostaje między uruchomieniami
+BENCHMARK_COLLECTION = "labor_code_benchmark"
+BENCHMARK_EMBEDDER = os.getenv("BENCHMARK_EMBEDDER", "hash")             ### hash | local
+BENCHMARK_RERANKER = os.getenv("BENCHMARK_RERANKER", "lexical")          ### lexical | local | none
+BENCHMARK_LLM = os.getenv("BENCHMARK_LLM", "fake")                       ### fake | groq
+BENCHMARK_LLM_LATENCY = float(os.getenv("BENCHMARK_LLM_LATENCY", 0))     ### sztuczne opóźnienie fałszywego LLM-a (s)
+BENCHMARK_CONCURRENCY = [int(c) for c in os.getenv("BENCHMARK_CONCURRENCY", "1,4,8").split(",")]
+BENCHMARK_HASH_DIM = int(os.getenv("BENCHMARK_HASH_DIM", 1024))
+BENCHMARK_STAGES = ["history", "rewrite", "speculative_retrieval", "embed", "search", "rerank", "llm"]
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    ## słowa + 6-znakowe "rdzenie" - prymitywny stemming, żeby odmiana (urlop/urlopu) dawała wspólne cechy
+    words = [w.lower() for w in WORD_PATTERN.findall(text)]
+    return words + [w[:6] for w in words if len(w) > 6]
+
+
+# DETERMINISTYCZNE ZAMIENNIKI MODELI (bez sieci i bez pobierania modeli)
+
+class HashEmbeddingProvider:
+    """Feature hashing słów do wektora o stałym wymiarze - powtarzalne wyniki bez modelu E5."""
+
+    is_remote = False
+
+    def __init__(self, dim=BENCHMARK_HASH_DIM):
+        self.dim = dim
+        self.model_name = f"hash-{dim}"
+
+    def _embed_one(self, text):
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed(self, texts, is_query=False):
+        return [self._embed_one(t) for t in texts]
+
+    async def aembed(self, texts, is_query=False):
+        return self.embed(texts, is_query)
+
+    def embed_query(self, text):
+        return self._embed_one(text)
+
+    async def aembed_query(self, text):
+        return self._embed_one(text)
+
+    def warmup(self):
+        pass
+
+
+class LexicalRerankerProvider:
+    """Zamiast cross-encodera: udział słów pytania obecnych w artykule."""
+
+    is_remote = False
+
+    def score(self, query, documents):
+        query_tokens = set(tokenize(query))
+        return [len(query_tokens & set(tokenize(doc))) / max(len(query_tokens), 1) for doc in documents]
+
+    async def ascore(self, query, documents):
+        return self.score(query, documents)
+
+    def warmup(self):
+        pass
+
+
+class PassthroughRerankerProvider:
+    """Bez rerankingu - malejące wyniki zachowują kolejność z Qdrant."""
+
+    is_remote = False
+
+    def score(self, query, documents):
+        return [float(len(documents) - i) for i in range(len(documents))]
+
+    async def ascore(self, query, documents):
+        return self.score(query, documents)
+
+    def warmup(self):
+        pass
+
+
+class FakeLLM:
+    """Udaje klienta AsyncGroq (chat.completions.create, także stream=True) ze stałą odpowiedzią i opóźnieniem."""
+
+    def __init__(self, latency=BENCHMARK_LLM_LATENCY):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, model=None, temperature=None, stream=False, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        answer = f"Odpowiedź testowa na podstawie {len(messages)} wiadomości."
+        if stream:
+            return self._stream(answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+    async def _stream(self, answer):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=answer))])
+
+
+def build_embedder(kind=BENCHMARK_EMBEDDER):
+    if kind == "hash":
+        return HashEmbeddingProvider()
+    if kind == "local":
+        return LocalEmbeddingProvider()
+    raise ValueError(f"Nieznany BENCHMARK_EMBEDDER: {kind} (dostępne: hash, local)")
+
+
+def build_reranker(kind=BENCHMARK_RERANKER):
+    if kind == "lexical":
+        return LexicalRerankerProvider()
+    if kind == "local":
+        return LocalRerankerProvider()
+    if kind == "none":
+        return PassthroughRerankerProvider()
+    raise ValueError(f"Nieznany BENCHMARK_RERANKER: {kind} (dostępne: lexical, local, none)")
+
+
+# INDEKS LOKALNY (Qdrant w pamięci lub w katalogu) - ten sam podział na artykuły co ingest_to_cloud.py
+
+async def build_local_index(client, embedder, sparse, pdf_path=BENCHMARK_PDF_PATH, collection_name=BENCHMARK_COLLECTION):
+    """Buduje kolekcję z PDF-a (lub używa istniejącej w BENCHMARK_QDRANT_PATH dla tego samego embeddera)."""
+    if await client.collection_exists(collection_name):
+        sample, _ = await client.scroll(collection_name=collection_name, limit=1, with_payload=["embedding_model"])
+        if sample and sample[0].payload.get("embedding_model") == embedder.model_name:
+            return (await client.count(collection_name=collection_name)).count
+        await client.delete_collection(collection_name)
+
+    dim = len(embedder.embed_query("wymiar"))
+    await client.create_collection(
+        collection_name=collection_name,
+        vectors_config={DENSE_VECTOR_NAME: models.VectorParams(size=dim, distance=models.Distance.COSINE)},
+        sparse_vectors_config={
+            SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+        } if sparse is not None else None
+    )
+
+    total = 0
+    records = iter_article_records(parse_pdf(pdf_path)["articles"], DEFAULT_SOURCE)
+    for batch in batched(records, 64):
+        contents = [content for _, _, content, *_ in batch]
+        dense = embedder.embed(contents)
+        sparse_vectors = sparse.embed(contents) if sparse is not None else [None] * len(batch)
+        points = []
+        for (point_id, art_id, content, digest, structure), dense_vec, sparse_vec in zip(batch, dense, sparse_vectors):
+            vector = {DENSE_VECTOR_NAME: dense_vec}
+            if sparse_vec is not None:
+                vector[SPARSE_VECTOR_NAME] = sparse_vec
+            points.append(models.PointStruct(id=point_id, vector=vector, payload={
+                "content": content,
+                "content_hash": digest,
+                "embedding_model": embedder.model_name,
+                "metadata": {"art_id": art_id, "source": DEFAULT_SOURCE, **structure}
+            }))
+        await client.upsert(collection_name=collection_name, points=points)
+        total += len(points)
+    return total
+
+
+def build_engine(client, embedder, reranker, sparse, llm):
+    ## prawdziwy AsyncLaborLawRAG (ten sam, który obsługuje API) - podmienione są tylko zależności zewnętrzne
+    shared = SimpleNamespace(shared_components=lambda: {
+        "client": client, "embedder": embedder, "reranker": reranker, "sparse": sparse,
+        **({"groq": llm} if llm is not None else {})
+    })
+    return AsyncLaborLawRAG(collection_name=BENCHMARK_COLLECTION, shared=shared)
+
+
+def ranked_sources(results):
+    """Etykiety artykułów w kolejności rankingu, bez duplikatów (jak źródła z format_context, ale bez limitu)."""
+    sources = []
+    for res in results:
+        label = source_label(res.payload.get('metadata', {}))
+        if label not in sources:
+            sources.append(label)
+    return sources
+
+
+# POMIARY
+
+def stage_percentiles(timings_list):
+    """p50/p95/p99 w ms dla każdego etapu (etap liczony tylko w zapytaniach, w których wystąpił)."""
+    stages = {}
+    for stage in BENCHMARK_STAGES + ["total"]:
+        values = [t[stage] for t in timings_list if stage in t]
+        if values:
+            stages[stage] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2)
+            }
+    return stages
+
+
+async def evaluate_retrieval(engine, questions, limit=max(RETRIEVAL_CANDIDATES, *BENCHMARK_TOP_K)):
+    """
+    Recall@5/10/20 i MRR jak w research/evaluate_retrieval.ipynb + czasy etapów wyszukiwania.
+    Liczone na pełnej liście z rank() - źródła z get_context są ucięte do CONTEXT_TOP_K (R@20 = R@15).
+    """
+    hits = {k: 0 for k in BENCHMARK_TOP_K}
+    mrr_sum = 0
+    timings_list = []
+
+    for item in questions:
+        timings = {}
+        start = time.perf_counter()
+        sources = ranked_sources(await engine.rank(item["question"], limit=limit, timings=timings))
+        timings["total"] = time.perf_counter() - start
+        timings_list.append(timings)
+
+        expected = normalize_art(item["expected_art"])
+        normalized_sources = [normalize_art(s) for s in sources]
+        for k in BENCHMARK_TOP_K:
+            if expected in normalized_sources[:k]:
+                hits[k] += 1
+        if expected in normalized_sources:
+            mrr_sum += 1 / (normalized_sources.index(expected) + 1)
+
+    total = len(questions)
+    quality = {f"R@{k}": round(hits[k] / total, 3) for k in BENCHMARK_TOP_K}
+    quality["MRR"] = round(mrr_sum / total, 3)
+    return quality, stage_percentiles(timings_list)
+
+
+async def timed_ask(engine, question, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        result = await engine.ask(question)
+        timings = dict(result.get("timings") or {})
+        timings["total"] = time.perf_counter() - start
+        return timings
+
+
+async def measure_throughput(engine, questions, concurrency_levels=BENCHMARK_CONCURRENCY):
+    """Pełne ask() dla wszystkich pytań przy różnej liczbie równoległych zapytań (w jednej pętli zdarzeń, jak w API)."""
+    results = {}
+    for concurrency in concurrency_levels:
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        start = time.perf_counter()
+        timings_list = await asyncio.gather(*[timed_ask(engine, item["question"], semaphore) for item in questions])
+        elapsed = time.perf_counter() - start
+        results[str(concurrency)] = {
+            "requests": len(questions),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(questions) / elapsed, 2),
+            "stages": stage_percentiles(timings_list)
+        }
+        print(f"Współbieżność {concurrency}: {results[str(concurrency)]['throughput_rps']} zapytań/s")
+    return results
+
+
+async def run_benchmark(questions_path=BENCHMARK_QUESTIONS_PATH, qdrant_path=BENCHMARK_QDRANT_PATH):
+    """
+    Benchmark offline (bez HF, Groq i Qdrant Cloud):
+    - indeks Kodeksu pracy w lokalnym Qdrant (w pamięci albo w katalogu BENCHMARK_QDRANT_PATH)
+    - embedder / reranker / LLM wybierane przez BENCHMARK_EMBEDDER / BENCHMARK_RERANKER / BENCHMARK_LLM
+    - jakość wyszukiwania (rank), czasy etapów i przepustowość pełnego ask() silnika AsyncLaborLawRAG
+    """
+    with open(questions_path, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    client = AsyncQdrantClient(location=":memory:") if qdrant_path == ":memory:" else AsyncQdrantClient(path=qdrant_path)
+    embedder, reranker = build_embedder(), build_reranker()
+    ## BM25 tylko gdy model jest dostępny lokalnie (get_sparse_provider zwraca None przy braku)
+    sparse = get_sparse_provider() if os.getenv("HYBRID_SEARCH", "true").lower() == "true" else None
+    llm = FakeLLM() if BENCHMARK_LLM == "fake" else None
+
+    start = time.perf_counter()
+    points = await build_local_index(client, embedder, sparse)
+    print(f"Indeks lokalny: {points} artykułów ({time.perf_counter() - start:.1f}s)")
+
+    engine = build_engine(client, embedder, reranker, sparse, llm)
+    quality, retrieval_stages = await evaluate_retrieval(engine, questions)
+    print(f"Jakość wyszukiwania: {quality}")
+
+    throughput = await measure_throughput(engine, questions)
+    await client.close()
+
+    return {
+        "config": {
+            "embedder": embedder.model_name,
+            "reranker": BENCHMARK_RERANKER,
+            "llm": BENCHMARK_LLM,
+            "llm_latency_s": BENCHMARK_LLM_LATENCY,
+            "hybrid": sparse is not None,
+            "points": points,
+            "questions": len(questions)
+        },
+        "retrieval": {"quality": quality, "stages": retrieval_stages},
+        "ask": throughput
+    }
+
+
+if __name__ == "__main__":
+    ## python offline_benchmark.py [wynik.json] [pytania.json]
+    results = asyncio.run(run_benchmark(*sys.argv[2:3]))
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Wyniki zapisane w {sys.argv[1]}")
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
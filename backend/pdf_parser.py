@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import hashlib
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from pypdf import PdfReader
+
+from article_index import article_id
+
+load_dotenv()
+
+# Konfiguracja z .env
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", os.cpu_count() or 1))  ### procesy wyciągające tekst stron
+PDF_PARSE_MIN_PAGES_PER_WORKER = int(os.getenv("PDF_PARSE_MIN_PAGES_PER_WORKER", 20))  ### mniejsze PDF-y - bez puli procesów
+PDF_PARSE_CACHE_DIR = os.getenv("PDF_PARSE_CACHE_DIR", "pdf_parse_cache")  ### wynik parsowania per hash pliku (puste = bez cache)
+PARSER_VERSION = 2  ### zmiana reguł parsowania = nowy klucz cache
+
+## stopki/nagłówki: linia z kilku pierwszych/ostatnich linii strony powtarzająca się na większości stron
+BOILERPLATE_LINES = 3
+BOILERPLATE_MIN_SHARE = 0.5
+
+# WZORCE - kompilowane raz dla całego modułu
+DIGITS_PATTERN = re.compile(r"\d+")
+SPACES_PATTERN = re.compile(r"\s+")
+ARTICLE_PATTERN = re.compile(r"^Art\.\s+(\d+)([a-z]*)\.")
+PARAGRAPH_PATTERN = re.compile(r"^§\s*(\d+[a-z]*)\.")
+DIVISION_PATTERN = re.compile(r"^DZIAŁ\s+[A-ZĄĆĘŁŃÓŚŹŻ]+(?:\s+[A-ZĄĆĘŁŃÓŚŹŻ]+)?$")
+CHAPTER_PATTERN = re.compile(r"^Rozdział\s+[IVXLC]+[a-z]*$")
+SECTION_PATTERN = re.compile(r"^Oddział\s+\d+[a-z]*$")
+FOOTNOTE_PATTERN = re.compile(r"^\d+\)\s")  ### przypis u dołu strony ("15) Na podstawie art. ...")
+PREAMBLE_ID = "Wstęp"
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# 1. TEKST STRON (równolegle w procesach)
+
+def extract_page_range(file_path, start, stop):
+    ## każdy proces otwiera PDF sam - obiekty pypdf nie przechodzą między procesami
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def extract_pages(file_path, workers=PDF_PARSE_WORKERS):
+    """Tekst wszystkich stron - zakresy stron rozdzielone między procesy (parsowanie PDF to czysty CPU)."""
+    page_count = len(PdfReader(file_path).pages)
+    workers = max(min(workers, page_count // max(PDF_PARSE_MIN_PAGES_PER_WORKER, 1)), 1)
+    if workers == 1:
+        return extract_page_range(file_path, 0, page_count)
+
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    ### spawn - parser bywa wołany z wątków ingestion (fork procesu z wątkami jest niebezpieczny)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        chunks = pool.map(extract_page_range, [file_path] * len(ranges), *zip(*ranges))
+        return [page for chunk in chunks for page in chunk]
+
+
+# 2. CZYSZCZENIE - nagłówki i stopki wykrywane z powtórzeń, bez wpisanych na sztywno dat i nazw
+
+def line_signature(line):
+    ## "©Kancelaria Sejmu s. 3/185" i "s. 4/185" to ta sama stopka - liczby nie rozróżniają linii
+    return SPACES_PATTERN.sub(" ", DIGITS_PATTERN.sub("#", line)).strip()
+
+
+def find_boilerplate(pages):
+    """Sygnatury linii, które na większości stron stoją w tych samych miejscach (nagłówek, numer strony, data)."""
+    counts = Counter()
+    for lines in pages:
+        edge = lines[:BOILERPLATE_LINES] + lines[-BOILERPLATE_LINES:]
+        counts.update({line_signature(line) for line in edge if line.strip()})
+    if len(pages) < 3:
+        return set()
+    return {signature for signature, count in counts.items() if count >= len(pages) * BOILERPLATE_MIN_SHARE}
+
+
+def iter_clean_lines(pages):
+    page_lines = [[line.rstrip() for line in page.splitlines()] for page in pages]
+    boilerplate = find_boilerplate(page_lines)
+    for lines in page_lines:
+        for i, line in enumerate(lines):
+            edge = i < BOILERPLATE_LINES or i >= len(lines) - BOILERPLATE_LINES
+            if not line.strip() or (edge and line_signature(line) in boilerplate):
+                continue
+            yield line.strip()
+
+
+# 3. SEGMENTACJA - jedno przejście po liniach: struktura (dział, rozdział, oddział) -> artykuły -> paragrafy
+
+def split_article_number(digits, previous):
+    """
+    pypdf spłaszcza indeks górny ("Art. 22¹." -> "Art. 221."), więc rozstrzyga kolejność artykułów:
+    numer zaczynający się od numeru poprzedniego artykułu to jego indeks górny (221 po art. 22 -> 22¹),
+    a art. 221 następuje po art. 220. Zwraca (numer, indeks górny).
+    """
+    if previous and digits.startswith(previous) and len(digits) > len(previous) and digits[len(previous)] != "0":
+        return previous, digits[len(previous):]
+    return digits, ""
+
+
+def iter_segments(lines):
+    """
+    Artykuły w kolejności tekstu: {"art_id", "content", "paragraphs", "division", "chapter", "section"}.
+    Tekst przed pierwszym artykułem to "Wstęp"; nagłówki struktury nie trafiają do treści artykułów.
+    art_id w zapisie article_index.article_id ("Art. 22¹a").
+    """
+    levels = ("division", "chapter", "section")
+    number = None  ### numer (bez indeksu górnego) poprzedniego artykułu
+    structure = dict.fromkeys(levels)
+    heading, heading_title = None, []  ### nagłówek struktury, którego tytuł jest w kolejnych liniach
+    article = {"art_id": PREAMBLE_ID, "lines": [], "paragraphs": [], **structure}
+
+    def finish(article):
+        content = "\n".join(article.pop("lines")).strip()
+        if not content:
+            return None
+        article["content"] = content
+        article["paragraphs"] = [
+            {"id": paragraph_id, "content": "\n".join(lines).strip()} for paragraph_id, lines in article["paragraphs"]
+        ]
+        return article
+
+    for line in lines:
+        level = next((name for name, pattern in zip(levels, (DIVISION_PATTERN, CHAPTER_PATTERN, SECTION_PATTERN))
+                      if pattern.match(line)), None)
+        match = ARTICLE_PATTERN.match(line)
+        if heading and (level or match or FOOTNOTE_PATTERN.match(line)):
+            ## tytuł nagłówka (może zajmować kilka linii) kończy się na kolejnym nagłówku, artykule lub przypisie
+            structure[heading] = " - ".join([structure[heading], " ".join(heading_title)]) if heading_title else structure[heading]
+            heading, heading_title = None, []
+
+        if level:
+            ### nowy dział zeruje rozdział i oddział, nowy rozdział - oddział
+            for lower in levels[levels.index(level) + 1:]:
+                structure[lower] = None
+            structure[level], heading = line, level
+            continue
+        if heading:
+            heading_title.append(line)
+            continue
+
+        if match:
+            finished = finish(article)
+            if finished:
+                yield finished
+            number, superscript = split_article_number(match.group(1), number)
+            art_id = article_id(number, superscript, match.group(2))
+            article = {"art_id": art_id, "lines": [], "paragraphs": [], **structure}
+        article["lines"].append(line)
+
+        body = line[match.end():].strip() if match else line
+        paragraph = PARAGRAPH_PATTERN.match(body)
+        if paragraph:
+            article["paragraphs"].append((f"§ {paragraph.group(1)}", []))
+        if article["paragraphs"]:
+            article["paragraphs"][-1][1].append(body)
+
+    finished = finish(article)
+    if finished:
+        yield finished
+
+
+# 4. CACHE + API MODUŁU
+
+def cache_path(digest):
+    return os.path.join(PDF_PARSE_CACHE_DIR, f"{digest}-v{PARSER_VERSION}.json")
+
+
+def parse_pdf(file_path):
+    """
+    Wynik parsowania PDF: {"hash", "pages", "articles"} - z cache, jeśli ten sam plik był już parsowany
+    (np. sprawdzenie po pobraniu, a potem ingestion).
+    """
+    digest = file_hash(file_path)
+    path = cache_path(digest) if PDF_PARSE_CACHE_DIR else None
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    pages = extract_pages(file_path)
+    result = {"hash": digest, "pages": len(pages), "articles": list(iter_segments(iter_clean_lines(pages)))}
+
+    if path:
+        os.makedirs(PDF_PARSE_CACHE_DIR, exist_ok=True)
+        ### zapis przez plik tymczasowy - przerwany zapis nie zostawi uszkodzonego cache
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+    return result
@@ -1,176 +1,265 @@
 import os
+import re
 import time
 import random
+import asyncio
+import difflib
+import threading
 from dotenv import load_dotenv
-from groq import Groq
-from qdrant_client import QdrantClient
-from utils import get_embeddings, query_hf_api
+from groq import AsyncGroq
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+from model_providers import (
+    get_embedding_provider, get_reranker_provider, get_sparse_provider,
+    DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
+)
+from answer_cache import answer_cache, ANSWER_CACHE_ENABLED, CORPUS_VERSION_CHECK_INTERVAL
+from article_index import ArticleIndex, article_id, PLAIN_DIGITS
+from embedding_cache import normalize_query
+from history_manager import plan_history, build_summary_prompt, HISTORY_SUMMARY_TOKENS
+from corpus_registry import DEFAULT_SOURCE
+from metrics import record_retry, record_fallback, record_stages, inc
 
 
 load_dotenv()
 
+## model LLM używany zarówno do odpowiedzi jak i do przepisywania zapytań
+LLM_MODEL = "qwen/qwen3.6-27b"
+
+## Parametry wyszukiwania i rerankingu (kompromis recall <-> latencja) - konfigurowalne przez .env
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 50))       ### ile trafień pobiera z Qdrant
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", 15))                     ### ile artykułów trafia do LLM-a
+RERANK_SCORE_GAP = float(os.getenv("RERANK_SCORE_GAP", 0))              ### pomija kandydatów o score < top - gap (0 = wyłączone)
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))             ### par (pytanie, artykuł) na jedno zapytanie
+RERANK_CONCURRENCY = int(os.getenv("RERANK_CONCURRENCY", 4))            ### ile paczek leci równolegle
+RERANK_EARLY_STOP_PATIENCE = int(os.getenv("RERANK_EARLY_STOP_PATIENCE", 0))  ### stop gdy top-k stabilne przez N fal (0 = wyłączone)
+## Dense + Sparse (BM25) z fuzją RRF po stronie Qdrant - działa gdy kolekcja ma wektor "text-sparse"
+## UWAGA: przy RRF score to wynik fuzji rang, więc RERANK_SCORE_GAP trzeba dobrać osobno dla tego trybu
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+## Parametry wyszukiwania HNSW / kwantyzacji (kolekcja z kwantyzacją int8 - patrz ingest_to_cloud.py)
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", 0))                   ### 0 = domyślne ef kolekcji
+QDRANT_SEARCH_RESCORE = os.getenv("QDRANT_SEARCH_RESCORE", "true").lower() == "true"  ### ponowna ocena oryginalnymi wektorami
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", 2.0))      ### ilu kandydatów (x limit) ocenia się ponownie
+
+## Spekulatywne wyszukiwanie dla surowego pytania równolegle z rewrite_query (tylko gdy jest historia)
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+SPECULATIVE_SIMILARITY = float(os.getenv("SPECULATIVE_SIMILARITY", 0.9))  ### od ilu "prawie identyczne" zapytania
+
+## Szybka ścieżka dla pytań o konkretny artykuł (indeks art_id -> treść w pamięci)
+ARTICLE_INDEX_ENABLED = os.getenv("ARTICLE_INDEX_ENABLED", "true").lower() == "true"
+## false = gdy wszystkie wskazane artykuły są w indeksie, pomija embedding, wyszukiwanie i reranking
+ARTICLE_INDEX_WITH_SEMANTIC = os.getenv("ARTICLE_INDEX_WITH_SEMANTIC", "false").lower() == "true"
+
+## "art. 152", "Art.29", "artykuł 94", "artykułu 22(1)", "art. 22^1", "art. 22¹a" -> (numer, indeks górny, litery)
+ARTICLE_REF_PATTERN = re.compile(
+    r"\bart(?:ykuł(?:u|em|y|ów)?|\.)?\s*(\d+)(?:\((\d+)\)|\^(\d+)|([⁰¹²³⁴⁵⁶⁷⁸⁹]+))?([a-z]{0,2})(?![a-z])",
+    re.IGNORECASE
+)
+
+
+# FUNKCJE POMOCNICZE (wspólne dla wersji synchronicznej i asynchronicznej)
+
+def resolve_corpus_version(aliases, collection_name):
+    """Zwraca nazwę kolekcji, na którą wskazuje alias (wersja korpusu) lub samą nazwę jeśli to nie alias."""
+    for a in aliases:
+        if a.alias_name == collection_name:
+            return a.collection_name
+    return collection_name
+
+
+def parse_vector_schema(collection_info):
+    """Zwraca (nazwa wektora dense lub None dla nienazwanego, czy kolekcja ma wektor sparse)."""
+    params = collection_info.config.params
+    vectors = params.vectors
+    dense_name = DENSE_VECTOR_NAME if isinstance(vectors, dict) and DENSE_VECTOR_NAME in vectors else None
+    has_sparse = SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+    return dense_name, has_sparse
+
+
+def build_source_filter(acts, exclude=False):
+    """Filtr Qdrant po nazwie aktu (metadata.source, indeks payloadu) lub None gdy bez ograniczeń."""
+    if not acts:
+        return None
+    condition = models.FieldCondition(key="metadata.source", match=models.MatchAny(any=list(acts)))
+    return models.Filter(must_not=[condition]) if exclude else models.Filter(must=[condition])
+
+
+def build_search_params(hnsw_ef=QDRANT_SEARCH_HNSW_EF, rescore=QDRANT_SEARCH_RESCORE,
+                        oversampling=QDRANT_SEARCH_OVERSAMPLING, quantization=True):
+    """
+    Parametry wyszukiwania wektora dense:
+    - kwantyzacja int8: szybkie wstępne wyszukiwanie, potem ponowna ocena (rescore) top limit * oversampling
+      kandydatów oryginalnymi wektorami float32 - recall prawie jak bez kwantyzacji
+    - quantization=False pomija wektory skwantyzowane (punkt odniesienia w benchmarku)
+    Dla kolekcji bez kwantyzacji Qdrant ignoruje ustawienia kwantyzacji.
+    """
+    return models.SearchParams(
+        hnsw_ef=hnsw_ef or None,
+        quantization=models.QuantizationSearchParams(
+            ignore=not quantization,
+            rescore=rescore,
+            oversampling=oversampling if oversampling > 1 else None
+        )
+    )
 
-class LaborLawRAG:
-    def __init__(self, collection_name="labor_code_pl"):
-        ## Połączenie z bazą (Qdrant Cloud)
-        self.client = QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
-        self.collection_name = collection_name
-        
-        ## LLM
-        self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.groq = Groq(api_key=self.groq_api_key)
-
-        ### URL do modeli na Hugging Face
-        self.rerank_url = "https://router.huggingface.co/hf-inference/models/BAAI/bge-reranker-v2-m3"
-
-    def get_context(self, query, limit=50):
-        dense_vec = None
-        
-        # 1. Generowanie wektora przez utils - HF API (Dense)
-        #### Model E5 wymaga przedrostka 'query: ' lub 'passage: ' dla pytań
-        #### Generowanie wektora z mechanizmem Retry (3 próby w razie Timeoutu)
-        for attempt in range(3):
-            try:
-                hf_resp = get_embeddings(query, is_query=True)
-
-                ### HF API dla feature-extraction zwraca zazwyczaj [[wektor]]
-                ### HF często zwraca listę list [[...]] -> wyciąganie pierwszego wektora
-                if isinstance(hf_resp, list) and isinstance(hf_resp[0], list):
-                    dense_vec = hf_resp[0]
-                elif isinstance(hf_resp, list):
-                    dense_vec = hf_resp
-                else:
-                    raise Exception(f"Nieoczekiwany format wektora z HF: {hf_resp}")
-                break  # Sukces - przerywa pętlę retry
-            except Exception as e:
-                print(f"[Embedding Próba {attempt+1}/3 Nieudana]: {e}")
-                if attempt == 2:  ### Ostatnia próba zawiodła
-                    raise e
-                time.sleep(random.uniform(2, 4))  ## Poczeka 2 - 4 sekundy przed kolejną próbą
 
+def build_hybrid_prefetch(dense_vec, sparse_vec, dense_name, limit, query_filter=None, search_params=None):
+    ## dwa niezależne wyszukiwania w jednym zapytaniu - Qdrant łączy je przez RRF
+    ### filtr w każdym prefetch - inaczej kandydaci z innych aktów zajmowaliby miejsca w limicie
+    return [
+        models.Prefetch(query=dense_vec, using=dense_name, limit=limit, filter=query_filter, params=search_params),
+        models.Prefetch(query=sparse_vec, using=SPARSE_VECTOR_NAME, limit=limit, filter=query_filter)
+    ]
 
-        # 2. Wyszukiwanie w Qdrant Cloud (Tylko Dense bo Sparse przez API jest trudne)
-        results = self.client.search(
-            collection_name=self.collection_name,
-            query_vector=dense_vec,
-            limit=limit,
-            with_payload=True
-        )
 
+def extract_article_refs(query):
+    """
+    Wyciąga jawne odwołania do artykułów z pytania, np. 'co mówi art. 29?' -> ['Art. 29'], 'art. 22(1)' -> ['Art. 22¹'].
+    Zapis jak art_id z parsera PDF (article_index.article_id); "art. 31" bez indeksu górnego zostaje "Art. 31"
+    - ArticleIndex.lookup sprawdza wtedy także art. 3¹.
+    """
+    refs = []
+    for number, parenthesized, caret, superscript, letters in ARTICLE_REF_PATTERN.findall(query):
+        art_id = article_id(number, (parenthesized or caret or superscript).translate(PLAIN_DIGITS), letters)
+        if art_id not in refs:
+            refs.append(art_id)
+    return refs
 
-        # 3. Reranking (Cross-Encoder) przez HF API - z automatycznym Retry i bezpiecznym parsowaniem struktury
-        if results:
-            #### format słownikowy dla Hugging Face Inference API (obsługa par tekstowych)
-            payload = {
-                "inputs": [
-                    {"text": query, "text_pair": res.payload.get('content', '')}
-                    for res in results
-                ]
-            }
 
-            rerank_resp = None
-            for attempt in range(3):
-                try:
-                    rerank_resp = query_hf_api(self.rerank_url, payload) ## użycie wspólnej funkcji z utils
-                    break
-                except Exception as e:
-                    print(f"[Reranker Próba {attempt+1}/3 Nieudana]: {e}")
-                    if attempt < 2:
-                        time.sleep(random.uniform(2, 4))
-
-            ### DIAGNOSTYKA (wyłączona żeby nie zaśmiecać logów produkcyjnych)
-            ### print(f"🔍 [DEBUG RERANKER] Typ: {type(rerank_resp)} | Zawartość: {str(rerank_resp)[:500]}")
-
-            # Jeśli Hugging Face przysłał zagnieżdżoną listę [[ ... ]], wyciąga jej środek:
-            if rerank_resp and isinstance(rerank_resp, list) and len(rerank_resp) > 0 and isinstance(rerank_resp[0], list):
-                rerank_resp = rerank_resp[0]
-
-            ## ZABEZPIECZENIE: sprawdza czy liczba punktów z HF zgadza się z Qdrant
-            if rerank_resp and isinstance(rerank_resp, list) and len(rerank_resp) == len(results):
-                try:
-                    ### HF zwraca [{'label': 'LABEL_0', 'score': 0.99}, ...]
-                    ### sortowanie wyników Qdrant na podstawie wyników z HF
-                    ### Mapuje wyniki: HF zwraca wyniki w tej samej kolejności co wysłane pary
-                    scored_results = []
-                    for i, r in enumerate(rerank_resp):
-                        ## Bezpieczne wyciąganie score niezależnie czy HF zwrócił słownik, czy listę słowników
-                        if isinstance(r, dict):
-                            score = r.get('score', 0)
-                        elif isinstance(r, list) and len(r) > 0 and isinstance(r[0], dict):
-                            score = r[0].get('score', 0)
-                        elif isinstance(r, (int, float)):
-                            score = r
-                        else:
-                            score = 0
-
-                        scored_results.append((score, results[i]))
-
-                    scored_results.sort(key=lambda x: x[0], reverse=True)
-                    results = [item[1] for item in scored_results]
-                    print("--- RERANKING ZAKOŃCZONY SUKCESEM ---")
-                except Exception as e:
-                    print(f"Błąd parsowania odpowiedzi rerankera, używam kolejności z Qdrant. Szczegóły: {e}")
-            else:
-                print("--- [WARNING] Reranker zwrócił niezgodną liczbę wyników. Bezpieczny fallback do kolejności z Qdrant! ---")
+def merge_refs(refs, query):
+    """Odwołania z surowego pytania (przepisanie zapytania może zgubić numer artykułu) + odwołania z zapytania."""
+    return list(dict.fromkeys((refs or []) + extract_article_refs(query)))
 
 
-        # 4. Formatowanie wyników - Lejek (Top 15)
+def promote_exact_matches(results, refs):
+    """Przenosi trafienia z art_id wskazanym wprost w pytaniu na początek listy. Zwraca (wyniki, czy_trafiono)."""
+    if not refs:
+        return results, False
+    exact = [res for res in results if res.payload.get('metadata', {}).get('art_id') in refs]
+    rest = [res for res in results if res.payload.get('metadata', {}).get('art_id') not in refs]
+    return exact + rest, bool(exact)
 
-        context_parts = []
-        
-        sources = [] # list zamiast set, aby zachować KOLEJNOŚĆ
 
-        ## reranker widział 50, ale do LLM-a wyśle tylko top 15 aby wziąć tylko najlepsze
-        for res in results[:15]:
-            art_id = res.payload.get('metadata', {}).get('art_id', 'Nieznany')
-            content = res.payload.get('content', '')
-            context_parts.append(f"[{art_id}]: {content}")
+def merge_indexed(indexed, results):
+    """Artykuły z indeksu (wskazane wprost w pytaniu) przed trafieniami semantycznymi, bez duplikatów."""
+    indexed_ids = {record.id for record in indexed}
+    return indexed + [res for res in results if res.id not in indexed_ids]
 
-            # dodaje do źródeł tylko jeśli jeszcze go nie ma (deduplikacja), ale NIE SORTUJE na końcu!
-            if art_id not in sources:
-                sources.append(art_id)
 
-        # zwraca sources bez funkcji sorted()
-        return "\n\n".join(context_parts), sources
+def as_rerank_candidates(records, results):
+    """Punkty z indeksu artykułów jako trafienia wyszukiwania - z najlepszym dense score, więc reranker oceni je zawsze."""
+    score = results[0].score if results else 1.0
+    return [models.ScoredPoint(id=r.id, version=0, score=score, payload=r.payload) for r in records]
 
-    def rewrite_query(self, question, chat_history):
-        if not chat_history:
-            return question
-            
-        # Prosi AI o stworzenie zapytania wyszukiwarkowego na podstawie wcześniejszej historii
-        history_text = "\n".join([f"User: {q}\nAI: {a}" for q, a in chat_history])
-        
-        prompt = f"""Na podstawie poniższej historii rozmowy oraz nowego pytania, stwórz jedno samodzielne i precyzyjne zapytanie do bazy dokumentów prawnych. 
+
+def is_near_identical(question, rewritten, threshold=SPECULATIVE_SIMILARITY):
+    """Czy przepisane zapytanie praktycznie nie różni się od surowego pytania (wtedy wyniki spekulatywne wystarczą)."""
+    a, b = normalize_query(question), normalize_query(rewritten)
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+def merge_hits(primary, extra):
+    """Łączy dwa zestawy trafień z Qdrant bez duplikatów (najpierw primary)."""
+    seen = {res.id for res in primary}
+    return list(primary) + [res for res in extra if res.id not in seen]
+
+
+def apply_rerank(results, scores):
+    """Sortuje wyniki Qdrant według wyników cross-encodera; przy niezgodności zwraca kolejność z Qdrant."""
+    ## ZABEZPIECZENIE: sprawdza czy liczba wyników z rerankera zgadza się z Qdrant
+    if scores and len(scores) == len(results):
+        ### wyniki są w tej samej kolejności co wysłane pary -> sortowanie wyników Qdrant
+        scored_results = sorted(zip(scores, results), key=lambda x: x[0], reverse=True)
+        print("--- RERANKING ZAKOŃCZONY SUKCESEM ---")
+        return [item[1] for item in scored_results]
+
+    print("--- [WARNING] Reranker zwrócił niezgodną liczbę wyników. Bezpieczny fallback do kolejności z Qdrant! ---")
+    record_fallback("rerank_mismatch")
+    return results
+
+
+def select_rerank_candidates(results, score_gap=RERANK_SCORE_GAP):
+    """Dzieli wyniki Qdrant na kandydatów do rerankingu i pominięte (dense score dużo niższy niż najlepszy)."""
+    if not score_gap or not results:
+        return list(results), []
+    threshold = results[0].score - score_gap
+    candidates = [res for res in results if res.score >= threshold]
+    skipped = [res for res in results if res.score < threshold]
+    return candidates, skipped
+
+
+def split_batches(items, batch_size=RERANK_BATCH_SIZE):
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def top_k_ids(candidates, scores, top_k=CONTEXT_TOP_K):
+    """Zbiór ID najlepszych kandydatów wśród już ocenionych (do wczesnego zatrzymania)."""
+    scored = [(s, c.id) for s, c in zip(scores, candidates) if s is not None]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return {point_id for _, point_id in scored[:top_k]}
+
+
+def merge_rerank(candidates, scores, skipped):
+    """Ocenieni kandydaci (posortowani przez reranker) + nieocenieni i pominięci w kolejności z Qdrant."""
+    scored = [c for c, s in zip(candidates, scores) if s is not None]
+    unscored = [c for c, s in zip(candidates, scores) if s is None]
+    return apply_rerank(scored, [s for s in scores if s is not None]) + unscored + skipped
+
+
+def source_label(metadata):
+    """Etykieta źródła: 'Art. 29' dla Kodeksu pracy, 'Art. 29 (nazwa aktu)' dla pozostałych aktów korpusu."""
+    art_id = metadata.get('art_id', 'Nieznany')
+    source = metadata.get('source', DEFAULT_SOURCE)
+    return art_id if source == DEFAULT_SOURCE else f"{art_id} ({source})"
+
+
+def format_context(results, top_k=CONTEXT_TOP_K):
+    """Formatowanie wyników - Lejek (domyślnie Top 15). Zwraca (kontekst, źródła)."""
+    context_parts = []
+
+    sources = [] # list zamiast set, aby zachować KOLEJNOŚĆ
+
+    ## reranker widział 50, ale do LLM-a wyśle tylko top 15 aby wziąć tylko najlepsze
+    for res in results[:top_k]:
+        art_id = source_label(res.payload.get('metadata', {}))
+        content = res.payload.get('content', '')
+        context_parts.append(f"[{art_id}]: {content}")
+
+        # dodaje do źródeł tylko jeśli jeszcze go nie ma (deduplikacja), ale NIE SORTUJE na końcu!
+        if art_id not in sources:
+            sources.append(art_id)
+
+    # zwraca sources bez funkcji sorted()
+    return "\n\n".join(context_parts), sources
+
+
+def build_rewrite_prompt(question, chat_history, summary=None):
+    # Prosi AI o stworzenie zapytania wyszukiwarkowego na podstawie wcześniejszej historii
+    history_text = "\n".join([f"User: {q}\nAI: {a}" for q, a in chat_history])
+    ## starsza część rozmowy jest już streszczona (history_manager) - trafia przed ostatnie tury
+    if summary:
+        history_text = f"(Podsumowanie wcześniejszej rozmowy: {summary})\n{history_text}"
+
+    return f"""Na podstawie poniższej historii rozmowy oraz nowego pytania, stwórz jedno samodzielne i precyzyjne zapytanie do bazy dokumentów prawnych.
         Zapytanie musi zawierać wszystkie niezbędne słowa kluczowe (np. temat rozmowy), aby wyszukiwarka znalazła właściwy artykuł.
-        
+
         HISTORIA:
         {history_text}
-        
+
         NOWE PYTANIE: {question}
-        
-        SAMODZIELNE ZAPYTANIE:"""
-        
-        res = self.groq.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="qwen/qwen3.6-27b",
-            temperature=0
-        )
-        return res.choices[0].message.content
 
-    def ask(self, question, chat_history=None):
-        # przepisywanie zapytania jeśli jest historia --> szukanie w Qdrancie za pomocą "mądrzejszego" pytania
-        search_query = self.rewrite_query(question, chat_history) if chat_history else question
+        SAMODZIELNE ZAPYTANIE:"""
 
-        # pobieranie kontekstu na podstawie "mądrzejszego" zapytania jeśli jest historia
-        context, sources = self.get_context(search_query) ## pobieranie kontekstu i listy źródeł
 
-        ## Budowanie System Promptu ## inicjowanie listy wiadomości od instrukcji systemowej
-        messages = [
-            {
-                "role": "system",
-                "content": f"""Jesteś pomocnym i precyzyjnym asystentem oraz ekspertem od polskiego prawa pracy. 
-                Zawsze odpowiadaj tylko na podstawie dostarczonego kontekstu w postaci artykułów ustawy / rozporządzeń bez używania wcześniejszej wiedzy ogólnej. 
-                Jeśli odpowiedzi nie ma w kontekście, poinformuj o tym. 
+def build_messages(question, context, chat_history=None, summary=None):
+    ## Budowanie System Promptu ## inicjowanie listy wiadomości od instrukcji systemowej
+    messages = [
+        {
+            "role": "system",
+            "content": f"""Jesteś pomocnym i precyzyjnym asystentem oraz ekspertem od polskiego prawa pracy.
+                Zawsze odpowiadaj tylko na podstawie dostarczonego kontekstu w postaci artykułów ustawy / rozporządzeń bez używania wcześniejszej wiedzy ogólnej.
+                Jeśli odpowiedzi nie ma w kontekście, poinformuj o tym.
                 Odpowiedź musi być w języku polskim, chyba że użytkownik wyraźnie zaznaczy, że ma być w innym konkretnym języku (np. angielskim).
                 WAŻNE: Używaj wyłącznie alfabetu łacińskiego. Nie używaj cyrylicy ani znaków azjatyckich.
                 Zawsze wskazuj podstawę prawną (numer artykułu) dla każdej podanej informacji, np. [Art. 100].
@@ -181,31 +270,491 @@ class LaborLawRAG:
 
                 KONTEKST:
                 {context}"""
-            }
-        ]
+        }
+    ]
+
+    ## podsumowanie starszej części rozmowy (ostatnie tury idą niżej dosłownie)
+    if summary:
+        messages.append({"role": "system", "content": f"PODSUMOWANIE WCZEŚNIEJSZEJ ROZMOWY:\n{summary}"})
+
+    ## jeśli otrzymano historię to następuje dodanie jej do listy wiadomości
+    ## założenie że chat_history to lista krotek: [(pytanie1, odpowiedź1), (pytanie2, odpowiedź2)]
+    if chat_history:
+        for old_question, old_answer in chat_history:
+            messages.append({"role": "user", "content": old_question})
+            messages.append({"role": "assistant", "content": old_answer})
+
+    ## na końcu dodanie bieżącego pytania użytkownika
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+class AsyncLaborLawRAG:
+    """
+    Silnik RAG dla endpointów FastAPI (LaborLawRAG to tylko synchroniczna nakładka na tę klasę):
+    - AsyncQdrantClient, AsyncGroq i asynchroniczne modele z model_providers
+    - backoff przez asyncio.sleep, więc jedno wolne pytanie nie blokuje pętli zdarzeń
+    - shared: klienci i modele z innego silnika (engine_registry.py) - nowy silnik dla nowej wersji
+      korpusu przejmuje rozgrzane połączenia i modele, a close() nie zamyka cudzych klientów
+    """
+
+    def __init__(self, collection_name="labor_code_pl", shared=None):
+        shared = shared.shared_components() if shared is not None else {}
+        self._owns_clients = not shared
+
+        ## Połączenie z bazą (Qdrant Cloud)
+        self.client = shared.get("client") or AsyncQdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+        self.collection_name = collection_name
+
+        ## LLM
+        self.groq_api_key = os.getenv("GROQ_API_KEY")
+        self.groq = shared.get("groq") or AsyncGroq(api_key=self.groq_api_key)
+
+        ## Modele embeddingów i rerankera (zdalne HF albo lokalne ONNX - patrz model_providers.py)
+        self.embedder = shared.get("embedder") or get_embedding_provider()
+        self.reranker = shared.get("reranker") or get_reranker_provider()
+        self.sparse = shared["sparse"] if "sparse" in shared else (get_sparse_provider() if HYBRID_SEARCH else None)
+        ## HNSW ef + kwantyzacja z rescoringiem (wspólne dla wszystkich zapytań)
+        self.search_params = build_search_params()
+
+        ## wersja korpusu (kolekcja za aliasem) - sprawdzana co CORPUS_VERSION_CHECK_INTERVAL sekund
+        self._corpus_version = None
+        self._corpus_version_checked_at = 0
+
+        ## schemat wektorów aktualnej kolekcji (stara kolekcja: nienazwany dense, nowa: dense + text-sparse)
+        self._schema_version = None
+        self._dense_name = None
+        self._hybrid = False
+
+        ## indeks art_id -> treść (budowany w warmup() lub przy pierwszym pytaniu o artykuł)
+        self.article_index = ArticleIndex()
+
+    async def get_corpus_version(self):
+        if time.time() - self._corpus_version_checked_at > CORPUS_VERSION_CHECK_INTERVAL:
+            aliases = (await self.client.get_aliases()).aliases
+            self._corpus_version = resolve_corpus_version(aliases, self.collection_name)
+            self._corpus_version_checked_at = time.time()
+        return self._corpus_version
+
+    async def vector_schema(self):
+        version = await self.get_corpus_version()
+        if version != self._schema_version:
+            self._dense_name, has_sparse = parse_vector_schema(await self.client.get_collection(self.collection_name))
+            self._hybrid = has_sparse and self.sparse is not None
+            self._schema_version = version
+        return self._dense_name, self._hybrid
+
+    async def ensure_article_index(self):
+        version = await self.get_corpus_version()
+        if self.article_index.version != version:
+            await self.article_index.abuild(self.client, self.collection_name, version)
+
+    async def warmup(self):
+        """Ładuje lokalne modele (w wątku) i indeks artykułów przed pierwszym pytaniem."""
+        await asyncio.to_thread(self.embedder.warmup)
+        await asyncio.to_thread(self.reranker.warmup)
+        if self.sparse is not None:
+            await asyncio.to_thread(self.sparse.warmup)
+        if ARTICLE_INDEX_ENABLED:
+            try:
+                await self.ensure_article_index()
+            except Exception as e:
+                print(f"Nie udało się zbudować indeksu artykułów (zbuduje się przy pierwszym pytaniu): {e}")
+
+    async def search(self, query, dense_vec, limit, acts=None):
+        dense_name, hybrid = await self.vector_schema()
+        query_filter = build_source_filter(acts)
+        if hybrid:
+            ### BM25 dla zapytania to sama tokenizacja - wystarczająco szybkie, żeby liczyć w pętli zdarzeń
+            response = await self.client.query_points(
+                collection_name=self.collection_name,
+                prefetch=build_hybrid_prefetch(dense_vec, self.sparse.embed_query(query), dense_name, limit,
+                                               query_filter, self.search_params),
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                query_filter=query_filter,
+                limit=limit,
+                with_payload=True
+            )
+        else:
+            response = await self.client.query_points(
+                collection_name=self.collection_name,
+                query=dense_vec,
+                using=dense_name,
+                query_filter=query_filter,
+                search_params=self.search_params,
+                limit=limit,
+                with_payload=True
+            )
+        return response.points
+
+    async def embed_query(self, query):
+        # Generowanie wektora (Dense) z mechanizmem Retry (3 próby, tylko dla zdalnego API)
+        attempts = 3 if self.embedder.is_remote else 1
+        for attempt in range(attempts):
+            try:
+                return await self.embedder.aembed_query(query)
+            except Exception as e:
+                print(f"[Embedding Próba {attempt+1}/{attempts} Nieudana]: {e}")
+                if attempt == attempts - 1:
+                    raise e
+                record_retry("embed")
+                await asyncio.sleep(random.uniform(2, 4))
+
+    async def _score_batch(self, query, batch):
+        documents = [res.payload.get('content', '') for res in batch]
+        attempts = 3 if self.reranker.is_remote else 1
+        for attempt in range(attempts):
+            try:
+                return await self.reranker.ascore(query, documents)
+            except Exception as e:
+                print(f"[Reranker Próba {attempt+1}/{attempts} Nieudana]: {e}")
+                if attempt < attempts - 1:
+                    record_retry("rerank")
+                    await asyncio.sleep(random.uniform(2, 4))
+        return None
+
+    async def rerank(self, query, results):
+        """
+        Adaptacyjny reranking:
+        - pomija kandydatów z dense score poniżej (top - RERANK_SCORE_GAP)
+        - wysyła resztę paczkami po RERANK_BATCH_SIZE, do RERANK_CONCURRENCY paczek równolegle (jedna "fala", asyncio.gather)
+        - kończy wcześniej, gdy zbiór top-k nie zmienia się przez RERANK_EARLY_STOP_PATIENCE fal
+        """
+        candidates, skipped = select_rerank_candidates(results)
+        batches = split_batches(candidates)
+        scores = [None] * len(candidates)
+        previous_top, stable_waves, offset = None, 0, 0
+
+        for wave_start in range(0, len(batches), RERANK_CONCURRENCY):
+            wave = batches[wave_start:wave_start + RERANK_CONCURRENCY]
+            wave_scores = await asyncio.gather(*[self._score_batch(query, b) for b in wave])
+
+            for batch, batch_scores in zip(wave, wave_scores):
+                if not batch_scores or len(batch_scores) != len(batch):
+                    return apply_rerank(results, None)
+                scores[offset:offset + len(batch)] = batch_scores
+                offset += len(batch)
+
+            current_top = top_k_ids(candidates, scores)
+            stable_waves = stable_waves + 1 if current_top == previous_top else 0
+            previous_top = current_top
+            if RERANK_EARLY_STOP_PATIENCE and stable_waves >= RERANK_EARLY_STOP_PATIENCE:
+                break
+
+        return merge_rerank(candidates, scores, skipped)
+
+    async def retrieve(self, query, limit=None, dense_vec=None, timings=None, acts=None):
+        """Etapy 1-2: wektor zapytania + wyszukiwanie w Qdrant (bez rerankingu)."""
+        timings = timings if timings is not None else {}
+
+        # 1. Wektor zapytania (chyba że został już policzony przy sprawdzaniu cache odpowiedzi)
+        start = time.perf_counter()
+        if dense_vec is None:
+            dense_vec = await self.embed_query(query)
+        timings["embed"] = time.perf_counter() - start
+
+        # 2. Wyszukiwanie w Qdrant Cloud (Dense + Sparse BM25 jeśli kolekcja je ma)
+        start = time.perf_counter()
+        results = await self.search(query, dense_vec, limit or RETRIEVAL_CANDIDATES, acts)
+        timings["search"] = time.perf_counter() - start
+        return results
+
+    async def get_context(self, query, limit=None, dense_vec=None, timings=None, hits=None, extra_hits=None, acts=None, refs=None):
+        """
+        Pełny kontekst dla LLM-a. Opcjonalnie:
+        - hits: gotowe trafienia (np. spekulatywne) - pomija embedding i wyszukiwanie
+        - extra_hits: dodatkowe trafienia dołączane przed rerankingiem
+        - acts: nazwy aktów (metadata.source), do których ograniczone jest wyszukiwanie
+        - refs: artykuły wskazane w surowym pytaniu (query bywa przepisanym zapytaniem)
+        """
+        # 4. Formatowanie wyników - Lejek (Top 15)
+        return format_context(await self.rank(query, limit, dense_vec, timings, hits, extra_hits, acts, refs))
+
+    async def rank(self, query, limit=None, dense_vec=None, timings=None, hits=None, extra_hits=None, acts=None, refs=None):
+        """Etapy 0-3 get_context: pełna uszeregowana lista trafień (bez ucięcia do CONTEXT_TOP_K)."""
+        timings = timings if timings is not None else {}
+
+        # 0. Artykuły wskazane wprost w pytaniu - O(1) z indeksu w pamięci
+        indexed, ambiguous = [], []
+        refs = merge_refs(refs, query)
+        if refs and ARTICLE_INDEX_ENABLED:
+            await self.ensure_article_index()
+            indexed, missing, ambiguous = self.article_index.lookup(refs, acts)
+            resolved = not missing and not ambiguous
+            inc("rag_article_index_total", result="hit" if resolved else "partial" if indexed or ambiguous else "miss")
+            if indexed and resolved and not ARTICLE_INDEX_WITH_SEMANTIC:
+                return indexed
+
+        # 1-2. Wektor + wyszukiwanie
+        results = hits if hits is not None else await self.retrieve(query, limit, dense_vec, timings, acts)
+        if extra_hits:
+            results = merge_hits(results, extra_hits)
+
+        if ambiguous:
+            ## "art. 31" (31 albo 3¹) albo ten sam numer w kilku aktach - który artykuł, decyduje reranking
+            results, exact_hit = merge_hits(as_rerank_candidates(ambiguous, results), results), False
+        else:
+            results, exact_hit = promote_exact_matches(results, refs)
+
+        # 3. Reranking (Cross-Encoder) - adaptacyjny, paczkami (pomijany przy trafieniu numeru artykułu)
+        if results and not exact_hit:
+            start = time.perf_counter()
+            results = await self.rerank(query, results)
+            timings["rerank"] = time.perf_counter() - start
+
+        ## artykuły z indeksu na początku
+        return merge_indexed(indexed, results)
+
+    async def rewrite_query(self, question, chat_history, summary=None):
+        if not chat_history and not summary:
+            return question
+
+        prompt = build_rewrite_prompt(question, chat_history or [], summary)
+
+        res = await self.groq.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=LLM_MODEL,
+            temperature=0
+        )
+        return res.choices[0].message.content
+
+    async def summarize_history(self, summary, turns):
+        prompt = build_summary_prompt(summary, turns)
+
+        res = await self.groq.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=LLM_MODEL,
+            temperature=0,
+            max_tokens=HISTORY_SUMMARY_TOKENS
+        )
+        return res.choices[0].message.content.strip()
+
+    async def compact_history(self, chat_history, summary=None):
+        """
+        Pilnuje budżetu tokenów historii (history_manager.plan_history):
+        najstarsze tury są dopisywane do podsumowania, ostatnie zostają dosłownie.
+        Zwraca (podsumowanie, ile tur z początku chat_history do niego dołączono, tury dosłowne).
+        """
+        to_fold, verbatim = plan_history(chat_history, summary)
+        if not to_fold:
+            return summary, 0, verbatim
+        try:
+            return await self.summarize_history(summary, to_fold), len(to_fold), verbatim
+        except Exception as e:
+            print(f"Błąd streszczania historii, pomijam {len(to_fold)} starszych tur: {e}")
+            record_fallback("history_summary")
+            return summary, 0, verbatim
+
+    async def speculative_context(self, question, chat_history, timings, summary=None, acts=None):
+        """
+        rewrite_query (Groq) i wyszukiwanie dla surowego pytania startują jednocześnie:
+        - przepisane zapytanie prawie identyczne -> reranking na wynikach spekulatywnych
+        - inaczej -> drugie wyszukiwanie, oba zestawy trafień łączone przed rerankingiem
+        """
+        speculative_timings = {}
+
+        async def timed_rewrite():
+            start = time.perf_counter()
+            result = await self.rewrite_query(question, chat_history, summary)
+            timings["rewrite"] = time.perf_counter() - start
+            return result
+
+        search_query, speculative_hits = await asyncio.gather(
+            timed_rewrite(),
+            self.retrieve(question, timings=speculative_timings, acts=acts),
+            return_exceptions=True
+        )
+        if isinstance(search_query, Exception):
+            raise search_query
+        if isinstance(speculative_hits, Exception):
+            print(f"Spekulatywne wyszukiwanie nieudane, kontynuuję bez niego: {speculative_hits}")
+            record_fallback("speculative_retrieval")
+            speculative_hits = None
+        timings["speculative_retrieval"] = sum(speculative_timings.values())
+
+        refs = extract_article_refs(question)
+        if speculative_hits is not None and is_near_identical(question, search_query):
+            return await self.get_context(search_query, timings=timings, hits=speculative_hits, acts=acts, refs=refs)
+        return await self.get_context(search_query, timings=timings, extra_hits=speculative_hits, acts=acts, refs=refs)
+
+    async def prepare(self, question, chat_history=None, timings=None, summary=None, acts=None):
+        """
+        Wspólna część ask / ask_stream (wszystko przed wywołaniem LLM-a).
+        Zwraca (odpowiedź z cache lub None, wiadomości dla LLM, źródła, klucz cache lub None).
+        """
+        timings = timings if timings is not None else {}
 
-        ## jeśli otrzymano historię to następuje dodanie jej do listy wiadomości
-        ## założenie że chat_history to lista krotek: [(pytanie1, odpowiedź1), (pytanie2, odpowiedź2)]
         if chat_history:
-            for old_question, old_answer in chat_history:
-                messages.append({"role": "user", "content": old_question})
-                messages.append({"role": "assistant", "content": old_answer})
-
-        ## na końcu dodanie bieżącego pytania użytkownika
-        messages.append({"role": "user", "content": question})
-        
-        ## wysłanie całej listy do Groq
-        chat = self.groq.chat.completions.create(
+            start = time.perf_counter()
+            summary, _, chat_history = await self.compact_history(chat_history, summary)
+            timings["history"] = time.perf_counter() - start
+
+        # 0. Cache odpowiedzi - tylko dla pytań bez historii
+        dense_vec, corpus_version = None, None
+        if ANSWER_CACHE_ENABLED and not chat_history and not summary and not acts and not extract_article_refs(question):
+            dense_vec = await self.embed_query(question)
+            corpus_version = await self.get_corpus_version()
+            cached = answer_cache.lookup(dense_vec, corpus_version, question)
+            if cached:
+                return cached, None, cached["sources"], None
+
+        if (chat_history or summary) and SPECULATIVE_RETRIEVAL:
+            context, sources = await self.speculative_context(question, chat_history, timings, summary, acts)
+        else:
+            start = time.perf_counter()
+            search_query = await self.rewrite_query(question, chat_history, summary)
+            timings["rewrite"] = time.perf_counter() - start
+
+            context, sources = await self.get_context(search_query, dense_vec=dense_vec, timings=timings, acts=acts,
+                                                      refs=extract_article_refs(question))
+
+        messages = build_messages(question, context, chat_history, summary)
+        cache_key = (dense_vec, corpus_version, question) if corpus_version is not None else None
+        return None, messages, sources, cache_key
+
+    async def ask(self, question, chat_history=None, summary=None, acts=None):
+        timings = {} ### czasy poszczególnych etapów w sekundach
+
+        cached, messages, sources, cache_key = await self.prepare(question, chat_history, timings, summary, acts)
+        if cached:
+            return cached
+
+        start = time.perf_counter()
+        chat = await self.groq.chat.completions.create(
             messages=messages,
-            model="qwen/qwen3.6-27b",
-            temperature=0.1 ### aby odpowiedzi były maksymalnie precyzyjne i mało kreatywne
+            model=LLM_MODEL,
+            temperature=0.1
         )
+        answer = chat.choices[0].message.content
+        timings["llm"] = time.perf_counter() - start
+        record_stages(timings)
+
+        if cache_key is not None:
+            answer_cache.store(*cache_key, answer, sources)
 
         return {
-            "answer": chat.choices[0].message.content,
-            "sources": sources
+            "answer": answer,
+            "sources": sources,
+            "timings": timings
         }
-    
+
+    async def ask_stream(self, question, chat_history=None, summary=None, acts=None):
+        """Strumieniowa wersja ask - async generator zdarzeń (sources -> token x N -> done)."""
+        timings = {}
+
+        cached, messages, sources, cache_key = await self.prepare(question, chat_history, timings, summary, acts)
+        if cached:
+            yield {"type": "sources", "sources": cached["sources"]}
+            yield {"type": "token", "content": cached["answer"]}
+            yield {"type": "done", "answer": cached["answer"], "sources": cached["sources"], "timings": timings}
+            return
+
+        yield {"type": "sources", "sources": sources}
+
+        start = time.perf_counter()
+        stream = await self.groq.chat.completions.create(
+            messages=messages,
+            model=LLM_MODEL,
+            temperature=0.1,
+            stream=True
+        )
+        parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    timings["llm_first_token"] = time.perf_counter() - start
+                parts.append(delta)
+                yield {"type": "token", "content": delta}
+        timings["llm"] = time.perf_counter() - start
+        record_stages(timings)
+
+        answer = "".join(parts)
+        if cache_key is not None:
+            answer_cache.store(*cache_key, answer, sources)
+
+        yield {"type": "done", "answer": answer, "sources": sources, "timings": timings}
+
+    def shared_components(self):
+        ## wszystko, co nie zależy od wersji korpusu (stan korpusu: schemat, indeks artykułów - liczony od nowa)
+        return {"client": self.client, "groq": self.groq, "embedder": self.embedder, "reranker": self.reranker, "sparse": self.sparse}
+
+    async def close(self):
+        """Zamyka połączenia klientów (Qdrant + Groq) - tylko jeśli silnik je utworzył."""
+        if self._owns_clients:
+            await self.client.close()
+            await self.groq.close()
+
+
+class LaborLawRAG:
+    """
+    Synchroniczna nakładka na AsyncLaborLawRAG (notebooki research/, skrypty i testy z terminala):
+    - cała logika (wyszukiwanie, reranking, cache, historia) jest tylko w AsyncLaborLawRAG
+    - korutyny działają w prywatnej pętli zdarzeń w osobnym wątku, więc nakładka działa też
+      w Jupyterze, gdzie pętla zdarzeń wątku głównego już jest uruchomiona
+    """
+
+    def __init__(self, collection_name="labor_code_pl", shared=None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.engine = self._run(self._create(collection_name, shared))
+
+    async def _create(self, collection_name, shared):
+        ## klienci asynchroniczni muszą powstać w pętli, w której będą używani
+        return AsyncLaborLawRAG(collection_name=collection_name, shared=shared)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __getattr__(self, name):
+        ## atrybuty silnika (client, embedder, collection_name...) - metody mają jawne nakładki poniżej
+        if name == "engine":
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+    def warmup(self):
+        return self._run(self.engine.warmup())
+
+    def get_corpus_version(self):
+        return self._run(self.engine.get_corpus_version())
+
+    def retrieve(self, query, limit=None, dense_vec=None, timings=None, acts=None):
+        return self._run(self.engine.retrieve(query, limit, dense_vec, timings, acts))
+
+    def rank(self, query, limit=None, dense_vec=None, timings=None, hits=None, extra_hits=None, acts=None, refs=None):
+        return self._run(self.engine.rank(query, limit, dense_vec, timings, hits, extra_hits, acts, refs))
+
+    def get_context(self, query, limit=None, dense_vec=None, timings=None, hits=None, extra_hits=None, acts=None, refs=None):
+        return self._run(self.engine.get_context(query, limit, dense_vec, timings, hits, extra_hits, acts, refs))
+
+    def rewrite_query(self, question, chat_history, summary=None):
+        return self._run(self.engine.rewrite_query(question, chat_history, summary))
+
+    def compact_history(self, chat_history, summary=None):
+        return self._run(self.engine.compact_history(chat_history, summary))
+
+    def ask(self, question, chat_history=None, summary=None, acts=None):
+        return self._run(self.engine.ask(question, chat_history, summary, acts))
+
+    def ask_stream(self, question, chat_history=None, summary=None, acts=None):
+        """Generator zdarzeń jak AsyncLaborLawRAG.ask_stream (sources -> token x N -> done)."""
+        events = self.engine.ask_stream(question, chat_history, summary, acts)
+        try:
+            while True:
+                try:
+                    yield self._run(events.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(events.aclose())
+
+    def close(self):
+        self._run(self.engine.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
 
 if __name__ == "__main__":
     # test działania klasy bezpośrednio z terminala
@@ -213,7 +762,7 @@ if __name__ == "__main__":
     try:
         rag = LaborLawRAG()
         pytanie = "Ile dni urlopu ma pracownik po 15 latach pracy?"
-    
+
         odp = rag.ask(pytanie)
         print(f"\nPYTANIE: {pytanie}")
         print(f"ODPOWIEDŹ:\n{odp}")
@@ -0,0 +1,34 @@
+from answer_cache import SemanticAnswerCache
+
+QUESTION = "Ile dni urlopu ma pracownik po 10 latach pracy?"
+
+
+def test_near_miss_threshold():
+    cache = SemanticAnswerCache(threshold=0.97)
+    cache.store([1.0, 0.0], "labor_code_1", QUESTION, "26 dni", ["Art. 154"])
+
+    assert cache.lookup([1.0, 0.1], "labor_code_1", QUESTION)["answer"] == "26 dni"  ### cosinus ~0.995
+    assert cache.lookup([1.0, 0.3], "labor_code_1", QUESTION) is None  ### cosinus ~0.958
+
+
+def test_numbers_must_match():
+    cache = SemanticAnswerCache(threshold=0.97)
+    cache.store([1.0, 0.0], "labor_code_1", QUESTION, "26 dni", ["Art. 154"])
+
+    assert cache.lookup([1.0, 0.0], "labor_code_1", QUESTION.replace("10", "5")) is None
+    assert cache.lookup([1.0, 0.0], "labor_code_1", QUESTION.replace("?", " w firmie?"))["answer"] == "26 dni"
+
+
+def test_pinned_version():
+    cache = SemanticAnswerCache()
+    cache.pin("labor_code_2")
+    cache.store([1.0, 0.0], "labor_code_2", QUESTION, "26 dni", [])
+
+    ## wygaszany silnik (stara wersja) nie czyta ani nie czyści cache nowego
+    assert cache.lookup([1.0, 0.0], "labor_code_1", QUESTION) is None
+    cache.store([1.0, 0.0], "labor_code_1", QUESTION, "stara odpowiedź", [])
+    assert cache.lookup([1.0, 0.0], "labor_code_2", QUESTION)["answer"] == "26 dni"
+
+    cache.pin("labor_code_3")
+    assert cache.lookup([1.0, 0.0], "labor_code_3", QUESTION) is None
+    assert cache.stats()["size"] == 0
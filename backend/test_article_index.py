@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from article_index import ArticleIndex
+
+
+def record(point_id, art_id, source="Kodeks pracy"):
+    return SimpleNamespace(id=point_id, payload={"metadata": {"art_id": art_id, "source": source}})
+
+
+def make_index(records):
+    index = ArticleIndex()
+    index._swap(records, "labor_code_1")
+    return index
+
+
+def test_lookup_unique_article():
+    index = make_index([record(1, "Art. 22¹"), record(2, "Art. 221")])
+    found, missing, ambiguous = index.lookup(["Art. 22¹", "Art. 999"])
+    assert [r.id for r in found] == [1] and missing == ["Art. 999"] and ambiguous == []
+
+
+def test_lookup_plain_number_matching_superscript_is_ambiguous():
+    index = make_index([record(1, "Art. 3¹"), record(2, "Art. 31"), record(3, "Art. 152")])
+    found, missing, ambiguous = index.lookup(["Art. 31", "Art. 152"])
+    assert [r.id for r in found] == [3]
+    assert sorted(r.id for r in ambiguous) == [1, 2]
+
+
+def test_lookup_same_number_in_several_acts():
+    index = make_index([record(1, "Art. 5"), record(2, "Art. 5", source="Ustawa o minimalnym wynagrodzeniu")])
+    assert len(index.lookup(["Art. 5"])[2]) == 2
+    found, _, ambiguous = index.lookup(["Art. 5"], acts=["Kodeks pracy"])
+    assert [r.id for r in found] == [1] and ambiguous == []
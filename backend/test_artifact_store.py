@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from artifact_store import ArtifactStore, url_key
+
+URL = "https://isap.sejm.gov.pl/akt.pdf"
+PDF = b"%PDF-1.7 nowa wersja aktu"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {"Content-Type": "application/pdf", "Content-Length": str(len(body)), **(headers or {})}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers)
+        return self.response
+
+
+def test_partial_without_validator_restarts_from_zero():
+    session = FakeSession(FakeResponse(200, PDF))
+    store = ArtifactStore(root=tempfile.mkdtemp(), session=session)
+    ## część z przerwanego pobierania, przy którym serwer nie podał ETag ani Last-Modified
+    with open(os.path.join(store.root, "partial", f"{url_key(URL)}.part"), "wb") as f:
+        f.write(b"%PDF-1.7 stara")
+
+    result = store.download(URL)
+
+    assert "Range" not in session.requests[0] and "If-Range" not in session.requests[0]
+    with open(result["path"], "rb") as f:
+        assert f.read() == PDF
+
+
+def test_partial_with_validator_is_resumed():
+    session = FakeSession(FakeResponse(206, PDF[9:], {"ETag": '"v1"'}))
+    store = ArtifactStore(root=tempfile.mkdtemp(), session=session)
+    store._update_index(URL, {"partial_etag": '"v1"'})
+    with open(os.path.join(store.root, "partial", f"{url_key(URL)}.part"), "wb") as f:
+        f.write(PDF[:9])
+
+    result = store.download(URL)
+
+    assert session.requests[0]["Range"] == "bytes=9-" and session.requests[0]["If-Range"] == '"v1"'
+    with open(result["path"], "rb") as f:
+        assert f.read() == PDF
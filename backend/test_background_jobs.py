@@ -0,0 +1,28 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import background_jobs
+from background_jobs import IngestionJobRunner, IngestionLock
+
+
+def test_failed_engine_reload_marks_job_degraded(monkeypatch):
+    ## zadanie w wątku zamiast procesu spawn - liczy się tylko to, co _run robi z wynikiem
+    monkeypatch.setattr(background_jobs, "run_update_job", lambda job_id, keys: {"status": "success"})
+
+    async def failing_reload():
+        raise RuntimeError("warmup nieudany")
+
+    async def run():
+        runner = IngestionJobRunner(on_success=failing_reload)
+        runner._ingestion_lock = IngestionLock(os.path.join(tempfile.mkdtemp(), "ingest.lock"))
+        runner._ensure_pool = lambda: ThreadPoolExecutor(max_workers=1)
+        job = runner.submit()
+        await asyncio.gather(*runner._tasks)
+        return runner.get(job["id"])
+
+    job = asyncio.run(run())
+    assert job["status"] == "degraded"
+    assert "warmup nieudany" in job["error"]
+    assert job["result"] == {"status": "success"}
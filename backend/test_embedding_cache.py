@@ -0,0 +1,43 @@
+import asyncio
+import os
+import tempfile
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, SQLiteBackend
+
+MODEL = "intfloat/multilingual-e5-large"
+
+
+def test_lru_eviction():
+    cache = EmbeddingCache(max_size=2)
+    cache.set("urlop", MODEL, [1.0])
+    cache.set("wypowiedzenie", MODEL, [2.0])
+    assert cache.get("Urlop ", MODEL) == [1.0]  ### odczyt odświeża wpis, znormalizowany klucz
+
+    cache.set("nadgodziny", MODEL, [3.0])
+    assert cache.get("wypowiedzenie", MODEL) is None  ### najdawniej używany
+    assert cache.get("urlop", MODEL) == [1.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    cache = EmbeddingCache(ttl=60)
+    cache.set("urlop", MODEL, [1.0])
+
+    now[0] += 59
+    assert cache.get("urlop", MODEL) == [1.0]
+    now[0] += 2
+    assert cache.get("urlop", MODEL) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_async_shared_backend():
+    backend = SQLiteBackend(os.path.join(tempfile.mkdtemp(), "emb.sqlite3"), max_size=10)
+    asyncio.run(EmbeddingCache(backend=backend).aset("urlop", MODEL, [1.0]))
+
+    ## inny worker: pusty cache lokalny, wektor z backendu
+    other = EmbeddingCache(backend=backend)
+    assert asyncio.run(other.aget("urlop", MODEL)) == [1.0]
+    assert other.stats()["shared_hits"] == 1
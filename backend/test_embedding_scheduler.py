@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+import pytest
+
+from embedding_scheduler import EmbeddingCheckpoint, embed_with_checkpoint, run_batches
+
+MODEL = "intfloat/multilingual-e5-large"
+
+
+def test_checkpoint_resume_skips_finished_batches():
+    path = os.path.join(tempfile.mkdtemp(), "ingest_checkpoint.jsonl")
+    batches = [["Art. 1"], ["Art. 2"], ["Art. 3"]]
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        if texts == ["Art. 3"] and len(calls) == 3:
+            raise RuntimeError("przerwane uruchomienie")
+        return [[float(len(calls))] for _ in texts]
+
+    checkpoint = EmbeddingCheckpoint(path)
+    with pytest.raises(Exception):
+        for batch in batches:
+            embed_with_checkpoint(batch, embed, MODEL, checkpoint)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "niedokończona')  ### urwana linia z zabitego procesu
+
+    ## kolejne uruchomienie: gotowe paczki z pliku, model liczy tylko brakującą
+    resumed = EmbeddingCheckpoint(path)
+    assert len(resumed) == 2
+    vectors = [embed_with_checkpoint(batch, embed, MODEL, resumed) for batch in batches]
+    assert calls[3:] == [["Art. 3"]]
+    assert vectors == [[[1.0]], [[2.0]], [[4.0]]]
+
+    resumed.clear()
+    assert not os.path.exists(path) and len(EmbeddingCheckpoint(path)) == 0
+
+
+def test_checkpoint_key_changes_with_text():
+    assert EmbeddingCheckpoint.make_key(MODEL, ["Art. 1"]) != EmbeddingCheckpoint.make_key(MODEL, ["Art. 1 (zmieniony)"])
+
+
+def test_run_batches_reports_failed_batch_after_others():
+    def work(batch):
+        if batch == 2:
+            raise ValueError("zły tekst")
+        return batch * 10
+
+    done = []
+    with pytest.raises(Exception, match="paczka 3"):
+        for index, batch, result in run_batches([0, 1, 2, 3], work, workers=2, rate=0, retries=0):
+            done.append(result)
+    assert sorted(done) == [0, 10, 30]
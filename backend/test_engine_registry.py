@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import engine_registry
+from engine_registry import EngineRegistry
+
+
+class FakeQdrant:
+    def __init__(self, target):
+        self.target = target
+        self.deleted = []
+
+    async def get_aliases(self):
+        return SimpleNamespace(aliases=[SimpleNamespace(alias_name="labor_code_pl", collection_name=self.target)])
+
+    async def delete_collection(self, collection_name):
+        self.deleted.append(collection_name)
+
+
+class FakeEngine:
+    ## tyle z AsyncLaborLawRAG, ile używa EngineRegistry
+    def __init__(self, client, collection_name="labor_code_pl", shared=None, broken=False):
+        self.client = client
+        self.collection_name = collection_name
+        self.broken = broken
+        self.closed = False
+
+    async def warmup(self):
+        if self.broken:
+            raise ConnectionError("qdrant niedostępny")
+
+    async def get_context(self, query):
+        return ""
+
+    async def get_corpus_version(self):
+        return self.collection_name
+
+    async def close(self):
+        self.closed = True
+
+
+def make_registry(client, broken=()):
+    return EngineRegistry(lambda **kwargs: FakeEngine(client, broken=kwargs.get("collection_name") in broken, **kwargs))
+
+
+def test_reload_binds_new_collection_and_retires_old(monkeypatch):
+    monkeypatch.setattr(engine_registry, "ENGINE_COLLECTION_GRACE", 0)
+
+    async def run():
+        client = FakeQdrant("labor_code_1")
+        registry = make_registry(client)
+        await registry.start()
+        assert registry.engine.collection_name == "labor_code_1"
+
+        async with registry.acquire() as old_engine:
+            client.target = "labor_code_2"
+            assert await registry.reload() is True
+            assert registry.engine.collection_name == "labor_code_2"
+            await asyncio.sleep(0.3)
+            ## zapytanie w toku trzyma stary silnik i jego kolekcję
+            assert not old_engine.closed and client.deleted == []
+
+        for _ in range(20):
+            await asyncio.sleep(0.1)
+            if client.deleted:
+                break
+        assert old_engine.closed
+        assert client.deleted == ["labor_code_1"]
+        assert await registry.reload() is False
+        await registry.close()
+
+    asyncio.run(run())
+
+
+def test_failed_reload_keeps_old_engine():
+    async def run():
+        client = FakeQdrant("labor_code_1")
+        registry = make_registry(client, broken={"labor_code_2"})
+        await registry.start()
+        engine = registry.engine
+
+        client.target = "labor_code_2"
+        with pytest.raises(RuntimeError):
+            await registry.reload()
+        assert registry.engine is engine and registry.version == "labor_code_1"
+        await registry.close()
+
+    asyncio.run(run())
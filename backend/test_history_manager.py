@@ -0,0 +1,33 @@
+from history_manager import plan_history, turns_tokens, estimate_tokens, HISTORY_SUMMARY_TOKENS
+
+
+def turn(i, length=30):
+    return f"pytanie {i} " + "q" * length, f"odpowiedź {i} " + "a" * length
+
+
+def test_short_history_stays_verbatim():
+    history = [turn(i) for i in range(3)]
+    assert plan_history(history, recent_turns=4, token_budget=2500, batch=2) == ([], history)
+
+
+def test_older_turns_fold_in_order():
+    history = [turn(i) for i in range(6)]
+    to_fold, verbatim = plan_history(history, recent_turns=4, token_budget=2500, batch=2)
+    assert to_fold == history[:2] and verbatim == history[2:]
+
+
+def test_budget_moves_recent_turns_into_summary():
+    history = [turn(i, length=600) for i in range(4)]
+    budget = HISTORY_SUMMARY_TOKENS + 500
+    to_fold, verbatim = plan_history(history, "Umowa na czas nieokreślony.", recent_turns=4, token_budget=budget, batch=2)
+
+    assert to_fold + verbatim == history
+    assert verbatim == history[-1:]
+    assert HISTORY_SUMMARY_TOKENS + turns_tokens(verbatim) <= budget
+
+
+def test_single_long_turn_is_clipped():
+    question, answer = turn(0, length=5000)
+    _, verbatim = plan_history([(question, answer)], recent_turns=4, token_budget=300, batch=2)
+    assert verbatim[0][0] == question[:900]  ### 300 tokenów * 3 znaki
+    assert estimate_tokens(verbatim[0][0]) + estimate_tokens(verbatim[0][1]) <= 300 + 5
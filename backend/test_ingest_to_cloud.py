@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import ingest_to_cloud
+from ingest_to_cloud import article_point_id, content_hash, ingest_document
+from embedding_scheduler import TokenBucket
+from model_providers import DENSE_VECTOR_NAME
+
+SOURCE = "Kodeks pracy"
+ARTICLES = [
+    {"art_id": "Art. 1", "content": "Kodeks określa prawa i obowiązki pracowników."},
+    {"art_id": "Art. 2", "content": "Pracownikiem jest osoba zatrudniona (nowe brzmienie)."},
+]
+
+
+class FakeQdrant:
+    ## aktualna kolekcja: wektor niezmienionego art. 1 + punkt usuniętego artykułu
+    def __init__(self, stored):
+        self.stored = stored
+        self.upserted = []
+
+    def retrieve(self, collection_name, ids, with_vectors):
+        return [SimpleNamespace(id=point_id, vector=self.stored[point_id]) for point_id in ids]
+
+    def upsert(self, collection_name, points, wait):
+        self.upserted.extend(points)
+
+
+class FakeEmbedder:
+    model_name = "intfloat/multilingual-e5-large"
+
+    def __init__(self):
+        self.texts = []
+
+    def embed(self, texts, is_query):
+        self.texts.extend(texts)
+        return [[0.5, 0.5] for _ in texts]
+
+
+def test_article_point_id_is_deterministic():
+    digest = content_hash(ARTICLES[0]["content"])
+    assert article_point_id(SOURCE, "Art. 1", digest) == article_point_id(SOURCE, "Art. 1", digest)
+    assert article_point_id(SOURCE, "Art. 1", digest) != article_point_id("Ustawa o minimalnym wynagrodzeniu", "Art. 1", digest)
+    assert article_point_id(SOURCE, "Art. 1", digest) != article_point_id(SOURCE, "Art. 1", content_hash("inna treść"))
+
+
+def test_unchanged_articles_reuse_ids_and_vectors(monkeypatch):
+    unchanged_id = article_point_id(SOURCE, "Art. 1", content_hash(ARTICLES[0]["content"]))
+    removed_id = article_point_id(SOURCE, "Art. 3", content_hash("uchylony"))
+    fake = FakeQdrant({unchanged_id: {DENSE_VECTOR_NAME: [1.0, 0.0]}})
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(ingest_to_cloud, "client", fake)
+    monkeypatch.setattr(ingest_to_cloud, "parse_pdf", lambda path: {"articles": ARTICLES})
+
+    stats = ingest_document(
+        {"source": SOURCE, "file_path": "kp.pdf"}, "labor_code_2", embedder, None,
+        checkpoint=None, reusable_ids={unchanged_id, removed_id}, bucket=TokenBucket(0)
+    )
+
+    points = {point.id: point for point in fake.upserted}
+    assert points[unchanged_id].vector == {DENSE_VECTOR_NAME: [1.0, 0.0]}  ### skopiowany, nie liczony
+    assert embedder.texts == [ARTICLES[1]["content"]]
+    assert stats == {"points": 2, "changed": 1, "unchanged": 1, "removed": 1}
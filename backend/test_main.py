@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+import main
+from database import async_engine, AsyncSessionLocal, Base
+from models import Session, Log
+
+
+def run_with_client(check):
+    async def run():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+                await check(client)
+        finally:
+            await async_engine.dispose()  ### wątek aiosqlite blokowałby zakończenie procesu
+
+    asyncio.run(run())
+
+
+async def add_session_with_logs(session_id, turns):
+    start = datetime(2026, 1, 1)
+    async with AsyncSessionLocal() as db:
+        db.add(Session(id=session_id, title=session_id, created_at=start))
+        for i in range(turns):
+            db.add(Log(session_id=session_id, question=f"q{i}", answer=f"a{i}", created_at=start + timedelta(minutes=i)))
+        await db.commit()
+
+
+def test_history_keyset_pagination():
+    async def check(client):
+        await add_session_with_logs("history-pages", 5)
+
+        first = await client.get("/history/history-pages", params={"limit": 2})
+        assert [m["text"] for m in first.json() if m["role"] == "user"] == ["q3", "q4"]
+        cursor = first.headers["X-Next-Before"]
+
+        second = await client.get("/history/history-pages", params={"limit": 2, "before": cursor})
+        assert [m["text"] for m in second.json() if m["role"] == "user"] == ["q1", "q2"]
+
+        last = await client.get("/history/history-pages", params={"limit": 2, "before": second.headers["X-Next-Before"]})
+        assert [m["text"] for m in last.json() if m["role"] == "user"] == ["q0"]
+        assert "X-Next-Before" not in last.headers
+
+    run_with_client(check)
+
+
+def test_history_without_paging_params_returns_everything():
+    ## frontend nie czyta X-Next-Before - bez limit/before cała historia, jak przed stronicowaniem
+    async def check(client):
+        await add_session_with_logs("history-all", main.HISTORY_PAGE_SIZE + 5)
+        response = await client.get("/history/history-all")
+        assert len(response.json()) == 2 * (main.HISTORY_PAGE_SIZE + 5)
+        assert "X-Next-Before" not in response.headers
+
+    run_with_client(check)
+
+
+def test_sessions_keyset_pagination():
+    async def check(client):
+        async with AsyncSessionLocal() as db:
+            for i in range(3):
+                db.add(Session(id=f"sessions-page-{i}", title="t", created_at=datetime(2030, 1, 1 + i)))
+            await db.commit()
+
+        first = await client.get("/sessions", params={"limit": 2})
+        assert [s["id"] for s in first.json()] == ["sessions-page-2", "sessions-page-1"]
+        second = await client.get("/sessions", params={"limit": 2, "before": first.headers["X-Next-Before"]})
+        assert second.json()[0]["id"] == "sessions-page-0"
+
+        everything = await client.get("/sessions")
+        assert {"sessions-page-0", "sessions-page-1", "sessions-page-2"} <= {s["id"] for s in everything.json()}
+        assert "X-Next-Before" not in everything.headers
+
+    run_with_client(check)
@@ -0,0 +1,33 @@
+import asyncio
+
+from database import async_engine, AsyncSessionLocal, Base
+from models import Session, Log, SessionSummary
+
+
+def test_defaults_insert_through_async_engine():
+    ## asyncpg odrzuca daty ze strefą w kolumnach TIMESTAMP WITHOUT TIME ZONE - domyślne wartości muszą być naiwne
+    async def run():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            await check()
+        finally:
+            await async_engine.dispose()  ### wątek aiosqlite blokowałby zakończenie procesu
+
+    async def check():
+        async with AsyncSessionLocal() as db:
+            db.add(Session(id="test-models", title="Test"))
+            await db.flush()
+            log = Log(session_id="test-models", question="Pytanie", answer="Odpowiedź")
+            db.add(log)
+            await db.flush()
+            summary = SessionSummary(session_id="test-models", summary="Podsumowanie", last_log_id=log.id)
+            db.add(summary)
+            await db.commit()
+
+            session = await db.get(Session, "test-models")
+            assert session.created_at.tzinfo is None
+            assert log.created_at.tzinfo is None
+            assert summary.updated_at.tzinfo is None
+
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+from pdf_parser import iter_segments, iter_clean_lines
+
+## tekst jak z pypdf: indeks górny spłaszczony do zwykłej cyfry ("Art. 3¹." -> "Art. 31.")
+LINES = [
+    "Art. 3. Pracodawcą jest jednostka organizacyjna.",
+    "Art. 31. § 1. Za pracodawcę czynności dokonuje osoba lub organ.",
+    "Art. 30. § 1. Umowa o pracę rozwiązuje się:",
+    "Art. 31. Jeżeli w okresie wypowiedzenia zapadnie decyzja.",
+]
+
+
+def test_flattened_superscripts():
+    assert [a["art_id"] for a in iter_segments(LINES)] == ["Art. 3", "Art. 3¹", "Art. 30", "Art. 31"]
+
+
+SAMPLE_PAGE = [
+    "USTAWA z dnia 26 czerwca 1974 r.",
+    "Kodeks pracy",
+    "DZIAŁ PIERWSZY",
+    "Przepisy ogólne",
+    "Art. 1. Kodeks pracy określa prawa i obowiązki pracowników.",
+    "Art. 2. Pracownikiem jest osoba zatrudniona",
+    "na podstawie umowy o pracę.",
+    "Rozdział I",
+    "Przepisy wstępne",
+    "Art. 3. § 1. Pracodawcą jest jednostka organizacyjna.",
+    "§ 2. Pracodawcą jest także osoba fizyczna.",
+    "Art. 4. (uchylony)",
+]
+
+
+def test_article_count_and_structure():
+    articles = list(iter_segments(SAMPLE_PAGE))
+
+    assert [a["art_id"] for a in articles] == ["Wstęp", "Art. 1", "Art. 2", "Art. 3", "Art. 4"]
+    assert articles[2]["content"].endswith("na podstawie umowy o pracę.")
+    assert articles[1]["division"] == "DZIAŁ PIERWSZY - Przepisy ogólne" and articles[1]["chapter"] is None
+    assert articles[3]["chapter"] == "Rozdział I - Przepisy wstępne"
+    assert [p["id"] for p in articles[3]["paragraphs"]] == ["§ 1", "§ 2"]
+    ## nagłówki struktury nie trafiają do treści artykułów
+    assert all("Rozdział" not in a["content"] for a in articles)
+
+
+def test_boilerplate_lines_removed():
+    ## stopka z numerem strony i data wydruku na każdej stronie - liczby nie rozróżniają linii
+    body = [SAMPLE_PAGE[4:7], SAMPLE_PAGE[9:11], SAMPLE_PAGE[11:12]]
+    pages = ["\n".join([f"©Kancelaria Sejmu s. {i + 1}/3", *lines, "2024-01-15"]) for i, lines in enumerate(body)]
+    assert list(iter_clean_lines(pages)) == [line for lines in body for line in lines]
@@ -0,0 +1,30 @@
+import pytest
+
+import utils
+
+
+class LoadingModelSession:
+    ## HF odpowiada 503 w nieskończoność (model się nie ładuje)
+    def __init__(self):
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        return LoadingResponse()
+
+
+class LoadingResponse:
+    status_code = 503
+    text = "Model is loading"
+
+    def json(self):
+        return {"estimated_time": 0}
+
+
+def test_query_hf_api_stops_after_loading_retries(monkeypatch):
+    session = LoadingModelSession()
+    monkeypatch.setattr(utils, "get_http_session", lambda: session)
+
+    with pytest.raises(Exception, match="nie załadował się"):
+        utils.query_hf_api(utils.EMBEDDING_URL, {"inputs": ["query: urlop"]})
+    assert session.calls == utils.HF_MAX_LOADING_RETRIES + 1
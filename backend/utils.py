@@ -1,38 +1,121 @@
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
 import os
 import time
 from dotenv import load_dotenv
+from embedding_cache import embedding_cache
+from metrics import record_retry
 
 load_dotenv()
 
 # Konfiguracja z .env
 HF_TOKEN = os.getenv("HF_API_KEY")
 
+### URL do modeli na Hugging Face
+EMBEDDING_MODEL = "intfloat/multilingual-e5-large"
+EMBEDDING_URL = f"https://router.huggingface.co/hf-inference/models/{EMBEDDING_MODEL}/pipeline/feature-extraction"
+RERANK_URL = "https://router.huggingface.co/hf-inference/models/BAAI/bge-reranker-v2-m3"
+
+## maksymalna liczba ponowień przy 503 (ładowanie modelu) zanim zapytanie zostanie uznane za nieudane
+HF_MAX_LOADING_RETRIES = 5
+
+## Pula połączeń HTTP (keep-alive) do HF - konfigurowalna przez .env
+HF_POOL_CONNECTIONS = int(os.getenv("HF_POOL_CONNECTIONS", 4))     ### liczba pul (hostów) trzymanych w pamięci
+HF_POOL_MAXSIZE = int(os.getenv("HF_POOL_MAXSIZE", 10))            ### max połączeń na jednego hosta
+HF_MAX_CONNECTIONS = int(os.getenv("HF_MAX_CONNECTIONS", 20))      ### max połączeń łącznie (klient async)
+HF_KEEPALIVE_EXPIRY = float(os.getenv("HF_KEEPALIVE_EXPIRY", 30))  ### po ilu sekundach bezczynności zamyka połączenie
+
+
+# WSPÓŁDZIELONA SESJA HTTP (keep-alive) - jeden handshake TCP+TLS zamiast jednego na każde zapytanie
+_http_session = None
+
+
+def get_http_session():
+    """Zwraca współdzieloną requests.Session z pulą połączeń (tworzona leniwie)."""
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HF_POOL_CONNECTIONS, pool_maxsize=HF_POOL_MAXSIZE)
+        _http_session.mount("https://", adapter)
+        _http_session.mount("http://", adapter)
+    return _http_session
+
+
+## liczniki dla klienta async (httpx nie udostępnia ich wprost, więc liczy przez rozszerzenie "trace")
+_async_pool_stats = {"requests": 0, "new_connections": 0}
+
+
+async def _count_new_connections(event_name, info):
+    ### httpcore woła ten hook tylko gdy otwiera NOWE połączenie TCP
+    if event_name == "connection.connect_tcp.complete":
+        _async_pool_stats["new_connections"] += 1
+
+
+def get_http_pool_stats():
+    """
+    Statystyki puli połączeń do HF:
+    - requests: liczba wysłanych zapytań
+    - new_connections: liczba otwartych połączeń (handshake TCP+TLS)
+    - reused_connections: zapytania obsłużone przez istniejące połączenie keep-alive
+    """
+    sync_requests, sync_new = 0, 0
+    if _http_session is not None:
+        ### ten sam adapter jest zamontowany pod http:// i https:// - liczy go tylko raz
+        for adapter in {id(a): a for a in _http_session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                sync_requests += pool.num_requests
+                sync_new += pool.num_connections
+
+    async_requests = _async_pool_stats["requests"]
+    async_new = _async_pool_stats["new_connections"]
+
+    return {
+        "sync": {
+            "requests": sync_requests,
+            "new_connections": sync_new,
+            "reused_connections": max(sync_requests - sync_new, 0)
+        },
+        "async": {
+            "requests": async_requests,
+            "new_connections": async_new,
+            "reused_connections": max(async_requests - async_new, 0)
+        }
+    }
+
+
 def query_hf_api(url, payload):
     """
     Silnik zapytań:
     - Obsługuje nagłówki
-    - Obsługuje błąd 503 (ładowanie modelu)
+    - Obsługuje błąd 503 (ładowanie modelu) - pętla z limitem HF_MAX_LOADING_RETRIES, jak async_query_hf_api
     - Obsługuje błędy sieciowe (timeout)
     - Posiada pełny blok try-except
     """
     headers = {"Authorization": f"Bearer {HF_TOKEN}"}
-    
+
     try:
-        # Ustawia timeout na 60s bo modele potrafią długo myśleć
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
+        for _ in range(HF_MAX_LOADING_RETRIES + 1):
+            # Ustawia timeout na 60s bo modele potrafią długo myśleć
+            response = get_http_session().post(url, headers=headers, json=payload, timeout=60)
 
-        # Obsługa ładowania modelu (503)
-        if response.status_code == 503:
-            wait_time = response.json().get("estimated_time", 20)
-            print(f"Model HF ({url.split('/')[-1]}) się ładuje, czekam {wait_time}s...")
-            time.sleep(wait_time)
-            return query_hf_api(url, payload) ### Rekurencyjne ponowienie
+            # Obsługa ładowania modelu (503)
+            if response.status_code == 503:
+                wait_time = response.json().get("estimated_time", 20)
+                print(f"Model HF ({url.split('/')[-1]}) się ładuje, czekam {wait_time}s...")
+                record_retry("hf_model_loading")
+                time.sleep(wait_time)
+                continue
 
-        if response.status_code != 200:
-            raise Exception(f"Błąd HF API ({response.status_code}): {response.text}")
+            if response.status_code != 200:
+                raise Exception(f"Błąd HF API ({response.status_code}): {response.text}")
 
-        return response.json()
+            return response.json()
+
+        raise Exception(f"Model HF ({url.split('/')[-1]}) nie załadował się po {HF_MAX_LOADING_RETRIES} próbach")
 
     except requests.exceptions.RequestException as e:
         print(f"Błąd sieciowy podczas zapytania do HF: {e}")
@@ -41,26 +124,129 @@ def query_hf_api(url, payload):
         print(f"Nieoczekiwany błąd utils.query_hf_api: {e}")
         raise
 
-def get_embeddings(texts, is_query=True):
+
+# ASYNCHRONICZNY KLIENT HF (dla FastAPI - nie blokuje pętli zdarzeń)
+_async_http_client = None
+
+
+def get_async_http_client():
+    """Zwraca współdzielony httpx.AsyncClient z pulą połączeń keep-alive (tworzony leniwie)."""
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=HF_MAX_CONNECTIONS,
+            max_keepalive_connections=HF_POOL_MAXSIZE,
+            keepalive_expiry=HF_KEEPALIVE_EXPIRY
+        )
+        _async_http_client = httpx.AsyncClient(timeout=60, limits=limits)
+    return _async_http_client
+
+
+async def close_async_http_client():
+    """Zamyka współdzielonego klienta (wywoływane przy zamykaniu aplikacji)."""
+    global _async_http_client
+    if _async_http_client is not None and not _async_http_client.is_closed:
+        await _async_http_client.aclose()
+    _async_http_client = None
+
+
+async def async_query_hf_api(url, payload):
     """
-    Wrapper dla modelu E5:
+    Asynchroniczny odpowiednik query_hf_api:
+    - 503 (ładowanie modelu) obsługiwane przez asyncio.sleep zamiast time.sleep
+    - pętla zamiast rekurencji, z limitem HF_MAX_LOADING_RETRIES
+    """
+    headers = {"Authorization": f"Bearer {HF_TOKEN}"}
+    client = get_async_http_client()
+
+    try:
+        for _ in range(HF_MAX_LOADING_RETRIES + 1):
+            _async_pool_stats["requests"] += 1
+            response = await client.post(
+                url, headers=headers, json=payload,
+                extensions={"trace": _count_new_connections}
+            )
+
+            # Obsługa ładowania modelu (503)
+            if response.status_code == 503:
+                wait_time = response.json().get("estimated_time", 20)
+                print(f"Model HF ({url.split('/')[-1]}) się ładuje, czekam {wait_time}s...")
+                record_retry("hf_model_loading")
+                await asyncio.sleep(wait_time)
+                continue
+
+            if response.status_code != 200:
+                raise Exception(f"Błąd HF API ({response.status_code}): {response.text}")
+
+            return response.json()
+
+        raise Exception(f"Model HF ({url.split('/')[-1]}) nie załadował się po {HF_MAX_LOADING_RETRIES} próbach")
+
+    except httpx.HTTPError as e:
+        print(f"Błąd sieciowy podczas zapytania do HF: {e}")
+        raise
+    except Exception as e:
+        print(f"Nieoczekiwany błąd utils.async_query_hf_api: {e}")
+        raise
+
+
+def build_embedding_payload(texts, is_query=True):
+    """
+    Przygotowuje payload dla modelu E5:
     - Przygotowuje prefixy 'query:'/'passage:'
     - Obsługuje zamianę pojedynczego stringa na listę
-    - Wywołuje silnik query_hf_api
     """
-    url = "https://router.huggingface.co/hf-inference/models/intfloat/multilingual-e5-large/pipeline/feature-extraction"
-    
     # Model E5 wymaga przedrostka
     prefix = "query: " if is_query else "passage: "
-    
+
     # Normalizacja wejścia do listy
     input_texts = [texts] if isinstance(texts, str) else texts
     formatted_inputs = [f"{prefix}{t}" for t in input_texts]
 
-    payload = {
+    return {
         "inputs": formatted_inputs,
         "options": {"wait_for_model": True}
     }
 
+
+def _is_cacheable(texts, is_query):
+    ## cache dotyczy tylko pojedynczych zapytań użytkownika (paczki dokumentów z ingestion idą zawsze do API)
+    return is_query and isinstance(texts, str)
+
+
+def get_embeddings(texts, is_query=True):
+    """
+    Wrapper dla modelu E5:
+    - Dla pojedynczego zapytania najpierw sprawdza cache (embedding_cache)
+    - Buduje payload przez build_embedding_payload
+    - Wywołuje silnik query_hf_api
+    """
+    if _is_cacheable(texts, is_query):
+        cached = embedding_cache.get(texts, EMBEDDING_MODEL)
+        if cached is not None:
+            return cached
+
+    payload = build_embedding_payload(texts, is_query)
+
     # Wywołuje funkcję z całą logiką try-except i nagłówkami
-    return query_hf_api(url, payload)
\ No newline at end of file
+    result = query_hf_api(EMBEDDING_URL, payload)
+
+    if _is_cacheable(texts, is_query):
+        embedding_cache.set(texts, EMBEDDING_MODEL, result)
+    return result
+
+
+async def async_get_embeddings(texts, is_query=True):
+    """Asynchroniczny wrapper dla modelu E5 (ten sam payload i cache co get_embeddings)."""
+    if _is_cacheable(texts, is_query):
+        cached = await embedding_cache.aget(texts, EMBEDDING_MODEL)
+        if cached is not None:
+            return cached
+
+    payload = build_embedding_payload(texts, is_query)
+    result = await async_query_hf_api(EMBEDDING_URL, payload)
+
+    if _is_cacheable(texts, is_query):
+        await embedding_cache.aset(texts, EMBEDDING_MODEL, result)
+    return result
+